@@ -2,13 +2,39 @@ import streamlit as st
 import gspread
 from google.oauth2.service_account import Credentials
 import pandas as pd
+import numpy as np
 import ssl
 from datetime import datetime, timedelta
-import io
-import time
 from functools import lru_cache
 import re
+import os
 import uuid
+import json
+
+from nucleo.almacenamiento import (RepositorioGoogleSheets, RepositorioSQLite, CAMPOS_POLIZA, PRIMERA_FILA_DATOS,
+                                   fila_a_registro)
+from nucleo.conexion import ConexionSheets
+from nucleo.cuota import ClienteSheets
+from nucleo.metricas import RegistroMetricas
+from nucleo.sincronizacion import SincronizadorDelta
+from nucleo.escritura import ColaEscritura, ESTADO_PENDIENTE, ESTADO_CONFIRMADO, ESTADO_ERROR
+from nucleo.indices import IndiceFilas, IndicesPolizas, normalizar_contratante, valor_clave
+from nucleo.fechas import COLUMNAS_FECHA, construir_columnas_fecha, IndiceVencimientos, IndiceCumpleaños
+from nucleo.resumen import ResumenCartera
+from nucleo.tabla import (
+    BusquedaTexto, construir_tabla, filtrar_posiciones, ordenar_posiciones, pagina_de_tabla
+)
+from nucleo.exportacion import CacheExportaciones, FORMATOS, exportar, formatos_disponibles
+from nucleo.busqueda import IndiceClientes
+from nucleo.duplicados import (
+    POLITICA_ADVERTIR, POLITICA_BLOQUEAR, POLITICA_PERMITIR, POLITICAS_DUPLICADOS,
+    duplicados_al_insertar, reporte_duplicados, resumir_duplicados
+)
+from nucleo.texto_completo import COLUMNAS_TEXTO_COMPLETO, IndiceTextoCompleto
+from nucleo.auditoria import AuditorHoja, SEVERIDAD_ADVERTENCIA, SEVERIDAD_ERROR, resumir_hallazgos
+from nucleo.paginas import RegistroPaginas
+from nucleo.importacion import ImportacionLote, asignar_ids_nuevos, leer_archivo, normalizar_columnas, validar_lote
+from nucleo.secuencias import AsignadorIds, SecuenciaGoogleSheets, SecuenciaSQLite, ENCABEZADOS_METADATOS
 
 # ============================================================
 # CONFIGURACIÓN INICIAL
@@ -79,71 +105,107 @@ def inicializar_estado_formulario():
 inicializar_estado_formulario()
 
 # ============================================================
-# CONFIGURACIÓN DE GOOGLE SHEETS
+# CONFIGURACIÓN DEL ALMACENAMIENTO
 # ============================================================
-def init_google_sheets():
+def leer_configuracion(clave, valor_por_defecto=None):
+    """Lee una opción desde la variable de entorno POLIZAS_<CLAVE> o desde [polizas] en los secrets"""
+    valor = os.environ.get(f"POLIZAS_{clave.upper()}")
+    if valor is not None:
+        return valor
     try:
-        if 'google_service_account' not in st.secrets:
-            st.error("❌ No se encontró 'google_service_account' en los secrets de Streamlit")
-            return None
-        
-        creds = Credentials.from_service_account_info(
-            st.secrets["google_service_account"],
-            scopes=["https://www.googleapis.com/auth/spreadsheets", 
-                   "https://www.googleapis.com/auth/drive"]
-        )
-        
-        client = gspread.authorize(creds)
-        return client
-        
-    except Exception as e:
-        st.error(f"❌ Error al autenticar con Google Sheets: {str(e)}")
-        return None
+        return st.secrets.get("polizas", {}).get(clave, valor_por_defecto)
+    except Exception:
+        # Sin archivo de secrets (por ejemplo, ejecución local con SQLite)
+        return valor_por_defecto
 
-client = init_google_sheets()
-if client is None:
+# "google_sheets" (producción) o "sqlite" (base local para pruebas y benchmarks)
+BACKEND_ALMACENAMIENTO = leer_configuracion("backend", "google_sheets")
+RUTA_SQLITE = leer_configuracion("ruta_sqlite", "base_polizas.db")
+
+if BACKEND_ALMACENAMIENTO not in ("google_sheets", "sqlite"):
+    st.error(f"❌ Backend de almacenamiento desconocido: '{BACKEND_ALMACENAMIENTO}'")
+    st.stop()
+
+# Qué hacer al capturar un No. POLIZA o una serie de auto que ya existen: bloquear, advertir o permitir
+POLITICA_DUPLICADOS = str(leer_configuracion("duplicados", POLITICA_ADVERTIR)).strip().lower()
+
+if POLITICA_DUPLICADOS not in POLITICAS_DUPLICADOS:
+    st.error(f"❌ Política de duplicados desconocida: '{POLITICA_DUPLICADOS}' (usa {', '.join(POLITICAS_DUPLICADOS)})")
     st.stop()
 
+# ============================================================
+# MÉTRICAS
+# ============================================================
+# Panel de métricas en la barra lateral (solo para administración)
+MOSTRAR_METRICAS = str(leer_configuracion("admin", "false")).lower() in ("1", "true", "si", "sí")
+# Archivo donde se publican las métricas: .json o texto de Prometheus (textfile collector)
+RUTA_METRICAS = leer_configuracion("ruta_metricas")
+INTERVALO_EXPORTACION_METRICAS = 15
+
+@st.cache_resource(show_spinner=False)
+def obtener_metricas():
+    """Métricas del proceso, compartidas por todas las sesiones"""
+    return RegistroMetricas()
+
+metricas = obtener_metricas()
+# Todo lo que se mida en esta ejecución queda etiquetado con la página
+metricas.iniciar_render()
+
+# ============================================================
+# CONFIGURACIÓN DE GOOGLE SHEETS
+# ============================================================
+def init_google_sheets():
+    """Autoriza el cliente de gspread; la conexión compartida lo llama una sola vez por proceso"""
+    if 'google_service_account' not in st.secrets:
+        raise KeyError("No se encontró 'google_service_account' en los secrets de Streamlit")
+
+    creds = Credentials.from_service_account_info(
+        st.secrets["google_service_account"],
+        scopes=["https://www.googleapis.com/auth/spreadsheets", 
+               "https://www.googleapis.com/auth/drive"]
+    )
+
+    client = gspread.authorize(creds)
+    # Bytes enviados y recibidos de cada respuesta de la API
+    client.http_client.session.hooks["response"].append(metricas.respuesta_http)
+    return client
+
 # ============================================================
 # CONFIGURACIÓN DE LA HOJA DE CÁLCULO
 # ============================================================
 SPREADSHEET_NAME = "base_poliza"
 
+# Presupuesto de llamadas por minuto a la API (la cuota de Google es de 60 por usuario)
+LECTURAS_POR_MINUTO = int(leer_configuracion("lecturas_por_minuto", 60))
+ESCRITURAS_POR_MINUTO = int(leer_configuracion("escrituras_por_minuto", 60))
+
 @st.cache_resource(show_spinner=False)
-def get_sheet_with_retry():
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            sheet = client.open(SPREADSHEET_NAME)
-            return sheet
-        except gspread.exceptions.APIError as e:
-            if "429" in str(e) and attempt < max_retries - 1:
-                wait_time = (2 ** attempt) + 2
-                time.sleep(wait_time)
-                continue
-            else:
-                st.error(f"❌ Error al abrir la hoja de cálculo después de {max_retries} intentos: {str(e)}")
-                st.stop()
-        except gspread.SpreadsheetNotFound:
-            st.error(f"❌ No se encontró el archivo '{SPREADSHEET_NAME}' en tu cuenta de Google.")
-            st.stop()
-        except Exception as e:
-            st.error(f"❌ Error inesperado al abrir la hoja de cálculo: {str(e)}")
-            st.stop()
+def obtener_cliente_sheets():
+    """Cliente compartido por todas las sesiones: reparte la cuota y reintenta los 429"""
+    return ClienteSheets(LECTURAS_POR_MINUTO, ESCRITURAS_POR_MINUTO, metricas=metricas)
 
-sheet = get_sheet_with_retry()
+@st.cache_resource(show_spinner=False)
+def obtener_conexion_sheets():
+    """Cliente autorizado, libro y hojas de trabajo, resueltos una vez por proceso"""
+    return ConexionSheets(init_google_sheets, SPREADSHEET_NAME, obtener_cliente_sheets())
+
+def abrir_hoja(title, headers):
+    """Hoja de trabajo compartida; solo la primera vez (o tras un fallo) consulta la API"""
+    try:
+        return obtener_conexion_sheets().hoja(title, headers)
+    except KeyError as e:
+        st.error(f"❌ {e.args[0]}")
+    except gspread.SpreadsheetNotFound:
+        st.error(f"❌ No se encontró el archivo '{SPREADSHEET_NAME}' en tu cuenta de Google.")
+    except gspread.exceptions.APIError as e:
+        st.error(f"❌ Error al abrir la hoja de cálculo: {str(e)}")
+    except Exception as e:
+        st.error(f"❌ Error al conectar con Google Sheets: {str(e)}")
+    return None
 
 # ============================================================
 # DEFINICIÓN DE CAMPOS Y CONFIGURACIONES
 # ============================================================
-CAMPOS_POLIZA = [
-    "No. Cliente", "CONTRATANTE", "ASEGURADO", "BENEFICIARIO",
-    "FECHA DE NAC CONTRATANTE", "FECHA DE NAC ASEGURADO", "ESTADO CIVIL",
-    "No. POLIZA", "INICIO DE VIGENCIA", "FIN DE VIGENCIA", "FORMA DE PAGO",
-    "FRECUENCIA DE PAGO", "PRIMA ANUAL", "PRODUCTO", "No Serie Auto",
-    "ASEGURADORA", "DIRECCIÓN", "TELEFONO", "EMAIL", "NOTAS", "DESCRIPCION AUTO"
-]
-
 ASEGURADORAS = [
     "ALLIANZ", "ANA SEGUROS", "BX+", "EL AGUILA", 
     "INSIGNIA LIFE", "MAPFRE", "QUALITAS"
@@ -157,96 +219,127 @@ OPCIONES_ESTADO_CIVIL = [
 # ============================================================
 # FUNCIONES PRINCIPALES
 # ============================================================
-def ensure_sheet_exists(sheet, title, headers):
-    max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            worksheet = sheet.worksheet(title)
-            return worksheet
-        except gspread.WorksheetNotFound:
-            try:
-                worksheet = sheet.add_worksheet(title=title, rows="1000", cols=str(len(headers)))
-                worksheet.append_row(headers)
-                return worksheet
-            except Exception as e:
-                if "429" in str(e) and attempt < max_retries - 1:
-                    time.sleep(2)
-                    continue
-                else:
-                    return None
-        except Exception as e:
-            return None
+# Segundos que una copia sincronizada se considera vigente; al vencer se sigue
+# mostrando mientras un hilo de fondo la actualiza
+TTL_DATOS = 300
+
+@st.cache_resource(show_spinner=False)
+def obtener_sincronizador(nombre, _repositorio):
+    """Copia local compartida de una hoja, actualizada con sincronización delta"""
+    return SincronizadorDelta(_repositorio, "No. POLIZA")
+
+def obtener_copia(nombre, sincronizador):
+    """Copia local de una hoja; cuenta como fallo de caché si hubo que esperar una carga"""
+    with metricas.cargando(nombre) as medicion:
+        version = sincronizador.version
+        registros = sincronizador.obtener(TTL_DATOS)
+        if sincronizador.version != version:
+            medicion["resultado"] = "fallo"
+        return registros
 
-@st.cache_data(ttl=300)
 def obtener_polizas_cached():
-    max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            return polizas_ws.get_all_records()
-        except Exception as e:
-            if "429" in str(e) and attempt < max_retries - 1:
-                time.sleep(2)
-                continue
-            else:
-                return []
+    # Los reintentos por cuota los hace el cliente de Sheets
+    try:
+        return obtener_copia("polizas", sincronizador_polizas)
+    except Exception as e:
+        # Solo falla si no hay ninguna copia: mostrar "no hay pólizas" sería engañoso
+        st.error(f"❌ No se pudieron cargar las pólizas: {str(e)}")
+        st.stop()
 
 def obtener_polizas():
     return obtener_polizas_cached()
 
-@st.cache_data(ttl=300)
 def obtener_cancelaciones_cached():
-    max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            return cancelaciones_ws.get_all_records()
-        except Exception as e:
-            if "429" in str(e) and attempt < max_retries - 1:
-                time.sleep(2)
-                continue
-            else:
-                return []
+    try:
+        return obtener_copia("cancelaciones", sincronizador_cancelaciones)
+    except Exception as e:
+        # Solo falla si no hay ninguna copia: mostrar "no hay cancelaciones" sería engañoso
+        st.error(f"❌ No se pudieron cargar las cancelaciones: {str(e)}")
+        st.stop()
 
 def obtener_cancelaciones():
     return obtener_cancelaciones_cached()
 
+def mostrar_frescura_datos(hojas):
+    """Hora de la última sincronización y aviso si se están mostrando datos anteriores"""
+    sincronizadores = {"Polizas": ("pólizas", sincronizador_polizas),
+                       "Cancelaciones": ("cancelaciones", sincronizador_cancelaciones)}
+    for nombre, sincronizador in (sincronizadores[hoja] for hoja in hojas):
+        if not sincronizador.cargado:
+            continue
+        hora = datetime.fromtimestamp(sincronizador.ultima_sincronizacion).strftime('%d/%m/%Y %H:%M:%S')
+        if sincronizador.ultimo_error:
+            st.sidebar.warning(
+                f"⚠️ No se pudieron actualizar las {nombre}; se muestran los datos del {hora}. "
+                f"Error: {sincronizador.ultimo_error[:120]}"
+            )
+        else:
+            st.sidebar.caption(f"🕒 {nombre.capitalize()} actualizadas: {hora}")
+
+def mostrar_panel_metricas():
+    """Panel de administración: llamadas a la API, cuota, cargadores y descarga de las métricas"""
+    with st.sidebar.expander("🛠️ Métricas (admin)"):
+        recibidos = metricas.total("sheets_bytes_recibidos_total") / 1_000_000
+        st.write(f"**Llamadas a la API:** {metricas.total('sheets_llamadas_total')}")
+        st.write(f"**Respuestas 429:** {metricas.total('sheets_limites_cuota_total')}")
+        st.write(f"**Recibido:** {recibidos:,.2f} MB")
+        if BACKEND_ALMACENAMIENTO == "google_sheets":
+            for tipo, cubo in obtener_cliente_sheets().cubos.items():
+                st.caption(f"Cuota de {tipo}: {cubo.por_minuto}/min · {cubo.en_espera} en espera · "
+                           f"{cubo.estadisticas['segundos_espera']:.1f}s esperados")
+            conexion = obtener_conexion_sheets().estadisticas
+            st.caption(f"Conexión: {conexion['aperturas']} aperturas del libro · "
+                       f"{conexion['revalidaciones']} revalidaciones de hojas")
+        st.markdown("**Por página**")
+        st.dataframe(pd.DataFrame(metricas.resumen_paginas()), hide_index=True)
+        st.markdown("**Por operación**")
+        st.dataframe(pd.DataFrame(metricas.resumen_api()), hide_index=True)
+        st.markdown("**Cargadores**")
+        st.dataframe(pd.DataFrame(metricas.resumen_cargadores()), hide_index=True)
+        st.download_button("📥 Prometheus (texto)", data=metricas.a_prometheus,
+                           file_name="metricas.prom", mime="text/plain", key="metricas_prom_btn")
+        st.download_button("📥 JSON", data=lambda: json.dumps(metricas.a_json(), ensure_ascii=False),
+                           file_name="metricas.json", mime="application/json", key="metricas_json_btn")
+
 def clear_polizas_cache():
-    st.cache_data.clear()
+    """Descarta las copias locales; la próxima lectura recarga ambas hojas completas.
+
+    Las escrituras de la app no pasan por aquí: cada una actualiza en sitio solo
+    la hoja que tocó y sube su versión, de modo que los datos derivados (índices,
+    fechas, resumen) de la otra hoja siguen siendo válidos.
+    """
+    sincronizador_polizas.reiniciar()
+    sincronizador_cancelaciones.reiniciar()
+
+@metricas.cargador("indices", st.cache_resource(show_spinner=False, max_entries=2))
+def construir_indices_polizas(version, _registros):
+    """Índices secundarios de una versión de datos; se construyen una sola vez por versión"""
+    return IndicesPolizas(_registros, version)
+
+def obtener_indices_polizas():
+    obtener_polizas()  # sincroniza si la copia venció
+    version, registros = sincronizador_polizas.instantanea()
+    return construir_indices_polizas(version, registros)
 
 def obtener_ultimo_id_cliente():
     try:
-        polizas = obtener_polizas()
-        if not polizas:
-            return 0
-        
-        ids_clientes = []
-        for poliza in polizas:
-            id_cliente = poliza.get("No. Cliente", "")
-            if id_cliente and str(id_cliente).isdigit():
-                ids_clientes.append(int(id_cliente))
-        
-        return max(ids_clientes) if ids_clientes else 0
+        return obtener_indices_polizas().ultimo_id_cliente
     except Exception:
         return 0
 
 def generar_nuevo_id_cliente():
-    ultimo_id = obtener_ultimo_id_cliente()
-    return ultimo_id + 1
+    """Siguiente No. Cliente de la secuencia compartida; nunca repite uno ya asignado"""
+    try:
+        asignador_ids = obtener_asignador_ids()
+    except Exception as e:
+        st.error(f"❌ No se pudo inicializar la hoja de metadatos: {str(e)}")
+        st.stop()
+    # El último ID de la hoja solo sirve de piso por si alguien asignó IDs a mano
+    return asignador_ids.siguiente(minimo=obtener_ultimo_id_cliente() + 1)
 
-@st.cache_data(ttl=300)
 def obtener_clientes_unicos_cached():
     try:
-        polizas = obtener_polizas()
-        if not polizas:
-            return []
-        
-        clientes = {}
-        for poliza in polizas:
-            contratante = poliza.get("CONTRATANTE", "")
-            id_cliente = poliza.get("No. Cliente", "")
-            if contratante:
-                clientes[contratante] = id_cliente
-        
-        return sorted(clientes.keys())
+        return obtener_indices_polizas().contratantes
     except Exception:
         return []
 
@@ -255,127 +348,572 @@ def obtener_clientes_unicos():
 
 def buscar_por_nombre_cliente(nombre_cliente):
     try:
-        polizas = obtener_polizas()
-        resultados = [p for p in polizas if p.get("CONTRATANTE", "") == nombre_cliente]
-        return resultados
+        return list(obtener_indices_polizas().polizas_de_contratante(nombre_cliente))
     except Exception:
         return []
 
-def agregar_poliza(datos):
-    max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            datos_str = [str(dato) if dato is not None else "" for dato in datos]
-            polizas_ws.append_row(datos_str)
-            clear_polizas_cache()
+def buscar_por_nombres_cliente(nombres):
+    """Pólizas de todas las variantes con que se capturó el nombre de un cliente"""
+    return [poliza for nombre in nombres for poliza in buscar_por_nombre_cliente(nombre)]
+
+def obtener_id_cliente_o_nuevo(nombre_contratante):
+    """No. Cliente del contratante si ya existe (sin distinguir mayúsculas) o uno nuevo"""
+    id_cliente = obtener_indices_polizas().id_de_contratante(nombre_contratante)
+    if id_cliente is not None:
+        return id_cliente
+    # Sus pólizas en la cola todavía no están en el índice, pero ya tienen No. Cliente
+    nombre = normalizar_contratante(nombre_contratante)
+    for fila in cola_polizas.filas_pendientes():
+        pendiente = fila_a_registro(CAMPOS_POLIZA, fila)
+        if normalizar_contratante(pendiente["CONTRATANTE"]) == nombre and valor_clave(pendiente["No. Cliente"]):
+            return valor_clave(pendiente["No. Cliente"])
+    return str(generar_nuevo_id_cliente())
+
+# Las escrituras se agrupan en lotes de append_rows por tamaño o por plazo
+TAM_LOTE_ESCRITURA = 50
+PLAZO_LOTE_ESCRITURA = 1.0
+# Segundos que el formulario espera la confirmación antes de dejar la fila en cola
+ESPERA_CONFIRMACION = 10
+
+@st.cache_resource(show_spinner=False)
+def obtener_cola_escritura(nombre, _repositorio, _sincronizador, _indice=None):
+    """Cola de escritura compartida por todas las sesiones para una hoja"""
+    def al_confirmar_lote(filas):
+        registros = [fila_a_registro(CAMPOS_POLIZA, fila) for fila in filas]
+        if _indice is not None and _indice.construido:
+            _indice.registrar_altas(registros)
+        # Se parchea la copia local en lugar de descartarla: solo sube la versión de esta hoja
+        _sincronizador.aplicar_altas(registros)
+    return ColaEscritura(
+        _repositorio,
+        tam_lote=TAM_LOTE_ESCRITURA,
+        plazo=PLAZO_LOTE_ESCRITURA,
+        al_confirmar_lote=al_confirmar_lote
+    )
+
+def registrar_escritura(nombre_cola, ticket, descripcion):
+    """Guarda el ticket en la sesión para mostrar su estado tras los reruns"""
+    if 'escrituras' not in st.session_state:
+        st.session_state.escrituras = []
+    st.session_state.escrituras.append({
+        "cola": nombre_cola,
+        "ticket": ticket,
+        "descripcion": descripcion,
+        "hora": datetime.now().strftime("%H:%M:%S")
+    })
+
+def mostrar_estado_escrituras():
+    """Muestra el estado de confirmación de las escrituras encoladas en esta sesión"""
+    escrituras = st.session_state.get('escrituras', [])
+    if not escrituras:
+        return
+    colas = {"Polizas": cola_polizas, "Cancelaciones": cola_cancelaciones}
+    iconos = {ESTADO_PENDIENTE: "⏳", ESTADO_CONFIRMADO: "✅", ESTADO_ERROR: "❌"}
+    filas = []
+    for escritura in escrituras[-20:]:
+        estado = colas[escritura["cola"]].estado(escritura["ticket"])
+        filas.append({
+            "Hora": escritura["hora"],
+            "Registro": escritura["descripcion"],
+            "Estado": f"{iconos.get(estado['estado'], '')} {estado['estado']}",
+            "Detalle": estado.get("mensaje", "")
+        })
+    hay_pendientes = any("confirmado" not in f["Estado"] for f in filas)
+    with st.expander("📤 Estado de guardado", expanded=hay_pendientes):
+        st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+
+@st.cache_resource(show_spinner=False)
+def obtener_indice_filas():
+    """Índice compartido (No. POLIZA, No. Cliente) -> fila física en la hoja de pólizas"""
+    return IndiceFilas(("No. POLIZA", "No. Cliente"))
+
+def indice_filas_polizas():
+    """Devuelve el índice de filas, construyéndolo desde la copia local la primera vez"""
+    with indice_filas.lock:
+        if not indice_filas.construido:
+            indice_filas.reconstruir(obtener_polizas())
+    return indice_filas
+
+def coincide_registro(registro, poliza_data):
+    """Compara campo a campo una fila leída de la hoja con la póliza esperada"""
+    return all(
+        valor_clave(registro.get(campo, "")) == valor_clave(poliza_data.get(campo, ""))
+        for campo in CAMPOS_POLIZA
+    )
+
+def localizar_fila_poliza(poliza_data):
+    """Fila física de la póliza, verificada con una lectura puntual de esa fila.
+
+    Si la fila calculada no coincide (la hoja cambió por fuera de la app) el
+    índice se reconstruye desde las columnas clave y se intenta una vez más.
+    """
+    indice = indice_filas_polizas()
+    with indice.lock:
+        for intento in range(2):
+            for fila in indice.buscar(poliza_data):
+                leidos = repo_polizas.leer_rango(fila, fila)
+                if leidos and coincide_registro(leidos[0], poliza_data):
+                    return fila
+            if intento == 0:
+                indice.reconstruir_desde_columnas(repo_polizas.leer_columnas(indice.campos))
+    return None
+
+def cancelar_poliza(poliza_data):
+    """Mueve la póliza a Cancelaciones y, una vez escrita, la elimina de Pólizas.
+
+    Devuelve True solo si ambos pasos se confirmaron; si no, informa por qué.
+    """
+    try:
+        datos_cancelacion = [poliza_data.get(campo, '') for campo in CAMPOS_POLIZA]
+
+        def eliminar_de_activas():
+            # Se localiza y elimina bajo el candado del índice para que otra
+            # cancelación no desplace las filas entre la verificación y el borrado
+            indice = indice_filas_polizas()
+            with indice.lock:
+                fila = localizar_fila_poliza(poliza_data)
+                if fila is None:
+                    raise LookupError(f"No se encontró la póliza {poliza_data.get('No. POLIZA', '')} en la hoja")
+                repo_polizas.eliminar(fila)
+                indice.registrar_baja(fila)
+                sincronizador_polizas.aplicar_baja(fila, esperado=poliza_data)
+
+        indice = indice_filas_polizas()
+        if not indice.buscar(poliza_data):
+            indice.reconstruir_desde_columnas(repo_polizas.leer_columnas(indice.campos))
+        if not indice.buscar(poliza_data):
+            st.error(f"❌ La póliza {poliza_data.get('No. POLIZA', '')} ya no está en la hoja de pólizas activas")
+            return False
+
+        estado = mover_a_cancelaciones(datos_cancelacion, al_confirmar=eliminar_de_activas)
+        if estado == ESTADO_CONFIRMADO:
             return True
-        except Exception as e:
-            if "429" in str(e) and attempt < max_retries - 1:
-                time.sleep(2)
-                continue
-            else:
-                return False
+        if estado == ESTADO_PENDIENTE:
+            st.info(f"⏳ La cancelación de la póliza {poliza_data.get('No. POLIZA', '')} está en proceso; "
+                    "revisa su avance en \"Estado de guardado\".")
+        else:
+            st.error(f"❌ No se pudo cancelar la póliza {poliza_data.get('No. POLIZA', '')}; "
+                     "el detalle está en \"Estado de guardado\".")
+        return False
+    except Exception as e:
+        st.error(f"❌ Error al cancelar póliza: {str(e)}")
+        return False
 
-def mover_a_cancelaciones(datos):
-    max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            datos_str = [str(dato) if dato is not None else "" for dato in datos]
-            cancelaciones_ws.append_row(datos_str)
-            clear_polizas_cache()
+# Estado de una póliza que no se encoló por repetir un No. POLIZA o una serie
+ESTADO_DUPLICADA = "duplicada"
+
+def revisar_duplicados(datos, aceptar_duplicado=False):
+    """Aplica la política de duplicados a una fila nueva; devuelve True si se puede guardar"""
+    if POLITICA_DUPLICADOS == POLITICA_PERMITIR:
+        return True
+    # Lo que sigue en la cola todavía no está en el índice, pero también cuenta
+    pendientes = [fila_a_registro(CAMPOS_POLIZA, fila) for fila in cola_polizas.filas_pendientes()]
+    duplicados = duplicados_al_insertar(fila_a_registro(CAMPOS_POLIZA, datos), obtener_indices_polizas(), pendientes)
+    if not duplicados:
+        return True
+    for duplicado in duplicados:
+        polizas = ", ".join(duplicado.polizas[:5]) + ("…" if len(duplicado.polizas) > 5 else "")
+        mensaje = f"{duplicado.campo} '{duplicado.valor}' ya está registrado en: {polizas}"
+        if POLITICA_DUPLICADOS == POLITICA_BLOQUEAR:
+            st.error(f"❌ {mensaje}")
+        else:
+            st.warning(f"⚠️ {mensaje}")
+    if POLITICA_DUPLICADOS == POLITICA_ADVERTIR:
+        if aceptar_duplicado:
             return True
-        except Exception as e:
-            if "429" in str(e) and attempt < max_retries - 1:
-                time.sleep(2)
-                continue
-            else:
-                return False
+        st.info("ℹ️ Marca la casilla para guardar de todos modos y vuelve a enviar el formulario")
+    return False
+
+def agregar_poliza(datos, aceptar_duplicado=False):
+    """Encola la póliza y espera brevemente su confirmación; devuelve el estado del ticket.
+
+    Si repite un No. POLIZA o una serie y la política no lo permite, no se
+    encola y devuelve ESTADO_DUPLICADA.
+    """
+    if not revisar_duplicados(datos, aceptar_duplicado):
+        return ESTADO_DUPLICADA
+    ticket = cola_polizas.encolar(datos)
+    registrar_escritura("Polizas", ticket, f"Póliza {datos[7]}")
+    return cola_polizas.esperar(ticket, ESPERA_CONFIRMACION)
+
+def mover_a_cancelaciones(datos, al_confirmar=None):
+    """Encola la fila en Cancelaciones; `al_confirmar` se ejecuta cuando queda escrita"""
+    ticket = cola_cancelaciones.encolar(datos, al_confirmar=al_confirmar)
+    registrar_escritura("Cancelaciones", ticket, f"Cancelación {datos[7]}")
+    return cola_cancelaciones.esperar(ticket, ESPERA_CONFIRMACION)
+
+# Filas por append_rows al importar y pausa entre bloques: una escritura por
+# segundo queda por debajo de la cuota de escritura de Google Sheets
+TAM_BLOQUE_IMPORTACION = 200
+PAUSA_IMPORTACION = 1.0
+
+def escribir_importacion(lote, reanudar=False):
+    """Escribe el lote por bloques mostrando el avance; si se detiene, queda en la sesión para reanudar"""
+    # Lo que espera en la cola se escribe antes para no intercalarlo con la importación
+    cola_polizas.vaciar()
+    if reanudar:
+        # El bloque que falló pudo quedar escrito: se relee la hoja y se omiten esas pólizas
+        sincronizador_polizas.sincronizar()
+        lote.descartar_existentes(obtener_indices_polizas().por_poliza, CAMPOS_POLIZA.index("No. POLIZA"))
+    progreso = st.progress(lote.escritas / max(lote.total, 1), text=f"Escritas {lote.escritas} de {lote.total} pólizas")
+
+    def al_avanzar(escritas, total):
+        progreso.progress(escritas / total, text=f"Escritas {escritas} de {total} pólizas")
+
+    try:
+        # Cada bloque confirmado actualiza el índice de filas y la copia local como un lote de la cola
+        lote.escribir(repo_polizas, al_escribir_bloque=cola_polizas.al_confirmar_lote, al_avanzar=al_avanzar)
+    except Exception as e:
+        st.error(f"❌ Importación detenida en {lote.escritas} de {lote.total} pólizas: {str(e)}")
+        return False
+    mensaje = f"✅ Se importaron {lote.escritas} póliza(s)"
+    if lote.descartadas:
+        mensaje += f"; {lote.descartadas} ya estaban escritas y se omitieron"
+    st.success(mensaje)
+    return True
+
+@metricas.cargador("fechas", st.cache_resource(show_spinner=False, max_entries=2))
+def construir_fechas_polizas(version, _registros):
+    """Columnas de fecha tipadas (datetime64) de una versión de datos"""
+    return construir_columnas_fecha(_registros)
+
+def obtener_fechas_polizas():
+    """Devuelve (registros, fechas) de la misma versión; las fechas se convierten una vez por versión"""
+    obtener_polizas()  # sincroniza si la copia venció
+    version, registros = sincronizador_polizas.instantanea()
+    return registros, construir_fechas_polizas(version, registros)
+
+@metricas.cargador("tabla", st.cache_resource(show_spinner=False, max_entries=4))
+def construir_tabla_cached(nombre, version, _registros, _fechas=None):
+    """DataFrame tipado de una versión de datos; las páginas solo toman cortes de él"""
+    return construir_tabla(_registros, CAMPOS_POLIZA, _fechas)
+
+def obtener_tabla_polizas_versionada():
+    """Devuelve (version, tabla) de la misma versión"""
+    obtener_polizas()  # sincroniza si la copia venció
+    version, registros = sincronizador_polizas.instantanea()
+    return version, construir_tabla_cached("Polizas", version, registros, construir_fechas_polizas(version, registros))
+
+def obtener_tabla_polizas():
+    return obtener_tabla_polizas_versionada()[1]
+
+@metricas.cargador("busqueda_texto", st.cache_resource(show_spinner=False, max_entries=2))
+def construir_busqueda_texto(version, _tabla):
+    """Columnas factorizadas para el filtro de texto libre de una versión de datos"""
+    return BusquedaTexto(_tabla)
+
+@metricas.cargador("busqueda_clientes", st.cache_resource(show_spinner=False, max_entries=2))
+def construir_indice_clientes(version, _tabla):
+    """Índice de nombres (trigramas), IDs, pólizas, teléfonos y emails de una versión de datos"""
+    return IndiceClientes(_tabla, version)
+
+def obtener_indice_clientes():
+    version, tabla = obtener_tabla_polizas_versionada()
+    return construir_indice_clientes(version, tabla)
+
+# Clientes sugeridos por cada búsqueda en Consultar
+LIMITE_SUGERENCIAS = 10
+
+def sugerir_clientes(consulta, limite=LIMITE_SUGERENCIAS):
+    """Clientes que mejor coinciden con lo escrito (nombre, No. Cliente, póliza, teléfono o email)"""
+    return obtener_indice_clientes().buscar(consulta, limite)
+
+@metricas.cargador("orden", st.cache_resource(show_spinner=False, max_entries=16))
+def ordenar_tabla_cached(version, columna, descendente, _tabla):
+    """Orden de filas por columna; se calcula una vez por versión, columna y sentido"""
+    return ordenar_posiciones(_tabla, columna, descendente)
+
+def obtener_tabla_cancelaciones_versionada():
+    """Devuelve (version, tabla) de la misma versión"""
+    obtener_cancelaciones()
+    version, registros = sincronizador_cancelaciones.instantanea()
+    return version, construir_tabla_cached("Cancelaciones", version, registros)
+
+TABLA_VACIA = construir_tabla([], CAMPOS_POLIZA)
+
+@st.cache_resource(show_spinner=False)
+def obtener_auditor(nombre):
+    """Auditor compartido por las sesiones: recuerda los hallazgos de las filas ya revisadas"""
+    return AuditorHoja(nombre)
+
+@metricas.cargador("auditoria", st.cache_resource(show_spinner=False, max_entries=4))
+def auditar_hoja_cached(nombre, version, anio, _registros):
+    """Hallazgos de una versión de datos; solo se evalúan las filas que cambiaron desde la anterior"""
+    return obtener_auditor(nombre).auditar(_registros, anio_actual=anio)
+
+@metricas.cargador("duplicados", st.cache_resource(show_spinner=False, max_entries=2))
+def reporte_duplicados_cached(version, _registros):
+    """Pólizas y clientes duplicados de una versión de datos de Pólizas"""
+    return reporte_duplicados(_registros)
+
+def obtener_reporte_duplicados():
+    """Devuelve (version, reporte de duplicados) de Pólizas"""
+    obtener_polizas()
+    version, registros = sincronizador_polizas.instantanea()
+    return version, reporte_duplicados_cached(version, registros)
+
+def auditar_hojas():
+    """Devuelve {hoja: (version, hallazgos)} de Pólizas y Cancelaciones"""
+    obtener_polizas()
+    obtener_cancelaciones()
+    resultado = {}
+    for nombre, sincronizador in (("Polizas", sincronizador_polizas), ("Cancelaciones", sincronizador_cancelaciones)):
+        version, registros = sincronizador.instantanea()
+        resultado[nombre] = (version, auditar_hoja_cached(nombre, version, datetime.now().year, registros))
+    return resultado
+
+@st.cache_resource(show_spinner=False)
+def obtener_indice_texto(nombre):
+    """Índice de texto compartido por las sesiones: se pone al día con las altas y bajas de su hoja"""
+    return IndiceTextoCompleto(nombre)
+
+def indices_texto_completo(hojas=("Polizas", "Cancelaciones")):
+    """Devuelve {hoja: índice de texto} al día con la copia local de cada hoja"""
+    sincronizadores = {"Polizas": (obtener_polizas, sincronizador_polizas),
+                       "Cancelaciones": (obtener_cancelaciones, sincronizador_cancelaciones)}
+    indices = {}
+    for nombre in hojas:
+        obtener, sincronizador = sincronizadores[nombre]
+        obtener()  # sincroniza si la copia venció
+        indice = obtener_indice_texto(nombre)
+        with metricas.cargando("texto_completo") as medicion:
+            # Solo una recarga de la hoja obliga a reindexarla completa
+            if not indice.actualizar(sincronizador):
+                medicion["resultado"] = "fallo"
+        indices[nombre] = indice
+    return indices
+
+# Registros que muestra la búsqueda de texto, los más relevantes primero
+LIMITE_RESULTADOS_TEXTO = 200
+
+def buscar_texto_completo(consulta, hojas=("Polizas", "Cancelaciones"), columnas=None, limite=LIMITE_RESULTADOS_TEXTO):
+    """Tabla de los registros de las hojas elegidas que coinciden con la consulta, ordenados por puntaje"""
+    tablas_versionadas = {"Polizas": obtener_tabla_polizas_versionada,
+                          "Cancelaciones": obtener_tabla_cancelaciones_versionada}
+    indices = indices_texto_completo(hojas)
+    encontrados = sorted(
+        ((nombre, resultado) for nombre, indice in indices.items() for resultado in indice.buscar(consulta, columnas, limite)),
+        key=lambda par: -par[1].puntaje
+    )[:limite]
+
+    partes = []
+    for nombre, indice in indices.items():
+        resultados = [resultado for hoja, resultado in encontrados if hoja == nombre]
+        version, tabla = tablas_versionadas[nombre]()
+        if indice.version == version:
+            # Las filas ya están tipadas en la tabla de la misma versión: solo se toman
+            parte = tabla.take([resultado.fila - PRIMERA_FILA_DATOS for resultado in resultados]).reset_index(drop=True)
+        else:
+            parte = construir_tabla([resultado.registro for resultado in resultados], CAMPOS_POLIZA)
+        parte.insert(0, "Hoja", nombre)
+        parte.insert(1, "Fila", [resultado.fila for resultado in resultados])
+        parte.insert(2, "Puntaje", [round(resultado.puntaje, 2) for resultado in resultados])
+        parte.insert(3, "Coincide en", [", ".join(resultado.columnas) for resultado in resultados])
+        partes.append(parte)
+    tabla = pd.concat(partes, ignore_index=True)
+    return tabla.sort_values("Puntaje", ascending=False, kind="stable").reset_index(drop=True)
+
+# Vista paginada de "Ver Todas las Pólizas"
+COLUMNAS_VISIBLES_VER_TODAS = [
+    "No. Cliente", "CONTRATANTE", "No. POLIZA", "PRODUCTO", "ASEGURADORA",
+    "INICIO DE VIGENCIA", "FIN DE VIGENCIA", "PRIMA ANUAL"
+]
+TAMAÑOS_PAGINA = [25, 50, 100, 250]
+# Horizonte de la hoja "Vencimientos" del libro descargable
+DIAS_LIBRO_VENCIMIENTOS = 30
+
+# Formato de las columnas tipadas en st.dataframe
+CONFIG_COLUMNAS_TABLA = {
+    **{campo: st.column_config.DateColumn(campo, format="DD/MM/YYYY") for campo in COLUMNAS_FECHA},
+    "PRIMA ANUAL": st.column_config.NumberColumn("PRIMA ANUAL", format="$%.2f"),
+}
+
+# ============================================================
+# EXPORTACIONES BAJO DEMANDA
+# ============================================================
+@st.cache_resource(show_spinner=False)
+def obtener_cache_exportaciones():
+    """Archivos generados compartidos por todas las sesiones"""
+    return CacheExportaciones(max_entradas=8)
+
+def boton_descarga(etiqueta, nombre_archivo, hojas, clave, key):
+    """Selector de formato y botón de descarga; el archivo se genera solo al hacer clic.
+
+    `hojas` es un diccionario nombre -> DataFrame y `clave` identifica su
+    contenido (incluida la versión de datos) para reutilizar el archivo ya
+    generado; con `clave=None` no se guarda. Ambos pueden ser funciones sin
+    argumentos para cargar los datos solo al hacer clic; una función de
+    hojas cuenta como varias hojas al elegir los formatos.
+    """
+    formatos = formatos_disponibles(varias_hojas=callable(hojas) or len(hojas) > 1)
+    if not formatos:
+        st.caption("ℹ️ Instala XlsxWriter para descargar varias hojas en un solo archivo")
+        return
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        formato = st.selectbox(
+            "Formato", formatos, format_func=lambda f: FORMATOS[f]["etiqueta"],
+            key=f"formato_{key}", label_visibility="collapsed"
+        )
+    cache = obtener_cache_exportaciones()
+
+    def generar():
+        clave_contenido = clave() if callable(clave) else clave
+        clave_archivo = None if clave_contenido is None else (*clave_contenido, formato)
+        return cache.obtener(clave_archivo, lambda: exportar(hojas() if callable(hojas) else hojas, formato))
+
+    with col2:
+        st.download_button(
+            label=etiqueta,
+            # Streamlit ejecuta la función en otro hilo solo cuando se hace clic
+            data=generar,
+            file_name=f"{nombre_archivo}.{FORMATOS[formato]['extension']}",
+            mime=FORMATOS[formato]["mime"],
+            key=key
+        )
+
+@metricas.cargador("indice_vencimientos", st.cache_resource(show_spinner=False, max_entries=2))
+def construir_indice_vencimientos(version, _registros, _fechas):
+    """Índice ordenado de FIN DE VIGENCIA de una versión de datos"""
+    return IndiceVencimientos(_registros, _fechas["FIN DE VIGENCIA"])
+
+def obtener_indice_vencimientos():
+    """Devuelve (tabla, índice de vencimientos) de la misma versión"""
+    obtener_polizas()  # sincroniza si la copia venció
+    version, registros = sincronizador_polizas.instantanea()
+    fechas = construir_fechas_polizas(version, registros)
+    return (construir_tabla_cached("Polizas", version, registros, fechas),
+            construir_indice_vencimientos(version, registros, fechas))
+
+def obtener_polizas_por_vencimiento(desde, hasta):
+    """Pólizas con FIN DE VIGENCIA entre dos fechas (inclusive), ordenadas por vencimiento"""
+    try:
+        tabla, indice = obtener_indice_vencimientos()
+        return tabla.take(indice.en_rango(desde, hasta))
+    except Exception:
+        return TABLA_VACIA
 
-@st.cache_data(ttl=600)
 def obtener_polizas_proximas_vencer(dias=30):
+    hoy = datetime.now().date()
+    return obtener_polizas_por_vencimiento(hoy, hoy + timedelta(days=dias))
+
+def obtener_polizas_vencidas_sin_renovar(dias_atras=None):
+    """Pólizas ya vencidas sin otra vigencia posterior del mismo cliente y producto"""
     try:
-        polizas = obtener_polizas()
-        hoy = datetime.now().date()
-        fecha_limite = hoy + timedelta(days=dias)
-        
-        polizas_proximas = []
-        
-        for poliza in polizas:
-            fecha_fin = poliza.get("FIN DE VIGENCIA", "")
-            if fecha_fin:
-                try:
-                    if isinstance(fecha_fin, str):
-                        for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y']:
-                            try:
-                                fecha_fin_dt = datetime.strptime(fecha_fin, fmt).date()
-                                break
-                            except ValueError:
-                                continue
-                        else:
-                            continue
-                    else:
-                        continue
-                    
-                    if hoy <= fecha_fin_dt <= fecha_limite:
-                        polizas_proximas.append(poliza)
-                        
-                except Exception:
-                    continue
-        
-        return polizas_proximas
+        tabla, indice = obtener_indice_vencimientos()
+        return tabla.take(indice.vencidas_sin_renovar(datetime.now().date(), dias_atras))
+    except Exception:
+        return TABLA_VACIA
+
+@metricas.cargador("indice_cumpleaños", st.cache_resource(show_spinner=False, max_entries=2))
+def construir_indice_cumpleaños(version, _registros, _fechas):
+    """Índice (mes, día) de nacimientos de contratantes y asegurados de una versión de datos"""
+    return IndiceCumpleaños(_registros, _fechas)
+
+def obtener_indice_cumpleaños():
+    obtener_polizas()  # sincroniza si la copia venció
+    version, registros = sincronizador_polizas.instantanea()
+    fechas = construir_fechas_polizas(version, registros)
+    return construir_indice_cumpleaños(version, registros, fechas)
+
+def obtener_cumpleaños_mes_actual():
+    """Contratantes y asegurados que cumplen años en el mes actual, ordenados por día"""
+    try:
+        hoy = datetime.now()
+        return obtener_indice_cumpleaños().del_mes(hoy.year, hoy.month)
     except Exception as e:
         return []
 
-def obtener_cumpleaños_mes_actual():
+def obtener_cumpleaños_proximos(dias=30):
+    """Cumpleaños de hoy a `dias` días, cruzando fin de mes y de año"""
     try:
-        polizas = obtener_polizas()
-        mes_actual = datetime.now().month
-        
-        cumpleaños_mes = []
-        
-        for poliza in polizas:
-            fecha_nac = poliza.get("FECHA DE NAC CONTRATANTE", "")
-            contratante = poliza.get("CONTRATANTE", "")
-            
-            if fecha_nac and contratante:
-                try:
-                    for fmt in ['%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y']:
-                        try:
-                            fecha_nac_dt = datetime.strptime(fecha_nac, fmt)
-                            break
-                        except ValueError:
-                            continue
-                    else:
-                        continue
-                    
-                    if fecha_nac_dt.month == mes_actual:
-                        cumpleaños_mes.append({
-                            "CONTRATANTE": contratante,
-                            "FECHA DE NACIMIENTO": fecha_nac_dt.strftime('%d/%m/%Y'),
-                            "DÍA": fecha_nac_dt.day
-                        })
-                        
-                except Exception:
-                    continue
-        
-        cumpleaños_mes.sort(key=lambda x: x["DÍA"])
-        return cumpleaños_mes
-        
+        return obtener_indice_cumpleaños().proximos(datetime.now().date(), dias)
     except Exception as e:
         return []
 
+@metricas.cargador("resumen", st.cache_resource(show_spinner=False, max_entries=4))
+def calcular_resumen_cartera(version_polizas, version_cancelaciones, hoy, _registros, _cancelaciones):
+    """Resumen del panel lateral; se calcula una vez por versión de datos y día"""
+    fechas = construir_fechas_polizas(version_polizas, _registros)
+    return ResumenCartera(
+        construir_tabla_cached("Polizas", version_polizas, _registros, fechas),
+        _cancelaciones,
+        construir_indice_vencimientos(version_polizas, _registros, fechas),
+        construir_indice_cumpleaños(version_polizas, _registros, fechas),
+        hoy
+    )
+
+def obtener_resumen_cartera(cargar=True):
+    """Resumen de la cartera; con `cargar=False` usa las copias locales tal como están"""
+    if cargar:
+        obtener_polizas()
+        obtener_cancelaciones()
+    version_polizas, registros = sincronizador_polizas.instantanea()
+    version_cancelaciones, cancelaciones = sincronizador_cancelaciones.instantanea()
+    return calcular_resumen_cartera(
+        version_polizas, version_cancelaciones, datetime.now().date(), registros, cancelaciones
+    )
+
 # ============================================================
 # INICIALIZAR HOJAS DE TRABAJO
 # ============================================================
-polizas_ws = ensure_sheet_exists(sheet, "Polizas", CAMPOS_POLIZA)
-if polizas_ws is None:
-    st.error("❌ No se pudo inicializar la hoja de pólizas")
-    st.stop()
+# Campos con índice en el almacenamiento local para búsquedas por clave
+CAMPOS_CLAVE = ["No. Cliente", "CONTRATANTE", "No. POLIZA", "No Serie Auto"]
 
-cancelaciones_ws = ensure_sheet_exists(sheet, "Cancelaciones", CAMPOS_POLIZA)
-if cancelaciones_ws is None:
-    st.error("❌ No se pudo inicializar la hoja de cancelaciones")
-    st.stop()
+@st.cache_resource(show_spinner=False)
+def obtener_repositorio_sqlite(nombre):
+    return RepositorioSQLite(RUTA_SQLITE, nombre, CAMPOS_POLIZA, claves=CAMPOS_CLAVE)
+
+@st.cache_resource(show_spinner=False)
+def crear_repositorio_sheets(nombre, _worksheet):
+    """Repositorio compartido; los encabezados de la hoja se verifican una sola vez"""
+    return RepositorioGoogleSheets(_worksheet, CAMPOS_POLIZA)
+
+def obtener_repositorio_sheets(nombre):
+    """Repositorio sobre la hoja compartida; en los reruns no hace llamadas a la API"""
+    worksheet = abrir_hoja(nombre, CAMPOS_POLIZA)
+    if worksheet is None:
+        return None
+    try:
+        return crear_repositorio_sheets(nombre, worksheet)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return None
+
+if BACKEND_ALMACENAMIENTO == "sqlite":
+    repo_polizas = obtener_repositorio_sqlite("Polizas")
+    repo_cancelaciones = obtener_repositorio_sqlite("Cancelaciones")
+else:
+    repo_polizas = obtener_repositorio_sheets("Polizas")
+    if repo_polizas is None:
+        st.error("❌ No se pudo inicializar la hoja de pólizas")
+        st.stop()
+
+    repo_cancelaciones = obtener_repositorio_sheets("Cancelaciones")
+    if repo_cancelaciones is None:
+        st.error("❌ No se pudo inicializar la hoja de cancelaciones")
+        st.stop()
+
+sincronizador_polizas = obtener_sincronizador("Polizas", repo_polizas)
+sincronizador_cancelaciones = obtener_sincronizador("Cancelaciones", repo_cancelaciones)
+
+# IDs de cliente que cada proceso reserva de a bloques
+TAM_BLOQUE_IDS = 20
+
+@st.cache_resource(show_spinner=False)
+def obtener_asignador_ids():
+    """Secuencia de No. Cliente; se crea (y abre la hoja de metadatos) con el primer ID pedido"""
+    if BACKEND_ALMACENAMIENTO == "sqlite":
+        almacen = SecuenciaSQLite(RUTA_SQLITE, "No. Cliente")
+    else:
+        metadatos_ws = obtener_conexion_sheets().hoja("Metadatos", ENCABEZADOS_METADATOS)
+        almacen = SecuenciaGoogleSheets(metadatos_ws, "No. Cliente")
+    return AsignadorIds(almacen, TAM_BLOQUE_IDS)
+
+indice_filas = obtener_indice_filas()
+
+cola_polizas = obtener_cola_escritura("Polizas", repo_polizas, sincronizador_polizas, indice_filas)
+cola_cancelaciones = obtener_cola_escritura("Cancelaciones", repo_cancelaciones, sincronizador_cancelaciones)
 
 # ============================================================
 # INTERFAZ PRINCIPAL
@@ -383,28 +921,18 @@ if cancelaciones_ws is None:
 st.title("🏢 Sistema de Gestión de Pólizas")
 st.markdown("---")
 
-menu = st.sidebar.radio("Navegación", [
-    "📝 Data Entry - Nueva Póliza", 
-    "🔍 Consultar Pólizas por Cliente", 
-    "⏳ Pólizas Próximas a Vencer",
-    "📊 Ver Todas las Pólizas",
-    "🎂 Cumpleaños del Mes",
-    "🗑️ Ver Cancelaciones"
-])
-
-if st.sidebar.button("🔄 Limpiar Cache"):
-    clear_polizas_cache()
-    st.rerun()
-import uuid  # Agregar esta importación al inicio del archivo
+# Cada página se registra con las hojas que lee; solo se ejecuta la elegida en el menú
+paginas = RegistroPaginas()
 
 # ============================================================
 # DATA ENTRY - NUEVA PÓLIZA (SOLUCIÓN CON UUID)
 # ============================================================
-if menu == "📝 Data Entry - Nueva Póliza":
+# Formulario de captura; solo lee la hoja al guardar (para el No. Cliente)
+@paginas.registrar("📝 Data Entry - Nueva Póliza", ayuda="**Data Entry**: Completa los campos y haz clic en Guardar")
+def pagina_nueva_poliza():
     st.header("📝 Ingresar Nueva Póliza")
     
-    # Calcular ID pero no mostrarlo
-    nuevo_id = generar_nuevo_id_cliente()
+    mostrar_estado_escrituras()
     
     # Inicializar estado y clave del formulario
     if 'datos_formulario' not in st.session_state:
@@ -569,6 +1097,14 @@ if menu == "📝 Data Entry - Nueva Póliza":
                 key=f"descripcion_auto_{st.session_state.form_key}"
             )
         
+        # Con la política "advertir", un No. POLIZA o una serie repetidos solo se guardan si se confirma
+        aceptar_duplicado = False
+        if POLITICA_DUPLICADOS == POLITICA_ADVERTIR:
+            aceptar_duplicado = st.checkbox(
+                "Guardar aunque el No. POLIZA o la serie del auto ya existan",
+                key=f"aceptar_duplicado_{st.session_state.form_key}"
+            )
+
         # Botones en la misma línea
         col_btn_submit, col_btn_clear = st.columns([3, 1])
         with col_btn_submit:
@@ -655,13 +1191,6 @@ if menu == "📝 Data Entry - Nueva Póliza":
 
             # Solo guardar si no hay errores
             if not campos_faltantes and not errores_fecha:
-                def obtener_id_cliente_o_nuevo(nombre_contratante):
-                    polizas = obtener_polizas()
-                    for p in polizas:
-                        if p.get("CONTRATANTE", "").strip().lower() == nombre_contratante.strip().lower():
-                            return p.get("No. Cliente", "")
-                    return str(generar_nuevo_id_cliente())
-
                 id_cliente = obtener_id_cliente_o_nuevo(contratante)
 
                 datos_poliza = [
@@ -688,111 +1217,26 @@ if menu == "📝 Data Entry - Nueva Póliza":
                     descripcion_auto
                 ]
 
-                if agregar_poliza(datos_poliza):
+                estado_guardado = agregar_poliza(datos_poliza, aceptar_duplicado)
+                if estado_guardado == ESTADO_CONFIRMADO:
                     st.success("✅ ¡Póliza guardada exitosamente!")
                     st.balloons()
                     
                     # Limpiar formulario después de guardado exitoso
                     limpiar_formulario()
                     st.rerun()
-                else:
+                elif estado_guardado == ESTADO_PENDIENTE:
+                    # La fila sigue en la cola (p. ej. por cuota); su estado se ve en "Estado de guardado"
+                    st.info("⏳ La póliza quedó en cola y se guardará en cuanto la cuota de Google lo permita.")
+                    limpiar_formulario()
+                    st.rerun()
+                elif estado_guardado == ESTADO_ERROR:
                     st.error("❌ Error al guardar la póliza. Por favor intenta nuevamente.")
 # ============================================================
-# CONSULTAR PÓLIZAS POR CLIENTE
-# ============================================================
-elif menu == "🔍 Consultar Pólizas por Cliente":
-    st.header("🔍 Consultar Pólizas por Cliente")
-    
-    clientes = obtener_clientes_unicos()
-    
-    if not clientes:
-        st.info("ℹ️ No hay clientes registrados en el sistema")
-    else:
-        cliente_seleccionado = st.selectbox("Selecciona un cliente:", options=clientes, key="select_cliente")
-        
-        buscar_btn = st.button("🔍 Buscar Pólizas", key="buscar_polizas_btn", use_container_width=True)
-        
-        if buscar_btn and cliente_seleccionado:
-            resultados = buscar_por_nombre_cliente(cliente_seleccionado)
-            
-            if resultados:
-                df_resultados = pd.DataFrame(resultados)
-                columnas_importantes = ["No. Cliente", "No. POLIZA", "PRODUCTO", "INICIO DE VIGENCIA", "FIN DE VIGENCIA", "PRIMA ANUAL", "ASEGURADORA"]
-                columnas_disponibles = [col for col in columnas_importantes if col in df_resultados.columns]
-                st.dataframe(df_resultados[columnas_disponibles], use_container_width=True)
-
-# ============================================================
-# PÓLIZAS PRÓXIMAS A VENCER
-# ============================================================
-elif menu == "⏳ Pólizas Próximas a Vencer":
-    st.header("⏳ Pólizas Próximas a Vencer (Próximos 30 días)")
-    
-    polizas_proximas = obtener_polizas_proximas_vencer(30)
-    
-    if polizas_proximas:
-        df_proximas = pd.DataFrame(polizas_proximas)
-        columnas_vencimiento = ["No. Cliente", "CONTRATANTE", "No. POLIZA", "PRODUCTO", "FIN DE VIGENCIA", "PRIMA ANUAL", "TELEFONO", "EMAIL"]
-        columnas_disponibles = [col for col in columnas_vencimiento if col in df_proximas.columns]
-        st.dataframe(df_proximas[columnas_disponibles], use_container_width=True)
-    else:
-        st.info("ℹ️ No hay pólizas que venzan en los próximos 30 días")
-
-# ============================================================
-# VER TODAS LAS PÓLIZAS
-# ============================================================
-elif menu == "📊 Ver Todas las Pólizas":
-    st.header("📊 Todas las Pólizas Registradas")
-    
-    todas_polizas = obtener_polizas()
-    
-    if todas_polizas:
-        df_todas = pd.DataFrame(todas_polizas)
-        st.dataframe(df_todas, use_container_width=True)
-    else:
-        st.info("ℹ️ No hay pólizas registradas en el sistema")
-
-# ============================================================
-# CUMPLEAÑOS DEL MES
-# ============================================================
-elif menu == "🎂 Cumpleaños del Mes":
-    st.header("🎂 Cumpleaños del Mes")
-    
-    mes_actual = datetime.now().strftime("%B")
-    st.subheader(f"Cumpleaños en {mes_actual}")
-    
-    cumpleaños = obtener_cumpleaños_mes_actual()
-    
-    if cumpleaños:
-        df_cumpleaños = pd.DataFrame(cumpleaños)
-        st.dataframe(df_cumpleaños[["CONTRATANTE", "FECHA DE NACIMIENTO", "DÍA"]], 
-                    use_container_width=True,
-                    column_config={
-                        "CONTRATANTE": "Contratante",
-                        "FECHA DE NACIMIENTO": "Fecha de Nacimiento",
-                        "DÍA": "Día del Mes"
-                    })
-    else:
-        st.info("ℹ️ No hay contratantes que cumplan años este mes")
-
-# ============================================================
-# VER CANCELACIONES
-# ============================================================
-elif menu == "🗑️ Ver Cancelaciones":
-    st.header("🗑️ Pólizas Canceladas")
-    
-    cancelaciones = obtener_cancelaciones()
-    
-    if cancelaciones:
-        df_cancelaciones = pd.DataFrame(cancelaciones)
-        columnas_importantes = ["No. Cliente", "CONTRATANTE", "No. POLIZA", "PRODUCTO", "INICIO DE VIGENCIA", "FIN DE VIGENCIA", "PRIMA ANUAL", "ASEGURADORA"]
-        columnas_disponibles = [col for col in columnas_importantes if col in df_cancelaciones.columns]
-        st.dataframe(df_cancelaciones[columnas_disponibles], use_container_width=True)
-    else:
-        st.info("ℹ️ No hay pólizas canceladas en el historial")
-# ============================================================
 # 2. CONSULTAR PÓLIZAS POR CLIENTE (CON DUPICACIÓN Y ELIMINACIÓN)
 # ============================================================
-elif menu == "🔍 Consultar Pólizas por Cliente":
+@paginas.registrar("🔍 Consultar Pólizas por Cliente", datos=("Polizas",), ayuda="**Consultar**: Busca por nombre del cliente y duplica/cancela pólizas")
+def pagina_consultar_cliente():
     st.header("🔍 Consultar Pólizas por Cliente")
     
     # Lista de aseguradoras predefinidas (misma que en Data Entry)
@@ -820,6 +1264,8 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
     # Inicializar estados de sesión
     if 'cliente_buscado' not in st.session_state:
         st.session_state.cliente_buscado = None
+    if 'contratantes_buscados' not in st.session_state:
+        st.session_state.contratantes_buscados = []
     if 'resultados_busqueda' not in st.session_state:
         st.session_state.resultados_busqueda = []
     if 'mostrar_duplicacion' not in st.session_state:
@@ -831,25 +1277,38 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
     if 'poliza_a_eliminar' not in st.session_state:
         st.session_state.poliza_a_eliminar = None
     
-    # Obtener lista de clientes únicos para el dropdown
+    # Índice de búsqueda de clientes (se construye una vez por versión de datos)
     try:
-        clientes = obtener_clientes_unicos()
+        indice_clientes = obtener_indice_clientes()
     except Exception as e:
         st.error(f"❌ Error al cargar lista de clientes: {str(e)}")
         st.info("🔄 Intentando cargar datos desde cache...")
-        clientes = []
+        indice_clientes = None
     
-    if not clientes:
+    if not indice_clientes or not indice_clientes.total_clientes:
         st.info("ℹ️ No hay clientes registrados en el sistema")
     else:
         col1, col2 = st.columns([1, 3])
         
         with col1:
-            cliente_seleccionado = st.selectbox(
-                "Selecciona un cliente:",
-                options=clientes,
-                key="select_cliente"
+            consulta_cliente = st.text_input(
+                "Buscar cliente:",
+                key="consulta_cliente",
+                placeholder="Nombre, No. Cliente, póliza, teléfono o email"
             )
+            coincidencias = sugerir_clientes(consulta_cliente) if consulta_cliente.strip() else []
+            
+            cliente_seleccionado = None
+            if coincidencias:
+                indice_coincidencia = st.selectbox(
+                    "Selecciona un cliente:",
+                    options=range(len(coincidencias)),
+                    format_func=lambda x: coincidencias[x].etiqueta,
+                    key="select_cliente"
+                )
+                cliente_seleccionado = coincidencias[indice_coincidencia]
+            elif consulta_cliente.strip():
+                st.caption(f"Sin coincidencias para '{consulta_cliente}' entre {indice_clientes.total_clientes} clientes")
             
             # Botones en columnas separadas para evitar conflicto
             col_btn1, col_btn2 = st.columns(2)
@@ -860,6 +1319,7 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
                     limpiar_btn = st.button("🔄 Nueva Búsqueda", key="limpiar_busqueda_btn", use_container_width=True)
                     if limpiar_btn:
                         st.session_state.cliente_buscado = None
+                        st.session_state.contratantes_buscados = []
                         st.session_state.resultados_busqueda = []
                         st.session_state.mostrar_duplicacion = False
                         st.session_state.poliza_a_duplicar = None
@@ -871,8 +1331,9 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
         if buscar_btn and cliente_seleccionado:
             with st.spinner("Buscando pólizas..."):
                 try:
-                    resultados = buscar_por_nombre_cliente(cliente_seleccionado)
-                    st.session_state.cliente_buscado = cliente_seleccionado
+                    resultados = buscar_por_nombres_cliente(cliente_seleccionado.contratantes)
+                    st.session_state.cliente_buscado = cliente_seleccionado.nombre
+                    st.session_state.contratantes_buscados = cliente_seleccionado.contratantes
                     st.session_state.resultados_busqueda = resultados
                     st.session_state.mostrar_duplicacion = False
                     st.session_state.poliza_a_duplicar = None
@@ -889,17 +1350,17 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
             st.success(f"✅ Se encontraron {len(resultados)} póliza(s) para el cliente {cliente_seleccionado}")
             
             # Mostrar resumen
-            df_resultados = pd.DataFrame(resultados)
+            df_resultados = construir_tabla(resultados, CAMPOS_POLIZA)
             
             # Columnas importantes para mostrar
             columnas_importantes = ["No. Cliente", "No. POLIZA", "PRODUCTO", "INICIO DE VIGENCIA", "FIN DE VIGENCIA", "PRIMA ANUAL", "ASEGURADORA"]
             columnas_disponibles = [col for col in columnas_importantes if col in df_resultados.columns]
             
-            st.dataframe(df_resultados[columnas_disponibles], use_container_width=True)
+            st.dataframe(df_resultados[columnas_disponibles], use_container_width=True, column_config=CONFIG_COLUMNAS_TABLA)
             
             # Opción para ver todos los detalles
             with st.expander("📋 Ver detalles completos de todas las pólizas"):
-                st.dataframe(df_resultados, use_container_width=True)
+                st.dataframe(df_resultados, use_container_width=True, column_config=CONFIG_COLUMNAS_TABLA)
             
             # ============================================================
             # FUNCIONALIDAD: ELIMINAR PÓLIZA (AHORA MOVER A CANCELACIONES)
@@ -949,49 +1410,6 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
                                                          use_container_width=True)
                     
                     if confirmar_eliminar_btn:
-                        # Función para eliminar póliza (ahora mover a cancelaciones)
-                        def cancelar_poliza(poliza_data):
-                            try:
-                                # Preparar datos para mover a cancelaciones
-                                datos_cancelacion = [
-                                    poliza_data.get('No. Cliente', ''),
-                                    poliza_data.get('CONTRATANTE', ''),
-                                    poliza_data.get('ASEGURADO', ''),
-                                    poliza_data.get('BENEFICIARIO', ''),
-                                    poliza_data.get('FECHA DE NAC CONTRATANTE', ''),
-                                    poliza_data.get('FECHA DE NAC ASEGURADO', ''),
-                                    poliza_data.get('ESTADO CIVIL', ''),
-                                    poliza_data.get('No. POLIZA', ''),
-                                    poliza_data.get('INICIO DE VIGENCIA', ''),
-                                    poliza_data.get('FIN DE VIGENCIA', ''),
-                                    poliza_data.get('FORMA DE PAGO', ''),
-                                    poliza_data.get('FRECUENCIA DE PAGO', ''),
-                                    poliza_data.get('PRIMA ANUAL', ''),
-                                    poliza_data.get('PRODUCTO', ''),
-                                    poliza_data.get('No Serie Auto', ''),
-                                    poliza_data.get('ASEGURADORA', ''),
-                                    poliza_data.get('DIRECCIÓN', ''),
-                                    poliza_data.get('TELEFONO', ''),
-                                    poliza_data.get('EMAIL', ''),
-                                    poliza_data.get('NOTAS', ''),
-                                    poliza_data.get('DESCRIPCION AUTO', '')
-                                ]
-                                
-                                # Mover a cancelaciones
-                                if mover_a_cancelaciones(datos_cancelacion):
-                                    # Ahora eliminar de pólizas activas
-                                    todas_polizas = polizas_ws.get_all_records()
-                                    for i, poliza in enumerate(todas_polizas, start=2):  # start=2 porque fila 1 son encabezados
-                                        if poliza.get('No. POLIZA') == poliza_data['No. POLIZA']:
-                                            polizas_ws.delete_rows(i)
-                                            break
-                                    
-                                    return True
-                                return False
-                            except Exception as e:
-                                st.error(f"❌ Error al cancelar póliza: {str(e)}")
-                                return False
-                        
                         if cancelar_poliza(poliza_eliminar):
                             st.success(f"✅ Póliza {poliza_eliminar['No. POLIZA']} cancelada exitosamente y movida al historial de cancelaciones!")
                             
@@ -1001,12 +1419,10 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
                             
                             # Actualizar la lista de resultados
                             with st.spinner("Actualizando lista de pólizas..."):
-                                nuevos_resultados = buscar_por_nombre_cliente(cliente_seleccionado)
+                                nuevos_resultados = buscar_por_nombres_cliente(st.session_state.contratantes_buscados)
                                 st.session_state.resultados_busqueda = nuevos_resultados
                             
                             st.rerun()
-                        else:
-                            st.error("❌ Error al cancelar la póliza. Por favor intenta nuevamente.")
             
             # ============================================================
             # FUNCIONALIDAD EXISTENTE: DUPLICAR PÓLIZA
@@ -1114,6 +1530,13 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
                                 key="nuevas_notas_form"
                             )
                         
+                        aceptar_duplicado_dup = False
+                        if POLITICA_DUPLICADOS == POLITICA_ADVERTIR:
+                            aceptar_duplicado_dup = st.checkbox(
+                                "Guardar aunque el No. POLIZA o la serie del auto ya existan",
+                                key="aceptar_duplicado_dup_form"
+                            )
+                        
                         # Botón para duplicar dentro del formulario
                         col_btn_dup1, col_btn_dup2, col_btn_dup3 = st.columns([1, 2, 1])
                         with col_btn_dup2:
@@ -1149,180 +1572,268 @@ elif menu == "🔍 Consultar Pólizas por Cliente":
                                     poliza_original.get('DESCRIPCION AUTO', '')
                                 ]
                                 
-                                if agregar_poliza(nueva_poliza):
+                                estado_duplicada = agregar_poliza(nueva_poliza, aceptar_duplicado_dup)
+                                if estado_duplicada in (ESTADO_CONFIRMADO, ESTADO_PENDIENTE):
                                     st.success(f"✅ Póliza duplicada exitosamente! Nueva póliza: {nuevo_no_poliza}")
                                     st.balloons()
                                     # Resetear estado de duplicación
                                     st.session_state.mostrar_duplicacion = False
                                     st.session_state.poliza_a_duplicar = None
                                     st.rerun()
-                                else:
+                                elif estado_duplicada == ESTADO_ERROR:
                                     st.error("❌ Error al guardar la póliza duplicada. Por favor intenta nuevamente.")
                 
                 # Descargar resultados
                 st.markdown("---")
-                csv = df_resultados.to_csv(index=False, encoding='utf-8')
-                st.download_button(
-                    label="📥 Descargar resultados en CSV",
-                    data=csv,
-                    file_name=f"polizas_cliente_{cliente_seleccionado.replace(' ', '_')}.csv",
-                    mime="text/csv",
+                # Pocas filas guardadas en la sesión: se generan al hacer clic, sin guardar el archivo
+                boton_descarga(
+                    "📥 Descargar resultados",
+                    f"polizas_cliente_{cliente_seleccionado.replace(' ', '_')}",
+                    {"Polizas": df_resultados},
+                    clave=None,
                     key="descargar_csv_btn"
                 )
 
 # ============================================================
 # 3. PÓLIZAS PRÓXIMAS A VENCER
 # ============================================================
-elif menu == "⏳ Pólizas Próximas a Vencer":
-    st.header("⏳ Pólizas Próximas a Vencer (Próximos 30 días)")
+@paginas.registrar("⏳ Pólizas Próximas a Vencer", datos=("Polizas",), ayuda="**Vencimientos**: Revisa pólizas que vencerán pronto")
+def pagina_proximas_vencer():
+    st.header("⏳ Pólizas Próximas a Vencer")
     
+    horizontes = {
+        "Próximos 7 días": 7,
+        "Próximos 15 días": 15,
+        "Próximos 30 días": 30,
+        "Próximos 60 días": 60,
+        "Próximos 90 días": 90,
+        "Rango personalizado": None,
+        "Vencidas sin renovar": None
+    }
+    horizonte = st.radio("Horizonte", list(horizontes), index=2, horizontal=True, key="horizonte_vencimientos")
+    
+    # Versión leída antes que los datos: la clave del archivo nunca es más nueva que su contenido
+    version_vencimientos = sincronizador_polizas.version
     with st.spinner("Buscando pólizas próximas a vencer..."):
-        polizas_proximas = obtener_polizas_proximas_vencer(30)
+        if horizonte == "Rango personalizado":
+            hoy = datetime.now().date()
+            rango = st.date_input(
+                "Fin de vigencia entre",
+                value=(hoy, hoy + timedelta(days=30)),
+                format="DD/MM/YYYY",
+                key="rango_vencimientos"
+            )
+            if isinstance(rango, (list, tuple)) and len(rango) == 2:
+                desde, hasta = rango
+            else:
+                desde = hasta = rango[0] if isinstance(rango, (list, tuple)) else rango
+            polizas_proximas = obtener_polizas_por_vencimiento(desde, hasta)
+            descripcion = f"entre el {desde.strftime('%d/%m/%Y')} y el {hasta.strftime('%d/%m/%Y')}"
+        elif horizonte == "Vencidas sin renovar":
+            opciones_atras = {"Últimos 30 días": 30, "Últimos 90 días": 90, "Último año": 365, "Todas": None}
+            atras = st.selectbox("Vencidas en", list(opciones_atras), index=1, key="vencidas_atras")
+            polizas_proximas = obtener_polizas_vencidas_sin_renovar(opciones_atras[atras])
+            descripcion = f"vencidas sin renovar ({atras.lower()})"
+        else:
+            polizas_proximas = obtener_polizas_proximas_vencer(horizontes[horizonte])
+            descripcion = f"que vencen en los {horizonte.lower()}"
     
-    if polizas_proximas:
-        st.success(f"✅ Se encontraron {len(polizas_proximas)} póliza(s) que vencen en los próximos 30 días")
+    if not polizas_proximas.empty:
+        st.success(f"✅ Se encontraron {len(polizas_proximas)} póliza(s) {descripcion}")
         
-        df_proximas = pd.DataFrame(polizas_proximas)
+        df_proximas = polizas_proximas
         
         # Columnas relevantes para vencimientos
         columnas_vencimiento = ["No. Cliente", "CONTRATANTE", "No. POLIZA", "PRODUCTO", "FIN DE VIGENCIA", "PRIMA ANUAL", "TELEFONO", "EMAIL"]
         columnas_disponibles = [col for col in columnas_vencimiento if col in df_proximas.columns]
         
-        st.dataframe(df_proximas[columnas_disponibles], use_container_width=True)
+        st.dataframe(df_proximas[columnas_disponibles], use_container_width=True, column_config=CONFIG_COLUMNAS_TABLA)
         
         with st.expander("📋 Ver todos los detalles"):
-            st.dataframe(df_proximas, use_container_width=True)
+            st.dataframe(df_proximas, use_container_width=True, column_config=CONFIG_COLUMNAS_TABLA)
         
         # Estadísticas
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("Total Pólizas a Vencer", len(polizas_proximas))
         with col2:
-            if 'PRIMA ANUAL' in df_proximas.columns:
-                # Manejo robusto de la suma de primas
-                try:
-                    primas_numericas = pd.to_numeric(df_proximas['PRIMA ANUAL'], errors='coerce').fillna(0)
-                    prima_total = primas_numericas.sum()
-                    st.metric("Prima Total", f"${prima_total:,.2f}")
-                except Exception as e:
-                    st.metric("Prima Total", "Error")
-                    st.error(f"❌ Error al calcular prima total: {str(e)}")
+            # PRIMA ANUAL ya es float64 en la tabla; las celdas no numéricas no suman
+            st.metric("Prima Total", f"${df_proximas['PRIMA ANUAL'].sum():,.2f}")
         
         # Descargar reporte
-        csv = df_proximas.to_csv(index=False, encoding='utf-8')
-        st.download_button(
-            label="📥 Descargar Reporte de Vencimientos",
-            data=csv,
-            file_name=f"polizas_proximas_vencer_{datetime.now().strftime('%Y-%m-%d')}.csv",
-            mime="text/csv",
+        boton_descarga(
+            "📥 Descargar Reporte de Vencimientos",
+            f"polizas_proximas_vencer_{datetime.now().strftime('%Y-%m-%d')}",
+            {"Vencimientos": df_proximas},
+            clave=("vencimientos", version_vencimientos, datetime.now().date(), descripcion),
             key="descargar_vencimientos_btn"
         )
     else:
-        st.info("ℹ️ No hay pólizas que venzan en los próximos 30 días")
+        st.info(f"ℹ️ No hay pólizas {descripcion}")
 
 # ============================================================
 # 4. VER TODAS LAS PÓLIZAS
 # ============================================================
-elif menu == "📊 Ver Todas las Pólizas":
+@paginas.registrar("📊 Ver Todas las Pólizas", datos=("Polizas",), ayuda="**Ver Todo**: Explora toda la base de datos")
+def pagina_todas_las_polizas():
     st.header("📊 Todas las Pólizas Registradas")
     
     with st.spinner("Cargando pólizas..."):
-        todas_polizas = obtener_polizas()
+        version_tabla, tabla_polizas = obtener_tabla_polizas_versionada()
     
-    if todas_polizas:
-        df_todas = pd.DataFrame(todas_polizas)
-        
-        # Filtros
+    if not tabla_polizas.empty:
+        # Filtros: PRODUCTO y ASEGURADORA son categóricas, sus categorías ya son los valores únicos
         col1, col2, col3 = st.columns(3)
         with col1:
-            # Manejo seguro de valores únicos para producto
-            if 'PRODUCTO' in df_todas.columns:
-                # Convertir a string y eliminar valores NaN antes de ordenar
-                productos_unicos = df_todas['PRODUCTO'].dropna().astype(str).unique()
-                opciones_producto = [""] + sorted(productos_unicos)
-            else:
-                opciones_producto = [""]
-
+            opciones_producto = [""] + sorted(tabla_polizas['PRODUCTO'].cat.categories)
             filtro_producto = st.selectbox("Filtrar por Producto", opciones_producto)
             
         with col2:
-            # Manejo seguro de valores únicos para aseguradora
-            if 'ASEGURADORA' in df_todas.columns:
-                # Convertir a string y eliminar valores NaN antes de ordenar
-                aseguradoras_unicas = df_todas['ASEGURADORA'].dropna().astype(str).unique()
-                opciones_aseguradora = [""] + sorted(aseguradoras_unicas)
-            else:
-                opciones_aseguradora = [""]
-
+            opciones_aseguradora = [""] + sorted(tabla_polizas['ASEGURADORA'].cat.categories)
             filtro_aseguradora = st.selectbox("Filtrar por Aseguradora", opciones_aseguradora)
         
-        # Aplicar filtros
-        if filtro_producto:
-            df_todas = df_todas[df_todas['PRODUCTO'].astype(str) == filtro_producto]
-        if filtro_aseguradora:
-            df_todas = df_todas[df_todas['ASEGURADORA'].astype(str) == filtro_aseguradora]
+        with col3:
+            texto_filtro = st.text_input("🔎 Buscar en todas las columnas", key="texto_ver_todas")
+        
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            columnas_visibles = st.multiselect(
+                "Columnas visibles", CAMPOS_POLIZA,
+                default=COLUMNAS_VISIBLES_VER_TODAS, key="columnas_ver_todas"
+            )
+        with col2:
+            columna_orden = st.selectbox(
+                "Ordenar por", [""] + CAMPOS_POLIZA,
+                format_func=lambda c: c or "Orden de la hoja", key="orden_ver_todas"
+            )
+            descendente = st.checkbox("Descendente", key="descendente_ver_todas")
+        with col3:
+            tam_pagina = st.selectbox("Filas por página", TAMAÑOS_PAGINA, index=1, key="tam_pagina_ver_todas")
+        
+        # Orden, filtros y página se resuelven en el servidor; solo la página visible se envía al navegador
+        orden = ordenar_tabla_cached(version_tabla, columna_orden, descendente, tabla_polizas)
+        posiciones = filtrar_posiciones(
+            tabla_polizas, orden,
+            igualdades={"PRODUCTO": filtro_producto, "ASEGURADORA": filtro_aseguradora},
+            texto=texto_filtro,
+            busqueda=construir_busqueda_texto(version_tabla, tabla_polizas) if texto_filtro.strip() else None
+        )
+        total_filtradas = len(posiciones)
+        total_paginas = max(1, -(-total_filtradas // tam_pagina))
+        if st.session_state.get("pagina_ver_todas", 1) > total_paginas:
+            st.session_state.pagina_ver_todas = total_paginas
         
-        # Mostrar datos
-        st.dataframe(df_todas, use_container_width=True)
+        if total_filtradas:
+            pagina = st.number_input(
+                f"Página (de {total_paginas})", min_value=1, max_value=total_paginas,
+                step=1, key="pagina_ver_todas"
+            )
+            inicio = (pagina - 1) * tam_pagina
+            st.caption(f"Mostrando {inicio + 1}–{min(inicio + tam_pagina, total_filtradas)} de {total_filtradas} pólizas")
+            
+            # Mostrar datos
+            st.dataframe(
+                pagina_de_tabla(tabla_polizas, posiciones, pagina, tam_pagina, columnas_visibles or None),
+                use_container_width=True,
+                column_config=CONFIG_COLUMNAS_TABLA
+            )
+        else:
+            st.info("ℹ️ Ninguna póliza coincide con los filtros")
         
-        # Estadísticas
+        # Estadísticas sobre todas las filas filtradas, no solo la página visible
+        df_filtradas = tabla_polizas.take(posiciones)
         st.subheader("📈 Estadísticas")
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Pólizas", len(df_todas))
+            st.metric("Total Pólizas", total_filtradas)
         with col2:
-            st.metric("Clientes Únicos", df_todas['No. Cliente'].nunique() if 'No. Cliente' in df_todas.columns else 0)
+            st.metric("Clientes Únicos", df_filtradas['No. Cliente'].nunique())
         with col3:
-            if 'PRIMA ANUAL' in df_todas.columns:
-                # Manejo robusto de la suma de primas
-                try:
-                    primas_numericas = pd.to_numeric(df_todas['PRIMA ANUAL'], errors='coerce').fillna(0)
-                    prima_total = primas_numericas.sum()
-                    st.metric("Prima Anual Total", f"${prima_total:,.2f}")
-                except Exception as e:
-                    st.metric("Prima Anual Total", "Error")
-                    st.error(f"❌ Error al calcular prima total: {str(e)}")
+            st.metric("Prima Anual Total", f"${df_filtradas['PRIMA ANUAL'].sum():,.2f}")
         with col4:
-            if 'PRODUCTO' in df_todas.columns:
-                st.metric("Productos Diferentes", df_todas['PRODUCTO'].nunique())
+            st.metric("Productos Diferentes", df_filtradas['PRODUCTO'].nunique())
         
-        # Descargar datos completos
-        csv = df_todas.to_csv(index=False, encoding='utf-8')
-        st.download_button(
-            label="📥 Descargar Base Completa en CSV",
-            data=csv,
-            file_name=f"base_polizas_completa_{datetime.now().strftime('%Y-%m-%d')}.csv",
-            mime="text/csv",
+        # Descargar las pólizas filtradas, en el orden elegido
+        boton_descarga(
+            "📥 Descargar Base Completa",
+            f"base_polizas_completa_{datetime.now().strftime('%Y-%m-%d')}",
+            {"Polizas": df_filtradas},
+            clave=("ver_todas", version_tabla, filtro_producto, filtro_aseguradora,
+                   texto_filtro.strip().lower(), columna_orden, descendente),
             key="descargar_completa_btn"
         )
+        
+        # Libro con las tres vistas principales en hojas separadas; Cancelaciones
+        # y Vencimientos se cargan solo cuando se pide el libro
+        hoy = datetime.now().date()
+        boton_descarga(
+            f"📥 Descargar libro (Pólizas, Cancelaciones, Vencimientos {DIAS_LIBRO_VENCIMIENTOS} días)",
+            f"libro_polizas_{hoy.strftime('%Y-%m-%d')}",
+            lambda: {
+                "Polizas": tabla_polizas,
+                "Cancelaciones": obtener_tabla_cancelaciones_versionada()[1],
+                "Vencimientos": obtener_polizas_proximas_vencer(DIAS_LIBRO_VENCIMIENTOS),
+            },
+            clave=lambda: ("libro", version_tabla, obtener_tabla_cancelaciones_versionada()[0], hoy),
+            key="descargar_libro_btn"
+        )
     else:
         st.info("ℹ️ No hay pólizas registradas en el sistema")
 
 # ============================================================
 # 5. NUEVA SECCIÓN: CUMPLEAÑOS DEL MES
 # ============================================================
-elif menu == "🎂 Cumpleaños del Mes":
+@paginas.registrar("🎂 Cumpleaños del Mes", datos=("Polizas",), ayuda="**Cumpleaños**: Ve quién cumple años este mes")
+def pagina_cumpleaños():
     st.header("🎂 Cumpleaños del Mes")
     
-    mes_actual = datetime.now().strftime("%B")  # Nombre del mes actual
-    st.subheader(f"Cumpleaños en {mes_actual}")
+    vista_cumpleaños = st.radio(
+        "Mostrar",
+        ["Este mes", "Próximos días"],
+        horizontal=True,
+        key="vista_cumpleaños"
+    )
     
-    with st.spinner("Buscando cumpleaños del mes..."):
-        cumpleaños = obtener_cumpleaños_mes_actual()
+    version_cumpleaños = sincronizador_polizas.version
+    if vista_cumpleaños == "Este mes":
+        mes_actual = datetime.now().strftime("%B")  # Nombre del mes actual
+        st.subheader(f"Cumpleaños en {mes_actual}")
+        
+        with st.spinner("Buscando cumpleaños del mes..."):
+            cumpleaños = obtener_cumpleaños_mes_actual()
+        descripcion = "este mes"
+        columnas_cumpleaños = ["NOMBRE", "TIPO", "FECHA DE NACIMIENTO", "DÍA", "EDAD"]
+    else:
+        dias_cumpleaños = st.select_slider(
+            "Próximos N días",
+            options=[7, 15, 30, 60, 90, 180, 365],
+            value=30,
+            key="dias_cumpleaños"
+        )
+        st.subheader(f"Cumpleaños en los próximos {dias_cumpleaños} días")
+        
+        cumpleaños = obtener_cumpleaños_proximos(dias_cumpleaños)
+        descripcion = f"en los próximos {dias_cumpleaños} días"
+        columnas_cumpleaños = ["NOMBRE", "TIPO", "FECHA DE NACIMIENTO", "CUMPLEAÑOS", "DÍAS RESTANTES", "EDAD"]
     
     if cumpleaños:
-        st.success(f"🎉 Se encontraron {len(cumpleaños)} contratantes que cumplen años este mes")
+        st.success(f"🎉 Se encontraron {len(cumpleaños)} personas que cumplen años {descripcion}")
         
         # Crear DataFrame para mostrar
         df_cumpleaños = pd.DataFrame(cumpleaños)
         
-        # Mostrar en una tabla ordenada por día
-        st.dataframe(df_cumpleaños[["CONTRATANTE", "FECHA DE NACIMIENTO", "DÍA"]], 
+        # Mostrar en una tabla ordenada por fecha de cumpleaños
+        st.dataframe(df_cumpleaños[columnas_cumpleaños], 
                     use_container_width=True,
+                    hide_index=True,
                     column_config={
-                        "CONTRATANTE": "Contratante",
+                        "NOMBRE": "Nombre",
+                        "TIPO": "Tipo",
                         "FECHA DE NACIMIENTO": "Fecha de Nacimiento",
-                        "DÍA": "Día del Mes"
+                        "DÍA": "Día del Mes",
+                        "CUMPLEAÑOS": "Cumpleaños",
+                        "DÍAS RESTANTES": "Días Restantes",
+                        "EDAD": "Cumple"
                     })
         
         # Estadísticas rápidas
@@ -1331,46 +1842,44 @@ elif menu == "🎂 Cumpleaños del Mes":
             st.metric("Total Cumpleaños", len(cumpleaños))
         with col2:
             if cumpleaños:
-                hoy = datetime.now().day
+                hoy = datetime.now().strftime('%d/%m/%Y')
                 # Contar cuántos cumplen hoy
-                cumple_hoy = sum(1 for c in cumpleaños if c["DÍA"] == hoy)
+                cumple_hoy = sum(1 for c in cumpleaños if c["CUMPLEAÑOS"] == hoy)
                 st.metric("Cumpleaños Hoy", cumple_hoy)
         
         # Descargar lista de cumpleaños
-        csv = df_cumpleaños.to_csv(index=False, encoding='utf-8')
-        st.download_button(
-            label="📥 Descargar Lista de Cumpleaños",
-            data=csv,
-            file_name=f"cumpleaños_{datetime.now().strftime('%Y_%m')}.csv",
-            mime="text/csv",
+        boton_descarga(
+            "📥 Descargar Lista de Cumpleaños",
+            f"cumpleaños_{datetime.now().strftime('%Y_%m')}",
+            {"Cumpleaños": df_cumpleaños},
+            clave=("cumpleaños", version_cumpleaños, datetime.now().date(), descripcion),
             key="descargar_cumpleaños_btn"
         )
     else:
-        st.info("ℹ️ No hay contratantes que cumplan años este mes")
+        st.info(f"ℹ️ No hay contratantes ni asegurados que cumplan años {descripcion}")
 
 # ============================================================
 # 6. NUEVA SECCIÓN: VER CANCELACIONES
 # ============================================================
-elif menu == "🗑️ Ver Cancelaciones":
+@paginas.registrar("🗑️ Ver Cancelaciones", datos=("Cancelaciones",), ayuda="**Cancelaciones**: Historial de pólizas canceladas")
+def pagina_cancelaciones():
     st.header("🗑️ Pólizas Canceladas")
     
     with st.spinner("Cargando cancelaciones..."):
-        cancelaciones = obtener_cancelaciones()
+        version_cancelaciones, df_cancelaciones = obtener_tabla_cancelaciones_versionada()
     
-    if cancelaciones:
-        st.info(f"📋 Se encontraron {len(cancelaciones)} póliza(s) canceladas")
-        
-        df_cancelaciones = pd.DataFrame(cancelaciones)
+    if not df_cancelaciones.empty:
+        st.info(f"📋 Se encontraron {len(df_cancelaciones)} póliza(s) canceladas")
         
         # Columnas importantes para mostrar
         columnas_importantes = ["No. Cliente", "CONTRATANTE", "No. POLIZA", "PRODUCTO", "INICIO DE VIGENCIA", "FIN DE VIGENCIA", "PRIMA ANUAL", "ASEGURADORA"]
         columnas_disponibles = [col for col in columnas_importantes if col in df_cancelaciones.columns]
         
-        st.dataframe(df_cancelaciones[columnas_disponibles], use_container_width=True)
+        st.dataframe(df_cancelaciones[columnas_disponibles], use_container_width=True, column_config=CONFIG_COLUMNAS_TABLA)
         
         # Opción para ver todos los detalles
         with st.expander("📋 Ver detalles completos de todas las cancelaciones"):
-            st.dataframe(df_cancelaciones, use_container_width=True)
+            st.dataframe(df_cancelaciones, use_container_width=True, column_config=CONFIG_COLUMNAS_TABLA)
         
         # Estadísticas
         st.subheader("📈 Estadísticas de Cancelaciones")
@@ -1378,41 +1887,265 @@ elif menu == "🗑️ Ver Cancelaciones":
         with col1:
             st.metric("Total Cancelaciones", len(df_cancelaciones))
         with col2:
-            st.metric("Clientes Únicos", df_cancelaciones['No. Cliente'].nunique() if 'No. Cliente' in df_cancelaciones.columns else 0)
+            st.metric("Clientes Únicos", df_cancelaciones['No. Cliente'].nunique())
         with col3:
-            if 'PRIMA ANUAL' in df_cancelaciones.columns:
-                # Manejo robusto de la suma de primas
-                try:
-                    primas_numericas = pd.to_numeric(df_cancelaciones['PRIMA ANUAL'], errors='coerce').fillna(0)
-                    prima_total = primas_numericas.sum()
-                    st.metric("Prima Total Cancelada", f"${prima_total:,.2f}")
-                except Exception as e:
-                    st.metric("Prima Total Cancelada", "Error")
+            st.metric("Prima Total Cancelada", f"${df_cancelaciones['PRIMA ANUAL'].sum():,.2f}")
         
         # Descargar cancelaciones
-        csv = df_cancelaciones.to_csv(index=False, encoding='utf-8')
-        st.download_button(
-            label="📥 Descargar Historial de Cancelaciones",
-            data=csv,
-            file_name=f"cancelaciones_{datetime.now().strftime('%Y-%m-%d')}.csv",
-            mime="text/csv",
+        boton_descarga(
+            "📥 Descargar Historial de Cancelaciones",
+            f"cancelaciones_{datetime.now().strftime('%Y-%m-%d')}",
+            {"Cancelaciones": df_cancelaciones},
+            clave=("cancelaciones", version_cancelaciones),
             key="descargar_cancelaciones_btn"
         )
     else:
         st.info("ℹ️ No hay pólizas canceladas en el historial")
 
+# ============================================================
+# 7. IMPORTAR PÓLIZAS DESDE CSV O EXCEL
+# ============================================================
+# La hoja se lee recién al validar un archivo
+@paginas.registrar("📥 Importar Pólizas", datos=("Polizas",), ayuda="**Importar**: Carga pólizas desde un CSV o Excel")
+def pagina_importar():
+    st.header("📥 Importar Pólizas")
+    st.caption(
+        "El archivo debe tener los encabezados de la hoja de pólizas y las fechas en formato dd/mm/yyyy. "
+        "Si No. Cliente queda vacío se usa el del contratante o se le asigna uno nuevo."
+    )
+    st.download_button(
+        label="📄 Descargar plantilla CSV",
+        data=",".join(CAMPOS_POLIZA) + "\n",
+        file_name="plantilla_polizas.csv",
+        mime="text/csv",
+        key="plantilla_importacion_btn"
+    )
+
+    archivo = st.file_uploader("Archivo de pólizas (CSV o Excel)", type=["csv", "xlsx"], key="archivo_importacion")
+    if archivo is not None:
+        try:
+            tabla_archivo = leer_archivo(archivo.name, archivo.getvalue())
+        except Exception as e:
+            st.error(f"❌ No se pudo leer el archivo: {str(e)}")
+            st.stop()
+        tabla_archivo, faltantes, ignoradas = normalizar_columnas(tabla_archivo, CAMPOS_POLIZA)
+        if faltantes:
+            st.error(f"❌ Faltan columnas obligatorias: {', '.join(faltantes)}")
+            st.stop()
+        if ignoradas:
+            st.warning(f"⚠️ Estas columnas no se importan: {', '.join(ignoradas)}")
+
+        with st.spinner("Validando pólizas..."):
+            reporte, tabla_archivo = validar_lote(tabla_archivo, obtener_indices_polizas())
+        validas = reporte["Válida"].to_numpy()
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Filas en el archivo", len(reporte))
+        with col2:
+            st.metric("Válidas", int(validas.sum()))
+        with col3:
+            st.metric("Con errores", int((~validas).sum()))
+
+        if not validas.all():
+            st.subheader("❌ Filas con errores")
+            errores = reporte[~validas].drop(columns="Válida")
+            st.dataframe(errores, use_container_width=True, hide_index=True)
+            boton_descarga(
+                "📥 Descargar reporte de errores",
+                f"errores_importacion_{datetime.now().strftime('%Y-%m-%d')}",
+                {"Errores": errores},
+                clave=None,
+                key="descargar_errores_importacion_btn"
+            )
+        with st.expander("📋 Ver reporte completo"):
+            st.dataframe(reporte, use_container_width=True, hide_index=True)
+
+        if validas.any() and st.button(f"📤 Importar {int(validas.sum())} póliza(s) válidas", type="primary"):
+            tabla_validas = asignar_ids_nuevos(tabla_archivo[validas], generar_nuevo_id_cliente)
+            lote = ImportacionLote(
+                tabla_validas[CAMPOS_POLIZA].to_numpy().tolist(),
+                tam_bloque=TAM_BLOQUE_IMPORTACION,
+                pausa=PAUSA_IMPORTACION
+            )
+            # El lote queda en la sesión: si la escritura se detiene se reanuda desde aquí
+            st.session_state.importacion = lote
+            escribir_importacion(lote)
+
+    lote = st.session_state.get("importacion")
+    if lote is not None and not lote.terminado:
+        st.warning(f"⏸️ Importación incompleta: {lote.escritas} de {lote.total} pólizas escritas")
+        if st.button("⏯️ Reanudar importación", key="reanudar_importacion_btn"):
+            escribir_importacion(lote, reanudar=True)
+
+# ============================================================
+# 8. AUDITORÍA DE CALIDAD DE DATOS
+# ============================================================
+@paginas.registrar("🩺 Auditoría de Datos", datos=("Polizas", "Cancelaciones"), ayuda="**Auditoría**: Revisa fechas, correos, teléfonos y primas de toda la base")
+def pagina_auditoria():
+    st.header("🩺 Auditoría de Datos")
+    st.caption(
+        "Revisa todas las filas con las reglas de captura: fechas inválidas o ambiguas, vigencias imposibles, "
+        "correos, teléfonos y primas no numéricas. Las filas ya revisadas solo se evalúan de nuevo si cambian."
+    )
+
+    with st.spinner("Auditando datos..."):
+        auditorias = auditar_hojas()
+
+    columnas_resumen = st.columns(len(auditorias))
+    for columna, (nombre_hoja, (_, hallazgos_hoja)) in zip(columnas_resumen, auditorias.items()):
+        with columna:
+            st.metric(f"Filas con problemas en {nombre_hoja}", hallazgos_hoja["Fila"].nunique())
+            errores_hoja = int((hallazgos_hoja["Severidad"] == SEVERIDAD_ERROR).sum())
+            advertencias_hoja = int((hallazgos_hoja["Severidad"] == SEVERIDAD_ADVERTENCIA).sum())
+            st.caption(f"{errores_hoja} error(es) · {advertencias_hoja} advertencia(s)")
+
+    hoja_auditada = st.radio("Hoja", list(auditorias), horizontal=True, key="hoja_auditoria")
+    version_auditada, hallazgos = auditorias[hoja_auditada]
+
+    if hallazgos.empty:
+        st.success(f"✅ No se encontraron problemas en {hoja_auditada}")
+    else:
+        st.subheader("📋 Problemas por regla")
+        st.dataframe(resumir_hallazgos(hallazgos), use_container_width=True, hide_index=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            campo_auditoria = st.selectbox("Campo", ["Todos"] + sorted(hallazgos["Campo"].unique()), key="campo_auditoria")
+        with col2:
+            severidad_auditoria = st.selectbox(
+                "Severidad", ["Todas", SEVERIDAD_ERROR, SEVERIDAD_ADVERTENCIA], key="severidad_auditoria"
+            )
+        mascara = np.ones(len(hallazgos), dtype=bool)
+        if campo_auditoria != "Todos":
+            mascara &= (hallazgos["Campo"] == campo_auditoria).to_numpy()
+        if severidad_auditoria != "Todas":
+            mascara &= (hallazgos["Severidad"] == severidad_auditoria).to_numpy()
+        hallazgos_filtrados = hallazgos[mascara]
+
+        st.subheader(f"🔎 Hallazgos ({len(hallazgos_filtrados)})")
+        st.dataframe(hallazgos_filtrados, use_container_width=True, hide_index=True)
+        boton_descarga(
+            "📥 Descargar hallazgos",
+            f"auditoria_{hoja_auditada.lower()}_{datetime.now().strftime('%Y-%m-%d')}",
+            {hoja_auditada: hallazgos_filtrados},
+            clave=("auditoria", hoja_auditada, version_auditada, campo_auditoria, severidad_auditoria),
+            key="descargar_auditoria_btn"
+        )
+
+    # Duplicados: se revisa la hoja completa una vez por versión de datos
+    st.markdown("---")
+    st.subheader("👥 Duplicados en Pólizas")
+    st.caption(
+        "Pólizas con el mismo No. POLIZA o serie de auto (también si solo cambian mayúsculas, espacios o guiones), "
+        "contratantes capturados con varios No. Cliente y No. Cliente compartidos por contratantes distintos."
+    )
+    with st.spinner("Buscando duplicados..."):
+        version_duplicados, duplicados = obtener_reporte_duplicados()
+
+    if duplicados.empty:
+        st.success("✅ No se encontraron pólizas ni clientes duplicados")
+    else:
+        resumen_duplicados = resumir_duplicados(duplicados)
+        st.dataframe(resumen_duplicados, use_container_width=True, hide_index=True)
+        tipo_duplicado = st.selectbox("Tipo de duplicado", ["Todos"] + list(resumen_duplicados["Tipo"]), key="tipo_duplicado")
+        if tipo_duplicado != "Todos":
+            duplicados = duplicados[duplicados["Tipo"] == tipo_duplicado]
+        st.dataframe(duplicados, use_container_width=True, hide_index=True)
+        boton_descarga(
+            "📥 Descargar duplicados",
+            f"duplicados_polizas_{datetime.now().strftime('%Y-%m-%d')}",
+            {"Duplicados": duplicados},
+            clave=("duplicados", version_duplicados, tipo_duplicado),
+            key="descargar_duplicados_btn"
+        )
+
+# ============================================================
+# 9. BÚSQUEDA DE TEXTO EN NOTAS, DIRECCIONES Y AUTOS
+# ============================================================
+@paginas.registrar("🔎 Buscar en Notas y Autos", datos=("Polizas", "Cancelaciones"), ayuda="**Buscar texto**: Encuentra pólizas por fragmentos de serie, placas, calles o notas")
+def pagina_busqueda_texto():
+    st.header("🔎 Buscar en Notas, Direcciones y Autos")
+    st.caption(
+        "Busca palabras o fragmentos (de 3 caracteres o más) en NOTAS, DIRECCIÓN, DESCRIPCION AUTO y No Serie Auto "
+        "de pólizas activas y canceladas. Escribe `serie:`, `notas:`, `direccion:` o `auto:` antes de una palabra "
+        "para buscarla en una sola columna."
+    )
+
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        consulta_texto = st.text_input(
+            "Buscar", key="consulta_texto",
+            placeholder="siniestro, serie:3VW0012, direccion:reforma"
+        )
+    with col2:
+        columnas_texto = st.multiselect(
+            "Columnas", list(COLUMNAS_TEXTO_COMPLETO),
+            default=list(COLUMNAS_TEXTO_COMPLETO), key="columnas_texto"
+        )
+    with col3:
+        hojas_texto = st.multiselect(
+            "Hojas", ["Polizas", "Cancelaciones"],
+            default=["Polizas", "Cancelaciones"], key="hojas_texto"
+        )
+
+    if not consulta_texto.strip():
+        st.info("ℹ️ Escribe una palabra o un fragmento para buscar")
+    elif not columnas_texto or not hojas_texto:
+        st.warning("⚠️ Elige al menos una columna y una hoja")
+    else:
+        with st.spinner("Buscando..."):
+            resultados_texto = buscar_texto_completo(consulta_texto, hojas_texto, columnas_texto)
+
+        if resultados_texto.empty:
+            st.info("ℹ️ Ningún registro coincide con la búsqueda")
+        else:
+            if len(resultados_texto) >= LIMITE_RESULTADOS_TEXTO:
+                st.success(f"✅ Se muestran los {len(resultados_texto)} registros más relevantes")
+            else:
+                st.success(f"✅ Se encontraron {len(resultados_texto)} registro(s)")
+            columnas_resultado = [
+                "Hoja", "Fila", "Puntaje", "Coincide en", "No. Cliente", "CONTRATANTE", "No. POLIZA",
+                "PRODUCTO", "ASEGURADORA", *COLUMNAS_TEXTO_COMPLETO
+            ]
+            st.dataframe(resultados_texto[columnas_resultado], use_container_width=True, hide_index=True,
+                         column_config=CONFIG_COLUMNAS_TABLA)
+
+            with st.expander("📋 Ver detalles completos"):
+                st.dataframe(resultados_texto, use_container_width=True, hide_index=True,
+                             column_config=CONFIG_COLUMNAS_TABLA)
+
+            boton_descarga(
+                "📥 Descargar resultados",
+                f"busqueda_texto_{datetime.now().strftime('%Y-%m-%d')}",
+                {"Resultados": resultados_texto},
+                clave=None,
+                key="descargar_texto_btn"
+            )
+
+# ============================================================
+# NAVEGACIÓN
+# ============================================================
+menu = st.sidebar.radio("Navegación", paginas.titulos)
+pagina_actual = paginas[menu]
+
+metricas.etiquetar(pagina=menu)
+
+if st.sidebar.button("🔄 Limpiar Cache"):
+    # Recarga completa: también descarta ediciones que la sincronización delta aún no detectó
+    clear_polizas_cache()
+    st.rerun()
+
+pagina_actual.mostrar()
+
 # ============================================================
 # INFORMACIÓN ADICIONAL EN SIDEBAR
 # ============================================================
 st.sidebar.markdown("---")
-st.sidebar.info("""
-**💡 Instrucciones:**
-- **Data Entry**: Completa los campos y haz clic en Guardar
-- **Consultar**: Busca por nombre del cliente y duplica/cancela pólizas  
-- **Vencimientos**: Revisa pólizas que vencerán pronto
-- **Ver Todo**: Explora toda la base de datos
-- **Cumpleaños**: Ve quién cumple años este mes
-- **Cancelaciones**: Historial de pólizas canceladas
+st.sidebar.info(
+    "**💡 Instrucciones:**\n"
+    + "\n".join(f"- {p.ayuda}" for p in paginas)
+    + """
 
 **🔄 Si ves errores de cuota:**
 - Usa el botón "Limpiar Cache"
@@ -1420,34 +2153,36 @@ st.sidebar.info("""
 - Los datos se cachean para reducir llamadas a la API
 """)
 
-# Mostrar estadísticas rápidas en sidebar
+# Mostrar estadísticas rápidas en sidebar: salen de las copias ya cargadas por
+# alguna página; si todavía no hay copias, se cargan solo a pedido
 try:
-    todas_polizas = obtener_polizas()
-    if todas_polizas:
-        df_temp = pd.DataFrame(todas_polizas)
-        st.sidebar.markdown("---")
-        st.sidebar.subheader("📊 Resumen")
-        st.sidebar.write(f"**Pólizas activas:** {len(df_temp)}")
-        st.sidebar.write(f"**Clientes únicos:** {df_temp['No. Cliente'].nunique() if 'No. Cliente' in df_temp.columns else 'N/A'}")
-        
-        # Pólizas próximas a vencer
-        proximas = obtener_polizas_proximas_vencer(30)
-        st.sidebar.write(f"**Próximas a vencer (30 días):** {len(proximas)}")
-        
-        # Cumpleaños del mes
-        cumpleaños = obtener_cumpleaños_mes_actual()
-        st.sidebar.write(f"**Cumpleaños este mes:** {len(cumpleaños)}")
-        
-        # Cancelaciones
-        cancelaciones = obtener_cancelaciones()
-        st.sidebar.write(f"**Pólizas canceladas:** {len(cancelaciones)}")
-        
-        # Mostrar último ID utilizado
-        ultimo_id = obtener_ultimo_id_cliente()
-        st.sidebar.write(f"**Último ID utilizado:** {ultimo_id}")
+    hay_copias = sincronizador_polizas.cargado and sincronizador_cancelaciones.cargado
+    if hay_copias or st.sidebar.button("📊 Cargar resumen", key="cargar_resumen_btn"):
+        resumen = obtener_resumen_cartera(cargar=not hay_copias)
+        if resumen.polizas_activas:
+            st.sidebar.markdown("---")
+            st.sidebar.subheader("📊 Resumen")
+            st.sidebar.write(f"**Pólizas activas:** {resumen.polizas_activas}")
+            st.sidebar.write(f"**Clientes únicos:** {resumen.clientes_unicos}")
+            st.sidebar.write(f"**Próximas a vencer ({resumen.dias_vencimiento} días):** {resumen.proximas_a_vencer}")
+            st.sidebar.write(f"**Cumpleaños este mes:** {resumen.cumpleaños_mes}")
+            st.sidebar.write(f"**Pólizas canceladas:** {resumen.cancelaciones}")
+            st.sidebar.write(f"**Prima anual total:** ${resumen.prima_total:,.2f}")
+            st.sidebar.write(f"**Último ID utilizado:** {resumen.ultimo_id_cliente}")
+    mostrar_frescura_datos(pagina_actual.datos)
 except:
     pass
 
+if MOSTRAR_METRICAS:
+    mostrar_panel_metricas()
+
+metricas.terminar_render()
+if RUTA_METRICAS:
+    try:
+        metricas.exportar(RUTA_METRICAS, INTERVALO_EXPORTACION_METRICAS)
+    except OSError as e:
+        st.sidebar.warning(f"⚠️ No se pudieron escribir las métricas: {str(e)}")
+
 
 
 
@@ -0,0 +1,11 @@
+"""Benchmarks de la app sobre carteras generadas, sin Google Sheets ni navegador.
+
+    python -m benchmarks --filas 1000 10000 100000 --backend hoja_falsa sqlite --salida resultados.json
+    python -m benchmarks.comparar base.json resultados.json
+
+- datos: generador de carteras realistas (de 1k a 500k filas).
+- hoja_falsa: doble en memoria de los métodos de gspread que usa la app.
+- entorno: ejecuta la app sobre la cartera con el backend elegido.
+- casos: consultas, IDs de cliente, cancelaciones y reruns de cada página.
+- comparar: compara dos archivos de resultados entre commits.
+"""
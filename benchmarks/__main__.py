@@ -0,0 +1,126 @@
+"""Línea de comandos: genera las carteras, corre los casos y escribe el JSON de resultados"""
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+import streamlit.logger
+
+from benchmarks.casos import caso_traza, casos_funciones, casos_paginas
+from benchmarks.datos import generar_cartera
+from benchmarks.entorno import BACKENDS, RUTA_APP, EntornoApp
+
+VERSION_FORMATO = 1
+
+
+def commit_actual():
+    """Commit del árbol medido (con '+cambios' si hay modificaciones sin confirmar)"""
+    try:
+        raiz = RUTA_APP.parent
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=raiz, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        cambios = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=raiz,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("+cambios" if cambios else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def silenciar_streamlit():
+    """Deja solo los errores en los loggers de Streamlit.
+
+    Los avisos de modo bare y de deprecación no aportan a las mediciones.
+    Streamlit vuelve a fijar el nivel de sus loggers la primera vez que lee su
+    configuración, así que se fuerza esa lectura antes, y se aplica de nuevo
+    después de cargar la app por los loggers que se crearon en la carga.
+    """
+    st.config.get_option("logger.level")
+    streamlit.logger.set_log_level("error")
+    for nombre in list(logging.root.manager.loggerDict):
+        if nombre == "streamlit" or nombre.startswith("streamlit."):
+            logging.getLogger(nombre).setLevel(logging.ERROR)
+
+
+def correr(filas, backend, args, directorio):
+    """Resultados de todos los casos para un tamaño de cartera y un backend"""
+    polizas, cancelaciones = generar_cartera(filas, semilla=args.semilla)
+    resultados = []
+    entorno = EntornoApp(backend, polizas, cancelaciones, directorio, latencia=args.latencia,
+                         cuota_real=args.cuota_real)
+    with entorno:
+        inicio = time.perf_counter()
+        try:
+            entorno.cargar_app()
+            silenciar_streamlit()
+            resultados.append({"caso": "carga", "repeticiones": 0, "primera_s": time.perf_counter() - inicio,
+                               "error": None, "llamadas_api": entorno.llamadas_api()})
+        except Exception as error:
+            resultados.append(caso_traza("carga", error))
+        else:
+            resultados.extend(casos_funciones(entorno, args.repeticiones))
+            if not args.sin_paginas:
+                resultados.extend(casos_paginas(entorno, args.repeticiones))
+    for resultado in resultados:
+        resultado.update(filas=filas, backend=backend)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000, 10_000],
+                        help="Tamaños de cartera a medir (de 1k a 500k)")
+    parser.add_argument("--backend", nargs="+", choices=BACKENDS, default=["hoja_falsa"])
+    parser.add_argument("--repeticiones", type=int, default=5, help="Llamadas en caliente por caso")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="Segundos de latencia simulada por llamada a la hoja falsa")
+    parser.add_argument("--cuota-real", action="store_true",
+                        help="Respeta el presupuesto de cuota configurado en lugar de desactivarlo")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--sin-paginas", action="store_true", help="No medir los reruns de páginas con AppTest")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, la salida estándar)")
+    args = parser.parse_args(argv)
+    silenciar_streamlit()
+
+    informe = {
+        "version": VERSION_FORMATO,
+        "meta": {
+            "commit": commit_actual(),
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "streamlit": st.__version__,
+            "plataforma": platform.platform(),
+            "semilla": args.semilla,
+            "latencia": args.latencia,
+            "cuota_real": args.cuota_real,
+        },
+        "resultados": [],
+    }
+    with tempfile.TemporaryDirectory() as directorio:
+        for backend in args.backend:
+            for filas in args.filas:
+                print(f"⏱️ {backend}, {filas:,} filas...", file=sys.stderr)
+                informe["resultados"].extend(correr(filas, backend, args, directorio))
+
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding="utf-8")
+    else:
+        print(texto)
+    errores = [r for r in informe["resultados"] if r.get("error")]
+    for resultado in errores:
+        print(f"❌ {resultado['backend']} {resultado['filas']} {resultado['caso']}: {resultado['error']}",
+              file=sys.stderr)
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Casos de benchmark sobre las funciones de la app y sobre sus páginas completas.
+
+Cada caso mide la primera llamada (caché fría: carga de la hoja, índices) por
+separado de las siguientes (caché caliente), que es lo que paga cada rerun.
+"""
+import statistics
+import time
+import traceback
+import warnings
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.entorno import RUTA_APP
+
+# Las cancelaciones esperan el plazo del lote de escritura: pocas repeticiones bastan
+MAX_REPETICIONES_CANCELACION = 3
+TIMEOUT_PAGINA = 300
+
+
+def _resumir(tiempos):
+    """Estadísticas de los tiempos en caliente (sin la primera llamada)"""
+    if not tiempos:
+        return {"min_s": None, "mediana_s": None, "p95_s": None, "max_s": None}
+    ordenados = sorted(tiempos)
+    return {
+        "min_s": ordenados[0],
+        "mediana_s": statistics.median(ordenados),
+        "p95_s": ordenados[min(len(ordenados) - 1, round(0.95 * (len(ordenados) - 1)))],
+        "max_s": ordenados[-1],
+    }
+
+
+def medir(caso, entorno, funcion, repeticiones, preparar=None):
+    """Resultado de llamar `funcion(*preparar(i))` una vez en frío y `repeticiones` en caliente"""
+    resultado = {"caso": caso, "repeticiones": repeticiones, "primera_s": None, "error": None}
+    llamadas_antes = entorno.llamadas_api()
+    tiempos = []
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for i in range(repeticiones + 1):
+                argumentos = preparar(i) if preparar else ()
+                inicio = time.perf_counter()
+                funcion(*argumentos)
+                transcurrido = time.perf_counter() - inicio
+                if i == 0:
+                    resultado["primera_s"] = transcurrido
+                else:
+                    tiempos.append(transcurrido)
+    except Exception as error:
+        resultado["error"] = f"{type(error).__name__}: {error}"
+    resultado.update(_resumir(tiempos))
+    if llamadas_antes is not None:
+        resultado["llamadas_api"] = entorno.llamadas_api() - llamadas_antes
+    return resultado
+
+
+def casos_funciones(entorno, repeticiones):
+    """Mide las consultas, la generación de IDs y la cancelación sobre la app ya cargada"""
+    app = entorno.app
+    polizas = app["obtener_polizas"]()
+    # El contratante con más pólizas es el peor caso de la búsqueda por nombre
+    conteo = {}
+    for registro in polizas:
+        nombre = str(registro.get("CONTRATANTE", ""))
+        conteo[nombre] = conteo.get(nombre, 0) + 1
+    frecuente = max(conteo, key=conteo.get) if conteo else ""
+    serie = next((str(r.get("No Serie Auto", "")) for r in polizas if r.get("No Serie Auto")), "3VW")
+
+    resultados = [
+        medir("proximas_vencer", entorno, lambda: app["obtener_polizas_proximas_vencer"](30), repeticiones),
+        medir("cumpleaños_mes", entorno, app["obtener_cumpleaños_mes_actual"], repeticiones),
+        medir("clientes_unicos", entorno, app["obtener_clientes_unicos_cached"], repeticiones),
+        medir("buscar_cliente", entorno, app["buscar_por_nombre_cliente"], repeticiones,
+              preparar=lambda i: (frecuente,)),
+        # Lo que se va escribiendo en Consultar: prefijo, nombre en minúsculas y con un error
+        medir("sugerencias_cliente", entorno, app["sugerir_clientes"], repeticiones,
+              preparar=lambda i: ([frecuente[:4], frecuente.lower(), frecuente[:-2] + "x"][i % 3],)),
+        # Palabra común, fragmento de VIN y palabra limitada a una columna
+        medir("texto_completo", entorno, app["buscar_texto_completo"], repeticiones,
+              preparar=lambda i: (["calle 12", serie[5:12], "auto:sedan"][i % 3],)),
+        # Revisión de una fila nueva que repite un No. POLIZA y reporte de la hoja completa (sin caché)
+        medir("revisar_duplicados", entorno, lambda: app["duplicados_al_insertar"](
+            dict(polizas[-1]), app["obtener_indices_polizas"](), app["cola_polizas"].filas_pendientes()), repeticiones),
+        medir("reporte_duplicados", entorno, lambda: app["reporte_duplicados"](polizas), repeticiones),
+        medir("nuevo_id_cliente", entorno, app["generar_nuevo_id_cliente"], repeticiones),
+    ]
+
+    # Cada repetición cancela una póliza distinta, tomada de la copia vigente
+    candidatas = [dict(registro) for registro in polizas[-(MAX_REPETICIONES_CANCELACION + 1):]]
+
+    def cancelar(poliza):
+        if not app["cancelar_poliza"](poliza):
+            raise RuntimeError(f"No se canceló la póliza {poliza.get('No. POLIZA', '')}")
+
+    resultados.append(medir(
+        "cancelacion", entorno, cancelar, min(repeticiones, len(candidatas) - 1),
+        preparar=lambda i: (candidatas[i],)
+    ))
+    return resultados
+
+
+def casos_paginas(entorno, repeticiones):
+    """Primer render y reruns de cada página del menú con AppTest"""
+    resultados = []
+    try:
+        at = AppTest.from_file(str(RUTA_APP), default_timeout=TIMEOUT_PAGINA)
+        for clave, valor in entorno.secrets.items():
+            at.secrets[clave] = valor
+        at.run()
+        opciones = list(at.sidebar.radio[0].options)
+    except Exception as error:
+        return [caso_traza("paginas", error)]
+
+    for opcion in opciones:
+        def rerun(opcion=opcion):
+            at.sidebar.radio[0].set_value(opcion)
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+        resultados.append(medir(f"pagina: {opcion}", entorno, rerun, repeticiones))
+    # El AppTest corre en este proceso: no se deja nada en caché para el siguiente tamaño
+    st.cache_resource.clear()
+    return resultados
+
+
+def caso_traza(caso, error):
+    """Resultado de un caso que no se pudo ni preparar"""
+    return {"caso": caso, "repeticiones": 0, "primera_s": None,
+            "error": "".join(traceback.format_exception_only(type(error), error)).strip()}
@@ -0,0 +1,70 @@
+"""Compara dos archivos de resultados y señala las regresiones.
+
+    python -m benchmarks.comparar base.json nuevo.json --umbral 0.2
+
+Compara la mediana en caliente (o el primer tiempo, si el caso no tiene
+repeticiones) de cada (backend, filas, caso) presente en ambos archivos, y las
+llamadas a la API. Termina con código 1 si algún caso empeora más que el umbral.
+"""
+import argparse
+import json
+import sys
+
+# Por debajo de este tiempo las diferencias son ruido del reloj
+MINIMO_SIGNIFICATIVO_S = 0.001
+
+
+def cargar(ruta):
+    with open(ruta, encoding="utf-8") as archivo:
+        informe = json.load(archivo)
+    return informe, {(r["backend"], r["filas"], r["caso"]): r for r in informe["resultados"]}
+
+
+def tiempo(resultado):
+    return resultado.get("mediana_s") if resultado.get("mediana_s") is not None else resultado.get("primera_s")
+
+
+def comparar(base, nuevo, umbral):
+    """Filas (clave, tiempo_base, tiempo_nuevo, razón, regresión) de los casos comunes"""
+    filas = []
+    for clave in sorted(set(base) & set(nuevo), key=str):
+        antes, despues = tiempo(base[clave]), tiempo(nuevo[clave])
+        if antes is None or despues is None:
+            filas.append((clave, antes, despues, None, bool(nuevo[clave].get("error"))))
+            continue
+        razon = despues / max(antes, MINIMO_SIGNIFICATIVO_S)
+        llamadas_antes = base[clave].get("llamadas_api")
+        llamadas_despues = nuevo[clave].get("llamadas_api")
+        mas_llamadas = llamadas_antes is not None and llamadas_despues is not None and llamadas_despues > llamadas_antes
+        lento = razon > 1 + umbral and despues - antes > MINIMO_SIGNIFICATIVO_S
+        filas.append((clave, antes, despues, razon, lento or mas_llamadas))
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.comparar", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=0.2, help="Aumento relativo tolerado (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    informe_base, base = cargar(args.base)
+    informe_nuevo, nuevo = cargar(args.nuevo)
+    print(f"base:  {informe_base['meta'].get('commit')}  ({informe_base['meta'].get('fecha')})")
+    print(f"nuevo: {informe_nuevo['meta'].get('commit')}  ({informe_nuevo['meta'].get('fecha')})")
+
+    regresiones = 0
+    for (backend, filas, caso), antes, despues, razon, regresion in comparar(base, nuevo, args.umbral):
+        regresiones += regresion
+        marca = "❌" if regresion else "  "
+        antes_txt = f"{antes * 1000:10.2f} ms" if antes is not None else "         -   "
+        despues_txt = f"{despues * 1000:10.2f} ms" if despues is not None else "         -   "
+        razon_txt = f"x{razon:5.2f}" if razon is not None else "     -"
+        print(f"{marca} {backend:<10} {filas:>8} {caso:<45} {antes_txt} {despues_txt} {razon_txt}")
+    print(f"\n{regresiones} regresiones (umbral {args.umbral:.0%})")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
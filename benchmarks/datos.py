@@ -0,0 +1,113 @@
+"""Generador de carteras de pólizas realistas para los benchmarks.
+
+Las carteras imitan lo que hay en la hoja real: fechas en los cuatro formatos
+que acepta la app, contratantes con varias pólizas (unos pocos con muchas),
+nombres con acentos, algunas primas capturadas como texto y una fracción de
+pólizas ya canceladas. Con la misma semilla se obtiene siempre la misma cartera.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.almacenamiento import CAMPOS_POLIZA
+
+NOMBRES = [
+    "José", "María", "Juan", "Guadalupe", "Luis", "Ana", "Jesús", "Sofía", "Ángel", "Lucía",
+    "Miguel", "Fernanda", "Raúl", "Mónica", "Héctor", "Verónica", "Andrés", "Inés", "Ramón", "Beatriz",
+]
+APELLIDOS = [
+    "Hernández", "García", "Martínez", "López", "González", "Pérez", "Rodríguez", "Sánchez",
+    "Ramírez", "Cruz", "Flores", "Gómez", "Morales", "Vázquez", "Jiménez", "Reyes", "Díaz",
+    "Torres", "Gutiérrez", "Ruiz", "Núñez", "Ibáñez", "Muñoz", "Ortiz",
+]
+ASEGURADORAS = ["ALLIANZ", "ANA SEGUROS", "BX+", "EL AGUILA", "INSIGNIA LIFE", "MAPFRE", "QUALITAS"]
+PRODUCTOS = ["AUTO", "GMM", "VIDA", "HOGAR", "DAÑOS", "ACCIDENTES PERSONALES"]
+ESTADOS_CIVILES = ["", "SOLTERO/A", "CASADO/A", "DIVORCIADO/A", "SEPARADO/A", "UNIÓN LIBRE", "VIUDO/A"]
+FORMAS_DE_PAGO = ["TARJETA", "TRANSFERENCIA", "EFECTIVO", "DOMICILIADO"]
+FRECUENCIAS = ["ANUAL", "SEMESTRAL", "TRIMESTRAL", "MENSUAL"]
+
+# Formatos de fecha y su proporción en la hoja
+FORMATOS_FECHA = {"%d/%m/%Y": 0.70, "%Y-%m-%d": 0.15, "%m/%d/%Y": 0.10, "%d-%m-%Y": 0.05}
+
+
+def _fechas_como_texto(fechas, azar):
+    """Formatea cada fecha con un formato elegido al azar según FORMATOS_FECHA"""
+    formatos = list(FORMATOS_FECHA)
+    elegidos = azar.choice(len(formatos), size=len(fechas), p=list(FORMATOS_FECHA.values()))
+    # Hay pocas fechas distintas: se formatean una vez y se reparten por código
+    codigos, unicas = pd.factorize(fechas)
+    textos = np.empty(len(fechas), dtype=object)
+    for i, formato in enumerate(formatos):
+        mascara = elegidos == i
+        textos[mascara] = np.asarray(unicas.strftime(formato), dtype=object)[codigos[mascara]]
+    return textos
+
+
+def _fechas_al_azar(azar, cantidad, desde, hasta):
+    inicio = pd.Timestamp(desde).value // 86_400_000_000_000
+    fin = pd.Timestamp(hasta).value // 86_400_000_000_000
+    return pd.to_datetime(azar.integers(inicio, fin, size=cantidad), unit="D")
+
+
+def generar_cartera(filas, semilla=0, proporcion_cancelaciones=0.05, hoy=None):
+    """Devuelve (polizas, cancelaciones) como listas de filas en el orden de CAMPOS_POLIZA"""
+    azar = np.random.default_rng(semilla)
+    hoy = pd.Timestamp(hoy or pd.Timestamp.now().normalize())
+    canceladas = int(filas * proporcion_cancelaciones)
+    total = filas + canceladas
+
+    # Contratantes: alrededor de 1.6 pólizas cada uno; el 10% de las pólizas es de
+    # un 0.5% de clientes frecuentes (flotillas, familias) con decenas de pólizas
+    contratantes = max(1, int(total / 1.6))
+    ids_contratante = azar.integers(0, contratantes, size=total)
+    frecuentes = azar.random(total) < 0.1
+    ids_contratante[frecuentes] = azar.integers(0, max(1, contratantes // 200), size=int(frecuentes.sum()))
+    nombres = np.array([
+        f"{NOMBRES[i % len(NOMBRES)]} {APELLIDOS[(i // len(NOMBRES)) % len(APELLIDOS)]} "
+        f"{APELLIDOS[(i * 7 + 3) % len(APELLIDOS)]} {i}"
+        for i in range(contratantes)
+    ], dtype=object)
+    # Algunas capturas del mismo contratante en mayúsculas
+    contratante = nombres[ids_contratante]
+    variantes = azar.random(total) < 0.05
+    contratante[variantes] = np.char.upper(contratante[variantes].astype(str)).astype(object)
+
+    nacimiento = _fechas_al_azar(azar, total, "1945-01-01", "2005-12-31")
+    inicio = _fechas_al_azar(azar, total, hoy - pd.Timedelta(days=730), hoy + pd.Timedelta(days=60))
+    fin = inicio + pd.to_timedelta(np.where(azar.random(total) < 0.9, 365, 730), unit="D")
+
+    primas = np.round(azar.lognormal(9, 0.8, size=total), 2).astype(str).astype(object)
+    # Algunas primas capturadas como texto con formato de moneda
+    con_moneda = azar.random(total) < 0.01
+    primas[con_moneda] = [f"${float(p):,.2f}" for p in primas[con_moneda]]
+    productos = np.array(PRODUCTOS, dtype=object)[azar.integers(0, len(PRODUCTOS), size=total)]
+    es_auto = productos == "AUTO"
+
+    columnas = {
+        "No. Cliente": (ids_contratante + 1).astype(str),
+        "CONTRATANTE": contratante,
+        "ASEGURADO": np.where(azar.random(total) < 0.7, contratante, nombres[azar.integers(0, contratantes, total)]),
+        "BENEFICIARIO": np.where(azar.random(total) < 0.5, nombres[azar.integers(0, contratantes, total)], ""),
+        "FECHA DE NAC CONTRATANTE": _fechas_como_texto(nacimiento, azar),
+        "FECHA DE NAC ASEGURADO": _fechas_como_texto(nacimiento, azar),
+        "ESTADO CIVIL": np.array(ESTADOS_CIVILES, dtype=object)[azar.integers(0, len(ESTADOS_CIVILES), total)],
+        "No. POLIZA": np.char.add("POL-", np.char.zfill(np.arange(total).astype(str), 8)),
+        "INICIO DE VIGENCIA": _fechas_como_texto(inicio, azar),
+        "FIN DE VIGENCIA": _fechas_como_texto(fin, azar),
+        "FORMA DE PAGO": np.array(FORMAS_DE_PAGO, dtype=object)[azar.integers(0, len(FORMAS_DE_PAGO), total)],
+        "FRECUENCIA DE PAGO": np.array(FRECUENCIAS, dtype=object)[azar.integers(0, len(FRECUENCIAS), total)],
+        "PRIMA ANUAL": primas,
+        "PRODUCTO": productos,
+        "No Serie Auto": np.where(es_auto, np.char.add("3VW", np.char.zfill(azar.integers(0, 10**9, total).astype(str), 14)), ""),
+        "ASEGURADORA": np.array(ASEGURADORAS, dtype=object)[azar.integers(0, len(ASEGURADORAS), total)],
+        "DIRECCIÓN": np.char.add("Calle ", azar.integers(1, 500, total).astype(str)),
+        "TELEFONO": np.char.add("55", np.char.zfill(azar.integers(0, 10**8, total).astype(str), 8)),
+        "EMAIL": np.char.add(np.char.add("cliente", (ids_contratante + 1).astype(str)), "@correo.mx"),
+        "NOTAS": "",
+        "DESCRIPCION AUTO": np.where(es_auto, "SEDAN 4 PUERTAS", ""),
+    }
+    tabla = pd.DataFrame({campo: columnas[campo] for campo in CAMPOS_POLIZA}).astype(str)
+    filas_generadas = tabla.to_numpy().tolist()
+    orden = azar.permutation(total)
+    polizas = [filas_generadas[i] for i in orden[:filas]]
+    cancelaciones = [filas_generadas[i] for i in orden[filas:]]
+    return polizas, cancelaciones
@@ -0,0 +1,110 @@
+"""Carga la app sobre una cartera generada para medir sus funciones.
+
+El script de Streamlit se ejecuta con `runpy` en modo bare: sus funciones
+quedan en un diccionario y se pueden llamar directamente. Hay dos backends:
+
+- "sqlite": la cartera se escribe en una base SQLite temporal.
+- "hoja_falsa": la app usa el backend de Google Sheets, pero gspread y las
+  credenciales se sustituyen por `ClienteFalso`, así que pasa por el mismo
+  repositorio, cliente de cuota y sincronización que en producción.
+"""
+import os
+import runpy
+import warnings
+from pathlib import Path
+from unittest import mock
+
+import streamlit as st
+from streamlit.delta_generator_singletons import get_dg_singleton_instance
+
+from benchmarks.hoja_falsa import ClienteFalso, HojaFalsa, LibroFalso
+from nucleo.almacenamiento import CAMPOS_POLIZA, RepositorioSQLite
+
+RUTA_APP = Path(__file__).resolve().parent.parent / "base_polizas.py"
+BACKENDS = ["sqlite", "hoja_falsa"]
+
+# Sin límite de cuota por defecto: se mide la app, no la espera por tokens
+CUOTA_SIN_LIMITE = "1000000"
+
+
+class EntornoApp:
+    """Backend de prueba con una cartera cargada y la app ejecutada sobre él"""
+
+    def __init__(self, backend, polizas, cancelaciones, directorio, latencia=0.0, cuota_real=False):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconocido: '{backend}'")
+        self.backend = backend
+        self.directorio = Path(directorio)
+        self.latencia = latencia
+        self.libro = None
+        self.app = None
+        self._variables = {"POLIZAS_BACKEND": "sqlite" if backend == "sqlite" else "google_sheets"}
+        if not cuota_real:
+            self._variables["POLIZAS_LECTURAS_POR_MINUTO"] = CUOTA_SIN_LIMITE
+            self._variables["POLIZAS_ESCRITURAS_POR_MINUTO"] = CUOTA_SIN_LIMITE
+        self._parches = []
+        self._entorno_anterior = {}
+        self._preparar(polizas, cancelaciones)
+
+    def _preparar(self, polizas, cancelaciones):
+        if self.backend == "sqlite":
+            ruta = self.directorio / "benchmark.db"
+            if ruta.exists():
+                ruta.unlink()
+            for nombre, filas in (("Polizas", polizas), ("Cancelaciones", cancelaciones)):
+                RepositorioSQLite(str(ruta), nombre, CAMPOS_POLIZA).agregar(filas)
+            self._variables["POLIZAS_RUTA_SQLITE"] = str(ruta)
+        else:
+            self.libro = LibroFalso([
+                HojaFalsa("Polizas", CAMPOS_POLIZA, polizas, self.latencia),
+                HojaFalsa("Cancelaciones", CAMPOS_POLIZA, cancelaciones, self.latencia),
+            ], latencia=self.latencia)
+            cliente = ClienteFalso(self.libro)
+            self._parches = [
+                mock.patch("gspread.authorize", lambda credenciales: cliente),
+                mock.patch("google.oauth2.service_account.Credentials.from_service_account_info",
+                           lambda info, scopes=None: object()),
+            ]
+
+    @property
+    def secrets(self):
+        """Secrets mínimos para que la app tome el camino de Google Sheets"""
+        return {"google_service_account": {"type": "service_account"}} if self.backend == "hoja_falsa" else {}
+
+    def llamadas_api(self):
+        """Total de llamadas a la API falsa (None con SQLite)"""
+        return sum(self.libro.llamadas().values()) if self.libro is not None else None
+
+    def cargar_app(self):
+        """Ejecuta el script completo (primer render) y devuelve sus funciones globales"""
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            with mock.patch.object(st, "secrets", self.secrets):
+                self.app = runpy.run_path(str(RUTA_APP), run_name="__benchmark__")
+        # Sin runtime, st.form marca como formulario los contenedores raíz del
+        # proceso; se limpian para que los AppTest siguientes no fallen
+        singletons = get_dg_singleton_instance()
+        for contenedor in (singletons.main_dg, singletons.sidebar_dg, singletons.event_dg, singletons.bottom_dg):
+            contenedor._form_data = None
+        return self.app
+
+    def __enter__(self):
+        for nombre, valor in self._variables.items():
+            self._entorno_anterior[nombre] = os.environ.get(nombre)
+            os.environ[nombre] = valor
+        for parche in self._parches:
+            parche.start()
+        # Cada entorno parte sin nada en caché (copias, índices, tablas)
+        st.cache_resource.clear()
+        return self
+
+    def __exit__(self, *exc):
+        for parche in reversed(self._parches):
+            parche.stop()
+        for nombre, valor in self._entorno_anterior.items():
+            if valor is None:
+                os.environ.pop(nombre, None)
+            else:
+                os.environ[nombre] = valor
+        st.cache_resource.clear()
+        return False
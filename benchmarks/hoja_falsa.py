@@ -0,0 +1,216 @@
+"""Doble en memoria de gspread para correr la app sin Google Sheets.
+
+`HojaFalsa` implementa los métodos de `gspread.Worksheet` que usa la app con la
+misma forma de respuesta (textos en `get`, números en `get_all_records`, rango
+actualizado en `append_rows`), cuenta las llamadas por método y puede simular
+la latencia de red de cada llamada.
+"""
+import collections
+import re
+import threading
+import time
+import types
+
+import gspread
+
+from nucleo.almacenamiento import fila_a_registro
+
+_RANGO = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+def _columna_a_indice(letras):
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - ord("A") + 1
+    return indice
+
+
+def _indice_a_columna(indice):
+    letras = ""
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord("A") + resto) + letras
+    return letras
+
+
+class _Celda:
+    def __init__(self, fila, columna, valor):
+        self.row = fila
+        self.col = columna
+        self.value = valor
+
+
+class HojaFalsa:
+    """Worksheet en memoria: la fila 1 son los encabezados (sin encabezados, la hoja está vacía)"""
+
+    def __init__(self, titulo, encabezados=(), filas=(), latencia=0.0):
+        self.title = titulo
+        self.latencia = latencia
+        self.llamadas = collections.Counter()
+        self._filas = ([list(encabezados)] if encabezados else []) + [[str(v) for v in fila] for fila in filas]
+        self._lock = threading.Lock()
+
+    def _llamada(self, metodo):
+        self.llamadas[metodo] += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _rango(self, rango):
+        """(fila_inicio, fila_fin, col_inicio, col_fin) en base 1, inclusivos"""
+        rango = rango.rsplit("!", 1)[-1]
+        coincidencia = _RANGO.match(rango)
+        if coincidencia is None:
+            raise ValueError(f"Rango no soportado: {rango}")
+        col_ini, fila_ini, col_fin, fila_fin = coincidencia.groups()
+        col_fin = col_fin or col_ini
+        fila_ini = int(fila_ini) if fila_ini else 1
+        if fila_fin:
+            fila_fin = int(fila_fin)
+        elif coincidencia.group(3) is None and coincidencia.group(2):
+            fila_fin = fila_ini
+        else:
+            fila_fin = len(self._filas)
+        return fila_ini, fila_fin, _columna_a_indice(col_ini), _columna_a_indice(col_fin)
+
+    def _leer(self, rango):
+        fila_ini, fila_fin, col_ini, col_fin = self._rango(rango)
+        valores = []
+        for fila in self._filas[fila_ini - 1:fila_fin]:
+            celdas = fila[col_ini - 1:col_fin]
+            # La API omite las celdas vacías al final de cada fila
+            while celdas and celdas[-1] == "":
+                celdas = celdas[:-1]
+            valores.append(celdas)
+        # ... y las filas vacías al final del rango
+        while valores and not valores[-1]:
+            valores.pop()
+        return valores
+
+    # ------------------------------------------------------------
+    # Lecturas
+    # ------------------------------------------------------------
+    def get_all_records(self):
+        self._llamada("get_all_records")
+        with self._lock:
+            if not self._filas:
+                return []
+            return [fila_a_registro(self._filas[0], fila) for fila in self._filas[1:]]
+
+    def get_all_values(self):
+        self._llamada("get_all_values")
+        with self._lock:
+            return [list(fila) for fila in self._filas]
+
+    def get(self, rango):
+        self._llamada("get")
+        with self._lock:
+            return self._leer(rango)
+
+    def batch_get(self, rangos):
+        self._llamada("batch_get")
+        with self._lock:
+            return [self._leer(rango) for rango in rangos]
+
+    def row_values(self, fila):
+        self._llamada("row_values")
+        with self._lock:
+            valores = list(self._filas[fila - 1]) if fila <= len(self._filas) else []
+        while valores and valores[-1] == "":
+            valores.pop()
+        return valores
+
+    def col_values(self, columna):
+        self._llamada("col_values")
+        with self._lock:
+            valores = [fila[columna - 1] if columna <= len(fila) else "" for fila in self._filas]
+        while valores and valores[-1] == "":
+            valores.pop()
+        return valores
+
+    def findall(self, valor, in_column=None):
+        self._llamada("findall")
+        with self._lock:
+            return [
+                _Celda(i, j, celda)
+                for i, fila in enumerate(self._filas, start=1)
+                for j, celda in enumerate(fila, start=1)
+                if celda == valor and (in_column is None or j == in_column)
+            ]
+
+    # ------------------------------------------------------------
+    # Escrituras
+    # ------------------------------------------------------------
+    def append_rows(self, filas, value_input_option=None):
+        self._llamada("append_rows")
+        with self._lock:
+            inicio = len(self._filas) + 1
+            self._filas.extend([str(v) for v in fila] for fila in filas)
+            fin = len(self._filas)
+        ancho = max((len(fila) for fila in filas), default=1)
+        return {"updates": {"updatedRange": f"{self.title}!A{inicio}:{_indice_a_columna(ancho)}{fin}"}}
+
+    def append_row(self, fila, value_input_option=None):
+        return self.append_rows([fila], value_input_option)
+
+    def update(self, values=None, range_name=None):
+        self._llamada("update")
+        with self._lock:
+            fila_ini, _, col_ini, _ = self._rango(range_name)
+            for i, valores in enumerate(values):
+                indice = fila_ini - 1 + i
+                while len(self._filas) <= indice:
+                    self._filas.append([])
+                fila = self._filas[indice]
+                fila.extend([""] * (col_ini - 1 + len(valores) - len(fila)))
+                fila[col_ini - 1:col_ini - 1 + len(valores)] = [str(v) for v in valores]
+
+    def delete_rows(self, fila):
+        self._llamada("delete_rows")
+        with self._lock:
+            del self._filas[fila - 1]
+
+
+class LibroFalso:
+    """Spreadsheet en memoria con sus hojas por título"""
+
+    def __init__(self, hojas=(), latencia=0.0):
+        self.latencia = latencia
+        self.hojas = {hoja.title: hoja for hoja in hojas}
+        # Llamadas de metadatos (abrir el libro, buscar o crear hojas)
+        self.metadatos = collections.Counter()
+
+    def _llamada(self, metodo):
+        self.metadatos[metodo] += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def worksheet(self, titulo):
+        self._llamada("worksheet")
+        if titulo not in self.hojas:
+            raise gspread.WorksheetNotFound(titulo)
+        return self.hojas[titulo]
+
+    def add_worksheet(self, title, rows=None, cols=None):
+        self._llamada("add_worksheet")
+        # La hoja nueva no tiene encabezados: quien la crea los agrega con append_row
+        self.hojas[title] = HojaFalsa(title, latencia=self.latencia)
+        return self.hojas[title]
+
+    def llamadas(self):
+        """Total de llamadas por método en todas las hojas y en el libro"""
+        total = collections.Counter(self.metadatos)
+        for hoja in self.hojas.values():
+            total.update(hoja.llamadas)
+        return total
+
+
+class ClienteFalso:
+    """Sustituto de gspread.Client: `open` devuelve siempre el mismo libro"""
+
+    def __init__(self, libro):
+        self.libro = libro
+        self.http_client = types.SimpleNamespace(session=types.SimpleNamespace(hooks={"response": []}))
+
+    def open(self, nombre):
+        self.libro._llamada("open")
+        return self.libro
@@ -0,0 +1 @@
+"""Componentes de datos del Sistema de Gestión de Pólizas, independientes de la interfaz."""
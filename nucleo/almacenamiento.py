@@ -0,0 +1,288 @@
+"""Repositorios de almacenamiento para las hojas de Pólizas y Cancelaciones.
+
+Todas las lecturas y escrituras de la aplicación pasan por un repositorio con la
+misma interfaz (listar, agregar, eliminar, actualizar y buscar por clave), de
+modo que el motor se puede elegir por configuración: Google Sheets en
+producción o una base SQLite local para pruebas, benchmarks o lecturas rápidas.
+
+Las filas se numeran igual que en la hoja de cálculo: la fila 1 son los
+encabezados y los registros empiezan en la fila 2.
+"""
+import abc
+import itertools
+import sqlite3
+import threading
+
+from gspread.utils import numericise
+
+PRIMERA_FILA_DATOS = 2
+
+# Columnas de las hojas de Pólizas y Cancelaciones, en el orden de la hoja
+CAMPOS_POLIZA = [
+    "No. Cliente", "CONTRATANTE", "ASEGURADO", "BENEFICIARIO",
+    "FECHA DE NAC CONTRATANTE", "FECHA DE NAC ASEGURADO", "ESTADO CIVIL",
+    "No. POLIZA", "INICIO DE VIGENCIA", "FIN DE VIGENCIA", "FORMA DE PAGO",
+    "FRECUENCIA DE PAGO", "PRIMA ANUAL", "PRODUCTO", "No Serie Auto",
+    "ASEGURADORA", "DIRECCIÓN", "TELEFONO", "EMAIL", "NOTAS", "DESCRIPCION AUTO"
+]
+
+
+# ============================================================
+# UTILIDADES
+# ============================================================
+def numerizar(valor):
+    """Convierte textos numéricos a int/float con la misma función que usa get_all_records de gspread"""
+    return numericise(valor)
+
+
+def fila_a_registro(encabezados, valores):
+    """Convierte una lista de valores en un diccionario rellenando celdas vacías"""
+    valores = list(valores)[:len(encabezados)]
+    valores += [""] * (len(encabezados) - len(valores))
+    return {campo: numerizar(valor) for campo, valor in zip(encabezados, valores)}
+
+
+def registro_a_fila(datos):
+    """Normaliza una fila a texto, como se escribe en la hoja"""
+    return [str(dato) if dato is not None else "" for dato in datos]
+
+
+# ============================================================
+# INTERFAZ COMÚN
+# ============================================================
+class RepositorioHoja(abc.ABC):
+    """Interfaz común para un conjunto de registros con encabezados fijos"""
+
+    def __init__(self, nombre, encabezados):
+        self.nombre = nombre
+        self.encabezados = list(encabezados)
+
+    @abc.abstractmethod
+    def listar(self):
+        """Devuelve todos los registros como lista de diccionarios"""
+
+    @abc.abstractmethod
+    def agregar(self, filas):
+        """Agrega varias filas (listas de valores) al final"""
+
+    def agregar_fila(self, datos):
+        """Agrega una sola fila al final"""
+        return self.agregar([datos])
+
+    @abc.abstractmethod
+    def eliminar(self, fila):
+        """Elimina la fila indicada (numeración de hoja, datos desde la fila 2)"""
+
+    @abc.abstractmethod
+    def actualizar(self, fila, datos):
+        """Reemplaza los valores de la fila indicada"""
+
+    @abc.abstractmethod
+    def buscar(self, campo, valor):
+        """Devuelve [(fila, registro)] cuyos valores en `campo` coinciden con `valor`"""
+
+    def leer_columna(self, campo):
+        """Devuelve los valores de una sola columna (sin encabezado), en orden de fila"""
+        return self.leer_columnas([campo])[0]
+
+    @abc.abstractmethod
+    def leer_columnas(self, campos):
+        """Devuelve una lista de valores por cada campo, todas del mismo largo"""
+
+    @abc.abstractmethod
+    def leer_rango(self, fila_inicio, fila_fin):
+        """Devuelve los registros de las filas fila_inicio..fila_fin (inclusive)"""
+
+    def columna(self, campo):
+        """Índice (base 1) de la columna de un campo"""
+        return self.encabezados.index(campo) + 1
+
+
+# ============================================================
+# IMPLEMENTACIÓN GOOGLE SHEETS
+# ============================================================
+class RepositorioGoogleSheets(RepositorioHoja):
+    """Repositorio respaldado por una hoja de trabajo de gspread"""
+
+    def __init__(self, worksheet, encabezados):
+        super().__init__(worksheet.title, encabezados)
+        self.worksheet = worksheet
+        self._verificar_encabezados()
+
+    def _verificar_encabezados(self):
+        """Las filas se leen y escriben por posición: la fila 1 debe traer los encabezados en orden"""
+        encontrados = [str(valor).strip() for valor in self.worksheet.row_values(1)][:len(self.encabezados)]
+        diferencias = [
+            f"columna {numero}: se esperaba '{esperado}' y la hoja tiene '{encontrado}'"
+            for numero, (esperado, encontrado)
+            in enumerate(itertools.zip_longest(self.encabezados, encontrados, fillvalue=""), start=1)
+            if esperado != encontrado
+        ]
+        if diferencias:
+            raise ValueError(
+                f"Los encabezados de la hoja '{self.nombre}' no coinciden con los esperados "
+                f"({'; '.join(diferencias[:3])}{'; …' if len(diferencias) > 3 else ''})"
+            )
+
+    def _rango_fila(self, fila, fila_fin=None):
+        from gspread.utils import rowcol_to_a1
+        return f"A{fila}:{rowcol_to_a1(fila_fin or fila, len(self.encabezados))}"
+
+    def _letra_ultima_columna(self):
+        from gspread.utils import rowcol_to_a1
+        return rowcol_to_a1(1, len(self.encabezados)).rstrip("0123456789")
+
+    def listar(self):
+        # Se convierte igual que en leer_rango para que los hashes de bloque
+        # de la sincronización coincidan entre una carga completa y una parcial
+        valores = self.worksheet.get_all_values()
+        return [fila_a_registro(self.encabezados, fila) for fila in valores[PRIMERA_FILA_DATOS - 1:]]
+
+    def agregar(self, filas):
+        filas = [registro_a_fila(datos) for datos in filas]
+        if filas:
+            self.worksheet.append_rows(filas)
+        return len(filas)
+
+    def eliminar(self, fila):
+        self.worksheet.delete_rows(fila)
+
+    def actualizar(self, fila, datos):
+        self.worksheet.update(values=[registro_a_fila(datos)], range_name=self._rango_fila(fila))
+
+    def buscar(self, campo, valor):
+        celdas = self.worksheet.findall(str(valor), in_column=self.columna(campo))
+        filas = [c.row for c in celdas if c.row >= PRIMERA_FILA_DATOS]
+        if not filas:
+            return []
+        rangos = self.worksheet.batch_get([self._rango_fila(f) for f in filas])
+        return [
+            (fila, fila_a_registro(self.encabezados, rango[0] if rango else []))
+            for fila, rango in zip(filas, rangos)
+        ]
+
+    def leer_columna(self, campo):
+        valores = self.worksheet.col_values(self.columna(campo))[PRIMERA_FILA_DATOS - 1:]
+        # col_values omite las celdas vacías del final: las filas que siguen con
+        # la clave vacía se cuentan leyendo solo ese tramo de la hoja
+        inicio = len(valores) + PRIMERA_FILA_DATOS
+        restantes = self.worksheet.get(f"A{inicio}:{self._letra_ultima_columna()}")
+        return [numerizar(valor) for valor in valores] + [""] * len(restantes)
+
+    def leer_columnas(self, campos):
+        from gspread.utils import rowcol_to_a1
+        rangos = []
+        for campo in campos:
+            letra = rowcol_to_a1(1, self.columna(campo)).rstrip("0123456789")
+            rangos.append(f"{letra}{PRIMERA_FILA_DATOS}:{letra}")
+        # Una sola llamada para todas las columnas
+        respuestas = self.worksheet.batch_get(rangos)
+        columnas = [[numerizar(celda[0]) if celda else "" for celda in r] for r in respuestas]
+        largo = max((len(c) for c in columnas), default=0)
+        return [c + [""] * (largo - len(c)) for c in columnas]
+
+    def leer_rango(self, fila_inicio, fila_fin):
+        if fila_fin < fila_inicio:
+            return []
+        valores = self.worksheet.get(self._rango_fila(fila_inicio, fila_fin))
+        valores = list(valores) + [[]] * (fila_fin - fila_inicio + 1 - len(valores))
+        return [fila_a_registro(self.encabezados, fila) for fila in valores]
+
+
+# ============================================================
+# IMPLEMENTACIÓN SQLITE LOCAL
+# ============================================================
+class RepositorioSQLite(RepositorioHoja):
+    """Repositorio en una tabla SQLite local con índices sobre los campos clave"""
+
+    def __init__(self, ruta, nombre, encabezados, claves=()):
+        super().__init__(nombre, encabezados)
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._tabla = self._citar(nombre)
+        self._columnas = ", ".join(self._citar(c) for c in self.encabezados)
+        with self._conexion:
+            definiciones = ", ".join(f"{self._citar(c)} TEXT DEFAULT ''" for c in self.encabezados)
+            self._conexion.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._tabla} "
+                f"(_id INTEGER PRIMARY KEY AUTOINCREMENT, {definiciones})"
+            )
+            for campo in claves:
+                indice = self._citar(f"idx_{nombre}_{campo}")
+                self._conexion.execute(
+                    f"CREATE INDEX IF NOT EXISTS {indice} ON {self._tabla} ({self._citar(campo)})"
+                )
+
+    @staticmethod
+    def _citar(identificador):
+        return '"' + identificador.replace('"', '""') + '"'
+
+    def _id_de_fila(self, fila):
+        cursor = self._conexion.execute(
+            f"SELECT _id FROM {self._tabla} ORDER BY _id LIMIT 1 OFFSET ?",
+            (fila - PRIMERA_FILA_DATOS,)
+        )
+        resultado = cursor.fetchone()
+        if resultado is None:
+            raise IndexError(f"La fila {fila} no existe en '{self.nombre}'")
+        return resultado[0]
+
+    def listar(self):
+        with self._lock:
+            cursor = self._conexion.execute(f"SELECT {self._columnas} FROM {self._tabla} ORDER BY _id")
+            return [fila_a_registro(self.encabezados, valores) for valores in cursor]
+
+    def agregar(self, filas):
+        filas = [registro_a_fila(datos) for datos in filas]
+        valores = [
+            (fila + [""] * len(self.encabezados))[:len(self.encabezados)]
+            for fila in filas
+        ]
+        marcadores = ", ".join("?" for _ in self.encabezados)
+        with self._lock, self._conexion:
+            self._conexion.executemany(
+                f"INSERT INTO {self._tabla} ({self._columnas}) VALUES ({marcadores})", valores
+            )
+        return len(valores)
+
+    def eliminar(self, fila):
+        with self._lock, self._conexion:
+            self._conexion.execute(f"DELETE FROM {self._tabla} WHERE _id = ?", (self._id_de_fila(fila),))
+
+    def actualizar(self, fila, datos):
+        valores = (registro_a_fila(datos) + [""] * len(self.encabezados))[:len(self.encabezados)]
+        asignaciones = ", ".join(f"{self._citar(c)} = ?" for c in self.encabezados)
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                f"UPDATE {self._tabla} SET {asignaciones} WHERE _id = ?",
+                (*valores, self._id_de_fila(fila))
+            )
+
+    def buscar(self, campo, valor):
+        with self._lock:
+            cursor = self._conexion.execute(
+                f"SELECT (SELECT COUNT(*) FROM {self._tabla} AS t WHERE t._id <= m._id), {self._columnas} "
+                f"FROM {self._tabla} AS m WHERE {self._citar(campo)} = ? ORDER BY m._id",
+                (str(valor),)
+            )
+            return [
+                (posicion + PRIMERA_FILA_DATOS - 1, fila_a_registro(self.encabezados, valores))
+                for posicion, *valores in cursor
+            ]
+
+    def leer_columnas(self, campos):
+        seleccion = ", ".join(self._citar(c) for c in campos)
+        with self._lock:
+            filas = self._conexion.execute(f"SELECT {seleccion} FROM {self._tabla} ORDER BY _id").fetchall()
+        return [[numerizar(fila[i]) for fila in filas] for i in range(len(campos))]
+
+    def leer_rango(self, fila_inicio, fila_fin):
+        if fila_fin < fila_inicio:
+            return []
+        with self._lock:
+            cursor = self._conexion.execute(
+                f"SELECT {self._columnas} FROM {self._tabla} ORDER BY _id LIMIT ? OFFSET ?",
+                (fila_fin - fila_inicio + 1, fila_inicio - PRIMERA_FILA_DATOS)
+            )
+            return [fila_a_registro(self.encabezados, valores) for valores in cursor]
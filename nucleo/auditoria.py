@@ -0,0 +1,191 @@
+"""Auditoría de calidad de datos sobre hojas completas.
+
+`validar_fecha` solo protege las capturas nuevas; la hoja ya tiene fechas en
+varios formatos y primas que no son números. La auditoría aplica todas las
+reglas de campo a todas las filas en una pasada vectorizada y devuelve un
+hallazgo por problema encontrado.
+
+`AuditorHoja` recuerda las filas ya revisadas por su hash de contenido: en las
+siguientes corridas solo se evalúan las filas nuevas o modificadas y el resto
+reutiliza sus hallazgos, aunque la fila haya cambiado de posición.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from nucleo.fechas import COLUMNAS_FECHA, FORMATOS_FECHA, parsear_fechas
+from nucleo.validacion import (
+    AÑO_MINIMO_NACIMIENTO, como_texto, errores_email, errores_importe, errores_telefono
+)
+
+SEVERIDAD_ERROR = "Error"
+SEVERIDAD_ADVERTENCIA = "Advertencia"
+
+FECHAS_NACIMIENTO = ["FECHA DE NAC CONTRATANTE", "FECHA DE NAC ASEGURADO"]
+# Columnas que identifican la fila en el reporte
+COLUMNAS_IDENTIFICACION = ["No. POLIZA", "CONTRATANTE"]
+COLUMNAS_AUDITADAS = COLUMNAS_FECHA + ["EMAIL", "TELEFONO", "PRIMA ANUAL"]
+
+COLUMNAS_HALLAZGOS = ["Fila", "No. POLIZA", "CONTRATANTE", "Campo", "Severidad", "Problema", "Valor"]
+
+
+def tabla_de_texto(registros, columnas):
+    """DataFrame de textos (sin espacios en los extremos) con las columnas pedidas"""
+    return pd.DataFrame(
+        {columna: como_texto([registro.get(columna, "") for registro in registros]) for columna in columnas},
+        index=pd.RangeIndex(len(registros))
+    )
+
+
+# ============================================================
+# REGLAS
+# ============================================================
+def _lecturas_fecha(texto):
+    """Interpretación de cada celda con cada formato conocido (NaT donde no aplica)"""
+    return {formato: pd.to_datetime(texto, format=formato, errors="coerce") for formato in FORMATOS_FECHA}
+
+
+def _solo_mes_dia(lecturas):
+    """Celdas que solo se pueden leer como mm/dd/yyyy"""
+    return (lecturas["%m/%d/%Y"].notna() & lecturas["%d/%m/%Y"].isna()).to_numpy()
+
+
+def _reglas_fecha(texto, lecturas, fila_mes_dia, es_nacimiento, anio_actual):
+    """(severidades, mensajes) de una columna de fecha con formatos mixtos.
+
+    `fila_mes_dia` marca las filas con alguna fecha que solo admite mm/dd/yyyy:
+    en ellas una fecha que admite ambas lecturas es ambigua. En el resto se
+    asume el formato de captura dd/mm/yyyy, que es como la lee la app.
+    """
+    con_valor = (texto != "").to_numpy()
+    reconocida = np.logical_or.reduce([fechas.notna().to_numpy() for fechas in lecturas.values()])
+    dia_mes, mes_dia = lecturas["%d/%m/%Y"], lecturas["%m/%d/%Y"]
+    dos_lecturas = (dia_mes.notna() & mes_dia.notna() & (dia_mes != mes_dia)).to_numpy()
+
+    condiciones = [con_valor & ~reconocida]
+    severidades = [SEVERIDAD_ERROR]
+    mensajes = ["Fecha no reconocida en ningún formato"]
+    if es_nacimiento:
+        anios = parsear_fechas(texto).dt.year.to_numpy(dtype=float)
+        condiciones.append((anios < AÑO_MINIMO_NACIMIENTO) | (anios > anio_actual))
+        severidades.append(SEVERIDAD_ERROR)
+        mensajes.append(f"Año fuera de rango válido ({AÑO_MINIMO_NACIMIENTO}-{anio_actual})")
+    condiciones += [dos_lecturas & fila_mes_dia, _solo_mes_dia(lecturas)]
+    severidades += [SEVERIDAD_ADVERTENCIA, SEVERIDAD_ADVERTENCIA]
+    mensajes += [
+        "Fecha ambigua: la fila tiene fechas en mm/dd/yyyy y esta se lee como dd/mm/yyyy",
+        "Fecha en formato mm/dd/yyyy",
+    ]
+    return np.select(condiciones, severidades, default=""), np.select(condiciones, mensajes, default="")
+
+
+def _reglas_vigencia(tabla):
+    inicio = parsear_fechas(tabla["INICIO DE VIGENCIA"])
+    fin = parsear_fechas(tabla["FIN DE VIGENCIA"])
+    imposible = (fin <= inicio).to_numpy()
+    mensajes = np.where(
+        imposible,
+        np.char.add("El fin de vigencia no es posterior al inicio: ",
+                    np.asarray(tabla["INICIO DE VIGENCIA"], dtype=str)),
+        ""
+    )
+    return np.where(imposible, SEVERIDAD_ERROR, ""), mensajes
+
+
+def auditar_tabla(tabla, anio_actual=None):
+    """Aplica todas las reglas a una tabla de textos; devuelve un hallazgo por fila y problema.
+
+    La columna "posicion" es la posición de la fila en `tabla`.
+    """
+    anio_actual = anio_actual or pd.Timestamp.now().year
+    resultados = []
+    lecturas = {campo: _lecturas_fecha(tabla[campo]) for campo in COLUMNAS_FECHA}
+    fila_mes_dia = np.logical_or.reduce([_solo_mes_dia(lecturas[campo]) for campo in COLUMNAS_FECHA])
+    for campo in COLUMNAS_FECHA:
+        resultados.append((campo, *_reglas_fecha(
+            tabla[campo], lecturas[campo], fila_mes_dia, campo in FECHAS_NACIMIENTO, anio_actual
+        )))
+    resultados.append(("FIN DE VIGENCIA", *_reglas_vigencia(tabla)))
+    for campo, regla in (("EMAIL", errores_email), ("TELEFONO", errores_telefono), ("PRIMA ANUAL", errores_importe)):
+        mensajes = regla(tabla[campo]).to_numpy(dtype=str)
+        resultados.append((campo, np.where(mensajes != "", SEVERIDAD_ERROR, ""), mensajes))
+
+    partes = []
+    for campo, severidades, mensajes in resultados:
+        posiciones = np.flatnonzero(np.asarray(mensajes) != "")
+        if len(posiciones):
+            partes.append(pd.DataFrame({
+                "posicion": posiciones,
+                "Campo": campo,
+                "Severidad": np.asarray(severidades)[posiciones],
+                "Problema": np.asarray(mensajes)[posiciones],
+                "Valor": tabla[campo].to_numpy(dtype=str)[posiciones],
+            }))
+    if not partes:
+        return pd.DataFrame(columns=["posicion", "Campo", "Severidad", "Problema", "Valor"])
+    return pd.concat(partes, ignore_index=True)
+
+
+# ============================================================
+# AUDITORÍA INCREMENTAL
+# ============================================================
+class AuditorHoja:
+    """Audita una hoja y recuerda los hallazgos por hash de fila entre corridas"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.estadisticas = {"corridas": 0, "filas": 0, "revisadas": 0, "reutilizadas": 0}
+        self._hashes = np.array([], dtype=np.uint64)
+        self._hallazgos = pd.DataFrame(columns=["hash", "Campo", "Severidad", "Problema", "Valor"])
+        self._anio = None
+        self._lock = threading.Lock()
+
+    def auditar(self, registros, anio_actual=None):
+        """Hallazgos de todas las filas; solo se evalúan las que no se habían revisado.
+
+        "Fila" es el número de fila en la hoja (los datos empiezan en la fila 2).
+        """
+        anio_actual = anio_actual or pd.Timestamp.now().year
+        tabla = tabla_de_texto(registros, COLUMNAS_IDENTIFICACION + COLUMNAS_AUDITADAS)
+        hashes = pd.util.hash_pandas_object(tabla, index=False).to_numpy()
+        with self._lock:
+            if anio_actual != self._anio:
+                # El rango de años de nacimiento cambia con el año: se revisa todo de nuevo
+                self._hashes = np.array([], dtype=np.uint64)
+                self._hallazgos = self._hallazgos.iloc[0:0]
+                self._anio = anio_actual
+
+            nuevas = ~np.isin(hashes, self._hashes)
+            posiciones_nuevas = np.flatnonzero(nuevas)
+            hallazgos_nuevos = auditar_tabla(tabla.iloc[posiciones_nuevas].reset_index(drop=True), anio_actual)
+            hallazgos_nuevos.insert(0, "hash", hashes[posiciones_nuevas][hallazgos_nuevos.pop("posicion").to_numpy(dtype=int)])
+            # Filas idénticas comparten hash: se guardan una sola vez
+            hallazgos_nuevos = hallazgos_nuevos.drop_duplicates()
+
+            # Solo se conservan las filas que siguen en la hoja
+            self._hashes = np.unique(hashes)
+            vigentes = self._hallazgos[self._hallazgos["hash"].isin(self._hashes)]
+            self._hallazgos = pd.concat([vigentes, hallazgos_nuevos], ignore_index=True) if len(vigentes) else hallazgos_nuevos
+            self.estadisticas["corridas"] += 1
+            self.estadisticas["filas"] = len(registros)
+            self.estadisticas["revisadas"] += len(posiciones_nuevas)
+            self.estadisticas["reutilizadas"] += len(registros) - len(posiciones_nuevas)
+            hallazgos = self._hallazgos
+
+        filas = pd.DataFrame({
+            "hash": hashes,
+            "Fila": np.arange(len(tabla)) + 2,
+            "No. POLIZA": tabla["No. POLIZA"],
+            "CONTRATANTE": tabla["CONTRATANTE"],
+        })
+        resultado = filas.merge(hallazgos, on="hash", how="inner").sort_values("Fila", kind="stable")
+        return resultado[COLUMNAS_HALLAZGOS].reset_index(drop=True)
+
+
+def resumir_hallazgos(hallazgos):
+    """Cantidad de hallazgos por campo, severidad y problema"""
+    return (
+        hallazgos.groupby(["Campo", "Severidad", "Problema"], sort=True).size()
+        .rename("Filas").reset_index().sort_values("Filas", ascending=False, kind="stable")
+    )
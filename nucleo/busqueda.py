@@ -0,0 +1,268 @@
+"""Búsqueda de clientes mientras se escribe, por prefijos y trigramas.
+
+Los nombres de contratantes y asegurados se normalizan (sin acentos ni
+mayúsculas, solo letras, dígitos y espacios) y se indexan por sus trigramas en
+un arreglo CSR de numpy: trigrama -> ids de nombre. Una consulta cuenta con un
+solo `bincount` cuántos trigramas comparte con cada nombre, y de ahí salen
+tanto las coincidencias por prefijo de palabra como las aproximadas
+(coeficiente de Dice), sin recorrer los nombres uno por uno.
+
+También se busca por clave exacta o por prefijo: No. Cliente, No. POLIZA,
+teléfono y email. El índice se construye una vez por versión de datos.
+"""
+import collections
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+ALFABETO = " abcdefghijklmnopqrstuvwxyz0123456789"
+# Código de las posiciones fuera del nombre (relleno de numpy)
+_FUERA = len(ALFABETO)
+_BASE = len(ALFABETO) + 1
+_LETRAS = np.full(128, _FUERA, dtype=np.int32)
+_LETRAS[[ord(letra) for letra in ALFABETO]] = np.arange(len(ALFABETO), dtype=np.int32)
+
+# Los nombres más largos se indexan solo por su comienzo
+LARGO_MAXIMO = 60
+# Fracción mínima de los trigramas de la consulta que debe tener un nombre aproximado
+UMBRAL_APROXIMADO = 0.5
+# Candidatos por prefijo que se confirman palabra por palabra (los de más trigramas en común)
+MAXIMO_CONFIRMACIONES = 500
+# Dígitos mínimos para buscar teléfonos por prefijo o terminación
+DIGITOS_MINIMOS_TELEFONO = 4
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar_texto(texto):
+    """Texto sin acentos, en minúsculas y con solo letras, dígitos y un espacio entre palabras"""
+    texto = unicodedata.normalize("NFKD", "" if texto is None else str(texto))
+    texto = texto.encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(_NO_ALFANUMERICO.sub(" ", texto).split())
+
+
+def normalizar_serie(serie):
+    """`normalizar_texto` para una columna completa, normalizando una vez cada valor distinto"""
+    codigos, unicos = pd.factorize(pd.Series(serie, dtype=object).fillna("").astype(str))
+    normalizados = np.array([normalizar_texto(valor) for valor in unicos] + [""], dtype=object)
+    return normalizados[codigos]
+
+
+def solo_digitos(serie):
+    """Dígitos de cada valor (teléfonos capturados con espacios, guiones o lada)"""
+    return pd.Series(serie, dtype=object).fillna("").astype(str).str.replace(r"\D", "", regex=True).to_numpy(dtype=object)
+
+
+def codigos_trigramas(textos):
+    """Matriz (n, ancho) con el código de cada trigrama de ' texto ', o -1 fuera del texto"""
+    ancho = max((len(texto) for texto in textos), default=0)
+    ancho = min(ancho, LARGO_MAXIMO) + 2
+    rellenos = np.array([f" {texto[:LARGO_MAXIMO]} " for texto in textos], dtype=f"<U{ancho}")
+    letras = _LETRAS[np.minimum(rellenos.view(np.uint32).reshape(len(textos), ancho), 127)]
+    primera, segunda, tercera = letras[:, :-2], letras[:, 1:-1], letras[:, 2:]
+    codigos = (primera * _BASE + segunda) * _BASE + tercera
+    codigos[(primera == _FUERA) | (segunda == _FUERA) | (tercera == _FUERA)] = -1
+    return codigos
+
+
+class _Agrupacion:
+    """Filas agrupadas por valor: valores ordenados y, para cada uno, sus filas (CSR)"""
+
+    def __init__(self, valores):
+        valores = np.asarray(valores, dtype=object)
+        presentes = np.flatnonzero(valores != "")
+        self.valores, inversos = np.unique(valores[presentes].astype(str), return_inverse=True)
+        orden = np.argsort(inversos, kind="stable")
+        self._filas = presentes[orden]
+        self._inicios = np.searchsorted(inversos[orden], np.arange(len(self.valores) + 1))
+
+    def filas(self, posicion):
+        return self._filas[self._inicios[posicion]:self._inicios[posicion + 1]]
+
+    def exacto(self, valor):
+        posicion = np.searchsorted(self.valores, valor)
+        if posicion < len(self.valores) and self.valores[posicion] == valor:
+            return self.filas(posicion)
+        return self._filas[:0]
+
+    def con_prefijo(self, prefijo, maximo_valores=50):
+        """Filas de los primeros `maximo_valores` valores que empiezan con `prefijo`"""
+        inicio = np.searchsorted(self.valores, prefijo)
+        fin = min(np.searchsorted(self.valores, prefijo + "\uffff"), inicio + maximo_valores)
+        return self._filas[self._inicios[inicio]:self._inicios[fin]]
+
+
+class Coincidencia:
+    """Un cliente sugerido: sus variantes de nombre, IDs, pólizas y por qué coincidió"""
+
+    def __init__(self, nombre, contratantes, ids_cliente, polizas, puntaje, motivo):
+        self.nombre = nombre
+        self.contratantes = contratantes
+        self.ids_cliente = ids_cliente
+        self.polizas = polizas
+        self.puntaje = puntaje
+        self.motivo = motivo
+
+    @property
+    def etiqueta(self):
+        ids = ", ".join(self.ids_cliente) or "sin No. Cliente"
+        texto = f"{self.nombre} · No. Cliente {ids} · {self.polizas} póliza(s)"
+        return f"{texto} · {self.motivo}" if self.motivo else texto
+
+    def __repr__(self):
+        return f"Coincidencia({self.nombre!r}, puntaje={self.puntaje:.2f}, motivo={self.motivo!r})"
+
+
+# ============================================================
+# ÍNDICE DE CLIENTES
+# ============================================================
+class IndiceClientes:
+    """Índice de búsqueda de clientes sobre la tabla tipada de una versión de datos"""
+
+    def __init__(self, tabla, version=None):
+        self.version = version
+        self._contratantes = tabla["CONTRATANTE"].to_numpy(dtype=object)
+        self._ids = tabla["No. Cliente"].to_numpy(dtype=object)
+        # Un cliente es un contratante normalizado: agrupa sus variantes de captura
+        self._clientes = normalizar_serie(tabla["CONTRATANTE"])
+        asegurados = normalizar_serie(tabla["ASEGURADO"])
+        self._asegurados = asegurados
+
+        self._por_contratante = _Agrupacion(self._clientes)
+        self._por_asegurado = _Agrupacion(asegurados)
+        self._por_cliente = _Agrupacion(pd.Series(self._ids).astype(str).str.strip().to_numpy(dtype=object))
+        self._por_poliza = _Agrupacion(tabla["No. POLIZA"].astype(str).str.strip().str.upper().to_numpy(dtype=object))
+        self._por_email = _Agrupacion(tabla["EMAIL"].astype(str).str.strip().str.lower().to_numpy(dtype=object))
+        telefonos = solo_digitos(tabla["TELEFONO"])
+        self._por_telefono = _Agrupacion(telefonos)
+        # Las terminaciones permiten encontrar un número capturado con o sin lada
+        self._por_telefono_invertido = _Agrupacion(np.array([t[::-1] for t in telefonos], dtype=object))
+
+        self.nombres = np.union1d(self._por_contratante.valores, self._por_asegurado.valores)
+        self._indexar_trigramas()
+
+    @property
+    def total_clientes(self):
+        return len(self._por_contratante.valores)
+
+    def _indexar_trigramas(self, tam_bloque=50_000):
+        # Por bloques para no tener la matriz de todos los nombres en memoria a la vez
+        cuentas, ids, codigos = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int32)], [np.zeros(0, dtype=np.int32)]
+        for inicio in range(0, len(self.nombres), tam_bloque):
+            bloque = codigos_trigramas(list(self.nombres[inicio:inicio + tam_bloque]))
+            validos = bloque >= 0
+            cuentas.append(validos.sum(axis=1))
+            ids.append((np.nonzero(validos)[0] + inicio).astype(np.int32))
+            codigos.append(bloque[validos])
+        self._trigramas_por_nombre = np.concatenate(cuentas)
+        ids, codigos = np.concatenate(ids), np.concatenate(codigos)
+        orden = np.argsort(codigos, kind="stable")
+        self._postings = ids[orden]
+        self._inicios = np.searchsorted(codigos[orden], np.arange(_BASE ** 3 + 1))
+
+    def _contar(self, codigos):
+        """Trigramas de `codigos` (sin repetir) que contiene cada nombre"""
+        codigos = np.unique(codigos[codigos >= 0])
+        if len(codigos) == 0:
+            return np.zeros(len(self.nombres), dtype=np.int64), 0
+        tramos = [self._postings[self._inicios[c]:self._inicios[c + 1]] for c in codigos]
+        return np.bincount(np.concatenate(tramos), minlength=len(self.nombres)), len(codigos)
+
+    def _puntajes_nombres(self, consulta):
+        """Puntaje de cada nombre: 1 igual, 0.7-1 prefijos de todas las palabras, menos de 0.7 aproximado"""
+        comunes, total = self._contar(codigos_trigramas([consulta])[0])
+        if total == 0:
+            return np.zeros(len(self.nombres))
+        # Cobertura: cuánto de lo escrito está en el nombre (no castiga los nombres largos);
+        # Dice desempata a favor de los nombres más parecidos en longitud
+        cobertura = comunes / total
+        dice = 2 * comunes / (total + self._trigramas_por_nombre)
+        puntajes = np.where(cobertura >= UMBRAL_APROXIMADO, 0.7 * (0.8 * cobertura + 0.2 * dice), 0.0)
+
+        # Prefijo de palabra: el nombre tiene todos los trigramas de ' palabra' para cada palabra
+        prefijo = np.ones(len(self.nombres), dtype=bool)
+        restringido = False
+        for palabra in consulta.split():
+            codigos = codigos_trigramas([palabra])[0][:-1]
+            if len(codigos) == 0:
+                continue
+            cuenta, requeridos = self._contar(codigos)
+            prefijo &= cuenta == requeridos
+            restringido = True
+        if restringido:
+            candidatos = np.flatnonzero(prefijo)
+            if len(candidatos) > MAXIMO_CONFIRMACIONES:
+                candidatos = candidatos[np.argpartition(-dice[candidatos], MAXIMO_CONFIRMACIONES)[:MAXIMO_CONFIRMACIONES]]
+            # Los trigramas no garantizan el orden: se confirma sobre los candidatos
+            confirmados = [i for i in candidatos if _palabras_con_prefijo(self.nombres[i], consulta)]
+            puntajes[confirmados] = np.maximum(puntajes[confirmados], 0.7 + 0.3 * dice[confirmados])
+
+        # Nombres que empiezan con lo escrito (cubre las consultas de una letra, que no tienen trigramas)
+        inicio, fin = np.searchsorted(self.nombres, [consulta, consulta + "~"])
+        puntajes[inicio:fin] = np.maximum(puntajes[inicio:fin], 0.7 + 0.3 * dice[inicio:fin])
+        if inicio < len(self.nombres) and self.nombres[inicio] == consulta:
+            puntajes[inicio] = 1.0
+        return puntajes
+
+    def buscar(self, consulta, limite=10):
+        """Los `limite` clientes que mejor coinciden con lo escrito, del mejor al peor"""
+        normalizada = normalizar_texto(consulta)
+        if not normalizada:
+            return []
+        mejores = {}
+
+        def sumar(filas, puntaje, motivo):
+            for cliente in set(self._clientes[filas]):
+                if cliente and puntaje > mejores.get(cliente, (0.0, ""))[0]:
+                    mejores[cliente] = (puntaje, motivo)
+
+        # Claves: No. Cliente, póliza, teléfono y email
+        texto = str(consulta).strip()
+        sumar(self._por_cliente.exacto(texto), 1.0, "No. Cliente")
+        sumar(self._por_poliza.exacto(texto.upper()), 1.0, "No. POLIZA")
+        if len(texto) >= 3:
+            sumar(self._por_poliza.con_prefijo(texto.upper()), 0.9, "No. POLIZA")
+        if "@" in texto:
+            sumar(self._por_email.exacto(texto.lower()), 1.0, "email")
+            sumar(self._por_email.con_prefijo(texto.lower()), 0.9, "email")
+        digitos = re.sub(r"\D", "", texto)
+        if len(digitos) >= DIGITOS_MINIMOS_TELEFONO and re.fullmatch(r"[\d\s()+\-.]+", texto):
+            sumar(self._por_telefono.exacto(digitos), 1.0, "teléfono")
+            sumar(self._por_telefono.con_prefijo(digitos), 0.9, "teléfono")
+            sumar(self._por_telefono_invertido.con_prefijo(digitos[::-1]), 0.9, "teléfono")
+
+        # Nombres: solo se resuelven los mejores candidatos
+        puntajes = self._puntajes_nombres(normalizada)
+        candidatos = np.flatnonzero(puntajes > 0)
+        if len(candidatos) > limite * 3:
+            candidatos = candidatos[np.argpartition(-puntajes[candidatos], limite * 3)[:limite * 3]]
+        for i in candidatos:
+            nombre = self.nombres[i]
+            sumar(self._por_contratante.exacto(nombre), puntajes[i], "")
+            # Como asegurado pesa un poco menos que como contratante
+            sumar(self._por_asegurado.exacto(nombre)[:limite], puntajes[i] * 0.95, f"asegurado: {nombre}")
+
+        ordenados = sorted(mejores.items(), key=lambda par: (-par[1][0], par[0]))[:limite]
+        return [self._coincidencia(cliente, puntaje, motivo) for cliente, (puntaje, motivo) in ordenados]
+
+    def _coincidencia(self, cliente, puntaje, motivo):
+        filas = self._por_contratante.exacto(cliente)
+        # La variante más capturada da el nombre; todas sirven para traer sus pólizas
+        variantes = [nombre for nombre, _ in collections.Counter(map(str, self._contratantes[filas])).most_common()]
+        ids = dict.fromkeys(str(i).strip() for i in self._ids[filas])
+        return Coincidencia(
+            nombre=variantes[0],
+            contratantes=variantes,
+            ids_cliente=[i for i in ids if i],
+            polizas=len(filas),
+            puntaje=float(puntaje),
+            motivo=motivo,
+        )
+
+
+def _palabras_con_prefijo(nombre, consulta):
+    """Cada palabra de la consulta es el comienzo de alguna palabra del nombre"""
+    palabras = nombre.split()
+    return all(any(p.startswith(buscada) for p in palabras) for buscada in consulta.split())
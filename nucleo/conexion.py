@@ -0,0 +1,124 @@
+"""Conexión a Google Sheets y hojas de trabajo compartidas por el proceso.
+
+Streamlit vuelve a ejecutar el script completo en cada interacción. Para que
+eso no cueste llamadas a la API, `ConexionSheets` autoriza el cliente y abre el
+libro una sola vez, y guarda cada hoja de trabajo con sus encabezados la
+primera vez que se pide: los reruns siguientes no hacen llamadas de metadatos.
+
+Que la hoja exista solo se vuelve a comprobar si una llamada falla porque la
+hoja ya no está (se borró o se renombró): la conexión vuelve a abrir el libro,
+busca la hoja por título (creándola si hace falta) y reintenta la llamada una vez.
+"""
+import re
+import threading
+
+from nucleo.cuota import ESCRITURA, LECTURA, METODOS_ESCRITURA, codigo_http
+
+# Errores de la API cuando el rango o el id de la hoja ya no existen
+_HOJA_INVALIDA = re.compile(r"Unable to parse range|No grid with id|Requested entity was not found", re.IGNORECASE)
+
+
+def es_hoja_invalida(error):
+    """Indica si el error se debe a que la hoja de trabajo ya no existe con ese título o id"""
+    codigo = codigo_http(error)
+    return codigo == 404 or (codigo == 400 and _HOJA_INVALIDA.search(str(error)) is not None)
+
+
+class ConexionSheets:
+    """Cliente, libro y hojas de trabajo de Google Sheets, resueltos una vez por proceso.
+
+    `autorizar` es una función sin argumentos que devuelve el cliente de
+    gspread; se llama recién cuando se pide la primera hoja. Las llamadas de
+    metadatos (abrir el libro, buscar o crear hojas) pasan por `cliente_cuota`.
+    """
+
+    def __init__(self, autorizar, nombre_libro, cliente_cuota):
+        self.nombre_libro = nombre_libro
+        self.cliente_cuota = cliente_cuota
+        self.estadisticas = {"autorizaciones": 0, "aperturas": 0, "resoluciones": 0, "revalidaciones": 0}
+        self._autorizar = autorizar
+        self._cliente = None
+        self._libro = None
+        self._hojas = {}
+        self._lock = threading.RLock()
+
+    def libro(self):
+        """Spreadsheet de gspread, autorizando y abriendo el libro la primera vez"""
+        with self._lock:
+            if self._libro is None:
+                if self._cliente is None:
+                    self._cliente = self._autorizar()
+                    self.estadisticas["autorizaciones"] += 1
+                self._libro = self.cliente_cuota.ejecutar(LECTURA, self._cliente.open, self.nombre_libro)
+                self.estadisticas["aperturas"] += 1
+            return self._libro
+
+    def hoja(self, titulo, encabezados):
+        """Hoja de trabajo compartida; solo la primera vez consulta (o crea) la hoja en la API"""
+        with self._lock:
+            if titulo not in self._hojas:
+                hoja = HojaConectada(self, titulo, encabezados)
+                hoja.worksheet = self._resolver(titulo, encabezados)
+                self._hojas[titulo] = hoja
+            return self._hojas[titulo]
+
+    def _resolver(self, titulo, encabezados):
+        """Busca la hoja por título y, si no existe, la crea con sus encabezados"""
+        import gspread
+
+        libro = self.libro()
+        self.estadisticas["resoluciones"] += 1
+        try:
+            return self.cliente_cuota.ejecutar(LECTURA, libro.worksheet, titulo)
+        except gspread.WorksheetNotFound:
+            worksheet = self.cliente_cuota.ejecutar(
+                ESCRITURA, libro.add_worksheet, title=titulo, rows="1000", cols=str(len(encabezados))
+            )
+            self.cliente_cuota.ejecutar(ESCRITURA, worksheet.append_row, list(encabezados))
+            return worksheet
+
+    def revalidar(self, hoja, generacion):
+        """Vuelve a abrir el libro y resolver la hoja tras un fallo (una vez por generación)"""
+        with self._lock:
+            if hoja.generacion != generacion:
+                # Otro hilo ya la revalidó después del fallo
+                return
+            self._libro = None
+            hoja.worksheet = self._resolver(hoja.title, hoja.encabezados)
+            hoja.generacion += 1
+            self.estadisticas["revalidaciones"] += 1
+
+    def descartar(self):
+        """Olvida libro y hojas (no el cliente): se vuelven a resolver al pedirlos"""
+        with self._lock:
+            self._libro = None
+            self._hojas.clear()
+
+
+class HojaConectada:
+    """Hoja de trabajo cuyos métodos pasan por el cliente de cuota y sobreviven a una revalidación"""
+
+    def __init__(self, conexion, titulo, encabezados):
+        self.conexion = conexion
+        self.title = titulo
+        self.encabezados = list(encabezados)
+        self.worksheet = None
+        self.generacion = 0
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self.worksheet, nombre)
+        if not callable(atributo):
+            return atributo
+        tipo = ESCRITURA if nombre in METODOS_ESCRITURA else LECTURA
+
+        def llamada(*args, **kwargs):
+            generacion = self.generacion
+            try:
+                return self.conexion.cliente_cuota.ejecutar(tipo, getattr(self.worksheet, nombre), *args, **kwargs)
+            except Exception as error:
+                if not es_hoja_invalida(error):
+                    raise
+            # La hoja cambió por fuera de la app: se resuelve de nuevo y se reintenta una vez
+            self.conexion.revalidar(self, generacion)
+            return self.conexion.cliente_cuota.ejecutar(tipo, getattr(self.worksheet, nombre), *args, **kwargs)
+        return llamada
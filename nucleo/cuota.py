@@ -0,0 +1,259 @@
+"""Cliente de Google Sheets con presupuesto de cuota, reintentos y prioridades.
+
+Todas las llamadas a la API pasan por un `ClienteSheets` compartido por el
+proceso (y por lo tanto por todas las sesiones):
+
+- Lecturas y escrituras tienen cada una un cubo de tokens con su presupuesto
+  por minuto. Una llamada espera su token en lugar de salir y recibir un 429.
+- Los tokens se conceden por prioridad: primero las escrituras del usuario,
+  luego sus lecturas y al final las sincronizaciones de fondo, que además
+  ceden el paso mientras haya llamadas del usuario en curso.
+- Un 429 pausa el cubo completo (todas las sesiones esperan) durante lo que
+  indique Retry-After o, si no viene, una espera exponencial con jitter. Los
+  errores 5xx de las lecturas se reintentan igual, pero sin pausar a los demás.
+  Una escritura con 5xx no se reintenta: la API pudo haberla aplicado, y repetir
+  un `append_rows` o un `delete_rows` duplicaría filas o borraría otra.
+"""
+import contextlib
+import email.utils
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+LECTURA = "lectura"
+ESCRITURA = "escritura"
+
+PRIORIDAD_ESCRITURA = 0
+PRIORIDAD_LECTURA = 1
+PRIORIDAD_FONDO = 2
+
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Las escrituras no son idempotentes: solo un 429 garantiza que no se aplicaron
+CODIGOS_REINTENTABLES_ESCRITURA = {429}
+
+# Métodos de gspread.Worksheet que modifican la hoja; el resto cuenta como lectura
+METODOS_ESCRITURA = {
+    "append_row", "append_rows", "insert_row", "insert_rows", "update", "update_cell",
+    "update_cells", "batch_update", "delete_rows", "delete_columns", "clear", "resize",
+}
+
+_contexto = threading.local()
+
+
+# ============================================================
+# CLASIFICACIÓN DE ERRORES
+# ============================================================
+def codigo_http(error):
+    """Código HTTP de un error de la API, o None si no viene de una respuesta"""
+    respuesta = getattr(error, "response", None)
+    codigo = getattr(respuesta, "status_code", None) or getattr(error, "code", None)
+    if isinstance(codigo, int):
+        return codigo
+    coincidencia = re.search(r"\b(429|50[0234])\b", str(error))
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+def es_limite_cuota(error):
+    """Indica si una excepción corresponde a un límite de cuota de la API"""
+    return codigo_http(error) == 429
+
+
+def es_reintentable(error, tipo=LECTURA):
+    codigos = CODIGOS_REINTENTABLES_ESCRITURA if tipo == ESCRITURA else CODIGOS_REINTENTABLES
+    return codigo_http(error) in codigos
+
+
+def segundos_retry_after(error, ahora=None):
+    """Segundos que pide esperar el encabezado Retry-After (número o fecha HTTP), o None"""
+    respuesta = getattr(error, "response", None)
+    valor = getattr(respuesta, "headers", None) or {}
+    valor = valor.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = email.utils.parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    ahora = ahora or datetime.now(timezone.utc)
+    return max(0.0, (fecha - ahora).total_seconds())
+
+
+@contextlib.contextmanager
+def prioridad_de_fondo():
+    """Las llamadas hechas dentro del bloque (en este hilo) usan la prioridad más baja"""
+    anterior = getattr(_contexto, "fondo", False)
+    _contexto.fondo = True
+    try:
+        yield
+    finally:
+        _contexto.fondo = anterior
+
+
+# ============================================================
+# CUBO DE TOKENS
+# ============================================================
+class CuboTokens:
+    """Presupuesto de llamadas por minuto compartido por todos los hilos del proceso.
+
+    Admite una ráfaga de `rafaga` llamadas y se rellena a un ritmo tal que
+    ninguna ventana de un minuto supera `por_minuto`. Quien espera recibe el
+    token en orden de prioridad y, a igual prioridad, de llegada.
+    """
+
+    def __init__(self, por_minuto, rafaga=None):
+        self.por_minuto = por_minuto
+        self.capacidad = rafaga or max(1, por_minuto // 6)
+        self.tasa = max(1, por_minuto - self.capacidad) / 60.0
+        self.estadisticas = {"concedidos": 0, "esperas": 0, "segundos_espera": 0.0, "pausas": 0}
+        self._tokens = float(self.capacidad)
+        self._actualizado = time.monotonic()
+        self._no_antes_de = 0.0
+        self._turnos = []
+        self._orden = itertools.count()
+        self._cond = threading.Condition()
+
+    def _rellenar(self, ahora):
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._actualizado) * self.tasa)
+        self._actualizado = ahora
+
+    def _segundos_para_token(self, ahora):
+        return max(self._no_antes_de - ahora, (1 - self._tokens) / self.tasa, 0.0)
+
+    def tomar(self, prioridad=PRIORIDAD_LECTURA):
+        """Espera un token respetando la prioridad; devuelve los segundos esperados"""
+        inicio = time.monotonic()
+        turno = (prioridad, next(self._orden))
+        with self._cond:
+            heapq.heappush(self._turnos, turno)
+            try:
+                while True:
+                    ahora = time.monotonic()
+                    self._rellenar(ahora)
+                    espera = self._segundos_para_token(ahora)
+                    if self._turnos[0] == turno and espera <= 0:
+                        break
+                    # Los que no están al frente se despiertan cuando el primero toma su token
+                    self._cond.wait(max(espera, 0.01) if self._turnos[0] == turno else None)
+            except BaseException:
+                self._turnos.remove(turno)
+                heapq.heapify(self._turnos)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._turnos)
+            self._tokens -= 1
+            esperado = time.monotonic() - inicio
+            self.estadisticas["concedidos"] += 1
+            if esperado > 0.01:
+                self.estadisticas["esperas"] += 1
+                self.estadisticas["segundos_espera"] += esperado
+            self._cond.notify_all()
+        return esperado
+
+    def pausar(self, segundos):
+        """Nadie recibe tokens durante `segundos` (por ejemplo, tras un 429)"""
+        with self._cond:
+            self._no_antes_de = max(self._no_antes_de, time.monotonic() + segundos)
+            self.estadisticas["pausas"] += 1
+            self._cond.notify_all()
+
+    @property
+    def en_espera(self):
+        return len(self._turnos)
+
+
+# ============================================================
+# CLIENTE
+# ============================================================
+class ClienteSheets:
+    """Punto único por el que pasan todas las llamadas a la API de Google Sheets"""
+
+    def __init__(self, lecturas_por_minuto=60, escrituras_por_minuto=60, max_reintentos=5,
+                 espera_base=1.0, espera_maxima=64.0, espera_maxima_fondo=10.0, metricas=None):
+        self.cubos = {LECTURA: CuboTokens(lecturas_por_minuto), ESCRITURA: CuboTokens(escrituras_por_minuto)}
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.espera_maxima_fondo = espera_maxima_fondo
+        self.metricas = metricas
+        self.estadisticas = {"llamadas": 0, "reintentos": 0, "limites_cuota": 0, "errores": 0}
+        self._usuario_en_curso = 0
+        self._cond = threading.Condition()
+
+    def _prioridad(self, tipo, prioridad):
+        if prioridad is not None:
+            return prioridad
+        if getattr(_contexto, "fondo", False):
+            return PRIORIDAD_FONDO
+        return PRIORIDAD_ESCRITURA if tipo == ESCRITURA else PRIORIDAD_LECTURA
+
+    def espera_reintento(self, error, intento):
+        """Segundos antes del reintento `intento` (desde 0): Retry-After o exponencial con jitter"""
+        retry_after = segundos_retry_after(error)
+        if retry_after is not None:
+            # Un poco de jitter para que las sesiones no reintenten todas a la vez
+            return retry_after + random.uniform(0, self.espera_base)
+        exponencial = min(self.espera_maxima, self.espera_base * 2 ** intento)
+        return random.uniform(exponencial / 2, exponencial)
+
+    @contextlib.contextmanager
+    def _turno_usuario(self, prioridad):
+        if prioridad >= PRIORIDAD_FONDO:
+            # Lo de fondo cede el paso a las llamadas del usuario, con un límite para no quedar sin turno
+            with self._cond:
+                self._cond.wait_for(lambda: self._usuario_en_curso == 0, timeout=self.espera_maxima_fondo)
+            yield
+            return
+        with self._cond:
+            self._usuario_en_curso += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._usuario_en_curso -= 1
+                self._cond.notify_all()
+
+    def ejecutar(self, tipo, funcion, *args, prioridad=None, **kwargs):
+        """Ejecuta `funcion(*args, **kwargs)` dentro del presupuesto de `tipo` (LECTURA o ESCRITURA)"""
+        prioridad = self._prioridad(tipo, prioridad)
+        cubo = self.cubos[tipo]
+        inicio = time.perf_counter()
+        medicion = {"espera_cuota": 0.0, "limites_cuota": 0, "error": None}
+        try:
+            with self._turno_usuario(prioridad):
+                return self._ejecutar_con_reintentos(tipo, cubo, prioridad, medicion, funcion, args, kwargs)
+        finally:
+            if self.metricas is not None:
+                self.metricas.llamada_api(
+                    getattr(funcion, "__name__", "llamada"), tipo, time.perf_counter() - inicio, **medicion
+                )
+
+    def _ejecutar_con_reintentos(self, tipo, cubo, prioridad, medicion, funcion, args, kwargs):
+        intento = 0
+        while True:
+            medicion["espera_cuota"] += cubo.tomar(prioridad)
+            self.estadisticas["llamadas"] += 1
+            try:
+                return funcion(*args, **kwargs)
+            except Exception as error:
+                if not es_reintentable(error, tipo) or intento >= self.max_reintentos:
+                    self.estadisticas["errores"] += 1
+                    medicion["error"] = error
+                    raise
+                espera = self.espera_reintento(error, intento)
+                intento += 1
+                self.estadisticas["reintentos"] += 1
+                if es_limite_cuota(error):
+                    # La cuota es del proyecto: esperan todas las llamadas de este tipo
+                    self.estadisticas["limites_cuota"] += 1
+                    medicion["limites_cuota"] += 1
+                    cubo.pausar(espera)
+                else:
+                    time.sleep(espera)
@@ -0,0 +1,124 @@
+"""Pólizas y clientes duplicados: revisión al capturar y reporte de la hoja completa.
+
+Al capturar, `duplicados_al_insertar` busca el No. POLIZA y la serie del auto
+de la fila nueva en los mapas hash del índice de la versión actual y en las
+filas que siguen en la cola de escritura. Los identificadores se comparan sin
+separadores ni mayúsculas ("abc-123" es "ABC 123"). Qué hacer con un duplicado
+lo decide la política configurada: bloquear, advertir o permitir.
+
+`reporte_duplicados` revisa todas las filas a la vez con operaciones de
+pandas: números de póliza y series repetidos (exactos o casi iguales) y
+clientes capturados con varios No. Cliente (por mayúsculas, acentos o
+espacios) o No. Cliente compartidos por contratantes distintos.
+"""
+import collections
+
+import numpy as np
+import pandas as pd
+
+from nucleo.almacenamiento import PRIMERA_FILA_DATOS
+from nucleo.auditoria import tabla_de_texto
+from nucleo.busqueda import normalizar_serie
+from nucleo.indices import CAMPOS_UNICOS, SEPARADORES_CLAVE, clave_unica, valor_clave
+
+POLITICA_BLOQUEAR = "bloquear"
+POLITICA_ADVERTIR = "advertir"
+POLITICA_PERMITIR = "permitir"
+POLITICAS_DUPLICADOS = (POLITICA_BLOQUEAR, POLITICA_ADVERTIR, POLITICA_PERMITIR)
+
+TIPO_POLIZA_REPETIDA = "No. POLIZA repetido"
+TIPO_POLIZA_PARECIDA = "No. POLIZA casi igual"
+TIPO_SERIE_REPETIDA = "Serie de auto repetida"
+TIPO_CONTRATANTE_VARIOS_IDS = "Contratante con varios No. Cliente"
+TIPO_ID_VARIOS_CONTRATANTES = "No. Cliente con varios contratantes"
+TIPOS_DUPLICADO = (TIPO_POLIZA_REPETIDA, TIPO_POLIZA_PARECIDA, TIPO_SERIE_REPETIDA,
+                   TIPO_CONTRATANTE_VARIOS_IDS, TIPO_ID_VARIOS_CONTRATANTES)
+
+COLUMNAS_IDENTIFICACION = ["No. Cliente", "CONTRATANTE", "No. POLIZA", "No Serie Auto"]
+COLUMNAS_REPORTE = ["Tipo", "Grupo", "Fila"] + COLUMNAS_IDENTIFICACION
+
+Duplicado = collections.namedtuple("Duplicado", "campo valor polizas")
+
+
+# ============================================================
+# REVISIÓN AL CAPTURAR
+# ============================================================
+def duplicados_al_insertar(registro, indices, pendientes=(), campos=CAMPOS_UNICOS):
+    """Campos únicos del registro nuevo que ya usan pólizas activas o en cola.
+
+    `indices` es el IndicesPolizas de la versión actual y `pendientes` los
+    registros que la cola todavía no escribió. Devuelve una lista de
+    Duplicado(campo, valor, pólizas que ya lo tienen).
+    """
+    duplicados = []
+    for campo in campos:
+        clave = clave_unica(registro.get(campo, ""))
+        if not clave:
+            continue
+        polizas = [valor_clave(p.get("No. POLIZA", "")) for p in indices.polizas_con_clave(campo, registro[campo])]
+        polizas += [f"{valor_clave(p.get('No. POLIZA', ''))} (en cola)"
+                    for p in pendientes if clave_unica(p.get(campo, "")) == clave]
+        if polizas:
+            duplicados.append(Duplicado(campo, registro[campo], polizas))
+    return duplicados
+
+
+# ============================================================
+# REPORTE DE LA HOJA COMPLETA
+# ============================================================
+def _claves_unicas(serie):
+    """`clave_unica` para una columna completa de textos, con operaciones de texto vectorizadas"""
+    return serie.str.replace(SEPARADORES_CLAVE, "", regex=True).str.upper()
+
+
+def reporte_duplicados(registros):
+    """Una fila por cada fila de la hoja que pertenece a un grupo de duplicados.
+
+    "Grupo" es la clave compartida (el identificador sin separadores o el
+    nombre normalizado), así que las filas de un mismo grupo quedan juntas.
+    """
+    tabla = tabla_de_texto(registros, COLUMNAS_IDENTIFICACION)
+    poliza = tabla["No. POLIZA"]
+    claves = pd.DataFrame({
+        "poliza": _claves_unicas(poliza),
+        "serie": _claves_unicas(tabla["No Serie Auto"]),
+        "contratante": normalizar_serie(tabla["CONTRATANTE"]),
+        "id": tabla["No. Cliente"],
+    })
+    con_poliza = (claves["poliza"] != "").to_numpy()
+    con_serie = (claves["serie"] != "").to_numpy()
+    con_contratante = (claves["contratante"] != "").to_numpy()
+    con_id = (claves["id"] != "").to_numpy()
+
+    # Cuántas variantes distintas tiene cada grupo, en una agrupación por clave
+    variantes_poliza = poliza.groupby(claves["poliza"]).transform("nunique").to_numpy()
+    ids_por_contratante = claves["id"].where(con_id).groupby(claves["contratante"]).transform("nunique").to_numpy()
+    contratantes_por_id = claves["contratante"].where(con_contratante).groupby(claves["id"]).transform("nunique").to_numpy()
+
+    grupos = [
+        (TIPO_POLIZA_REPETIDA, poliza, con_poliza & poliza.duplicated(keep=False).to_numpy()),
+        (TIPO_POLIZA_PARECIDA, claves["poliza"], con_poliza & (variantes_poliza > 1)),
+        (TIPO_SERIE_REPETIDA, claves["serie"], con_serie & claves["serie"].duplicated(keep=False).to_numpy()),
+        (TIPO_CONTRATANTE_VARIOS_IDS, claves["contratante"], con_contratante & (ids_por_contratante > 1)),
+        (TIPO_ID_VARIOS_CONTRATANTES, claves["id"], con_id & (contratantes_por_id > 1)),
+    ]
+    partes = [
+        tabla[mascara].assign(Tipo=tipo, Grupo=grupo[mascara], Fila=np.flatnonzero(mascara) + PRIMERA_FILA_DATOS)
+        for tipo, grupo, mascara in grupos if mascara.any()
+    ]
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_REPORTE)
+    reporte = pd.concat(partes, ignore_index=True)[COLUMNAS_REPORTE]
+    orden_tipo = reporte["Tipo"].map({tipo: i for i, tipo in enumerate(TIPOS_DUPLICADO)})
+    return (reporte.assign(_orden=orden_tipo)
+            .sort_values(["_orden", "Grupo", "Fila"], kind="stable")
+            .drop(columns="_orden").reset_index(drop=True))
+
+
+def resumir_duplicados(reporte):
+    """Grupos y filas afectadas por tipo de duplicado"""
+    if reporte.empty:
+        return pd.DataFrame(columns=["Tipo", "Grupos", "Filas"])
+    return (reporte.groupby("Tipo", sort=False)
+            .agg(Grupos=("Grupo", "nunique"), Filas=("Fila", "size"))
+            .reset_index())
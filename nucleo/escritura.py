@@ -0,0 +1,186 @@
+"""Cola de escritura diferida (write-behind) con escrituras por lotes.
+
+Cada fila encolada recibe un ticket. Un hilo de fondo junta las filas
+pendientes y las escribe con una sola llamada `agregar` (append_rows) cuando
+se alcanza el tamaño de lote o vence el plazo de la fila más antigua. Los
+reintentos por límite de cuota (429) los hace el cliente de Sheets; si aun así
+la escritura falla, los tickets del lote quedan en error.
+
+La cola vive a nivel de proceso, así que las escrituras sobreviven a los reruns
+de Streamlit; la interfaz consulta el estado de cada ticket cuando lo necesita.
+"""
+import collections
+import threading
+import time
+import uuid
+
+from nucleo.almacenamiento import registro_a_fila
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_CONFIRMADO = "confirmado"
+ESTADO_ERROR = "error"
+
+_Escritura = collections.namedtuple("_Escritura", "ticket fila al_confirmar encolado")
+
+
+class ColaEscritura:
+    """Agrupa filas pendientes y las escribe en lotes por tamaño o por plazo"""
+
+    def __init__(self, repositorio, tam_lote=50, plazo=1.0, al_confirmar_lote=None):
+        self.repositorio = repositorio
+        self.tam_lote = tam_lote
+        self.plazo = plazo
+        self.al_confirmar_lote = al_confirmar_lote
+        self.estadisticas = {"lotes": 0, "filas": 0, "errores": 0}
+        self._pendientes = collections.deque()
+        self._estados = {}
+        self._en_vuelo = 0
+        self._filas_en_vuelo = []
+        self._forzar = False
+        self._cond = threading.Condition()
+        self._hilo = None
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+    def encolar(self, datos, al_confirmar=None):
+        """Encola una fila y devuelve su ticket; `al_confirmar` se ejecuta tras escribirla"""
+        ticket = uuid.uuid4().hex
+        ahora = time.time()
+        with self._cond:
+            self._purgar_estados(ahora)
+            self._estados[ticket] = {
+                "estado": ESTADO_PENDIENTE, "intentos": 0, "mensaje": "",
+                "encolado": ahora, "confirmado": None,
+            }
+            self._pendientes.append(_Escritura(ticket, registro_a_fila(datos), al_confirmar, ahora))
+            self._asegurar_hilo()
+            self._cond.notify_all()
+        return ticket
+
+    def estado(self, ticket):
+        """Devuelve una copia del estado de un ticket"""
+        with self._cond:
+            return dict(self._estados.get(ticket, {"estado": ESTADO_ERROR, "mensaje": "Ticket desconocido"}))
+
+    def esperar(self, ticket, timeout):
+        """Espera hasta `timeout` segundos a que el ticket deje de estar pendiente"""
+        limite = time.time() + timeout
+        with self._cond:
+            while self._estados.get(ticket, {}).get("estado") == ESTADO_PENDIENTE:
+                restante = limite - time.time()
+                if restante <= 0:
+                    break
+                self._cond.wait(restante)
+            return self._estados.get(ticket, {}).get("estado", ESTADO_ERROR)
+
+    def vaciar(self, timeout=30.0):
+        """Escribe de inmediato todo lo pendiente y espera a que termine"""
+        limite = time.time() + timeout
+        with self._cond:
+            self._forzar = True
+            self._cond.notify_all()
+            try:
+                while self._pendientes or self._en_vuelo:
+                    restante = limite - time.time()
+                    if restante <= 0:
+                        return False
+                    self._cond.wait(restante)
+                return True
+            finally:
+                self._forzar = False
+
+    @property
+    def pendientes(self):
+        return len(self._pendientes) + self._en_vuelo
+
+    def filas_pendientes(self):
+        """Filas encoladas o en escritura que todavía no se confirmaron en la hoja"""
+        with self._cond:
+            return [e.fila for e in self._pendientes] + self._filas_en_vuelo
+
+    # ------------------------------------------------------------
+    # Hilo de vaciado
+    # ------------------------------------------------------------
+    def _asegurar_hilo(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._bucle, name="cola-escritura", daemon=True)
+            self._hilo.start()
+
+    def _purgar_estados(self, ahora, antiguedad=3600):
+        for ticket in [t for t, e in self._estados.items()
+                       if e["estado"] != ESTADO_PENDIENTE and ahora - e["encolado"] > antiguedad]:
+            del self._estados[ticket]
+
+    def _segundos_para_vaciar(self, ahora):
+        """0 si hay que vaciar ya, None si no hay nada pendiente, o los segundos a esperar"""
+        if not self._pendientes:
+            return None
+        if self._forzar or len(self._pendientes) >= self.tam_lote:
+            return 0
+        return max(0.0, self._pendientes[0].encolado + self.plazo - ahora)
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                espera = self._segundos_para_vaciar(time.time())
+                while espera != 0:
+                    self._cond.wait(espera)
+                    espera = self._segundos_para_vaciar(time.time())
+                lote = [self._pendientes.popleft()
+                        for _ in range(min(self.tam_lote, len(self._pendientes)))]
+                self._en_vuelo = len(lote)
+                self._filas_en_vuelo = [e.fila for e in lote]
+            try:
+                self._escribir(lote)
+            finally:
+                with self._cond:
+                    self._en_vuelo = 0
+                    self._filas_en_vuelo = []
+                    self._cond.notify_all()
+
+    def _escribir(self, lote):
+        try:
+            self.repositorio.agregar([e.fila for e in lote])
+        except Exception as error:
+            self._registrar_fallo(lote, error)
+            return
+
+        # Un paso posterior fallido deja la operación a medias: el ticket queda en error
+        fallidos = {}
+        for escritura in lote:
+            if escritura.al_confirmar is not None:
+                try:
+                    escritura.al_confirmar()
+                except Exception as error:
+                    fallidos[escritura.ticket] = f"Guardado, pero falló el paso posterior: {error}"
+        if self.al_confirmar_lote is not None:
+            try:
+                self.al_confirmar_lote([e.fila for e in lote])
+            except Exception:
+                pass
+
+        ahora = time.time()
+        with self._cond:
+            self.estadisticas["lotes"] += 1
+            self.estadisticas["filas"] += len(lote)
+            self.estadisticas["errores"] += len(fallidos)
+            for escritura in lote:
+                estado = self._estados.get(escritura.ticket)
+                if estado is not None:
+                    estado["intentos"] += 1
+                    estado["estado"] = ESTADO_ERROR if escritura.ticket in fallidos else ESTADO_CONFIRMADO
+                    estado["confirmado"] = ahora
+                    estado["mensaje"] = fallidos.get(escritura.ticket, "")
+
+    def _registrar_fallo(self, lote, error):
+        # El cliente de Sheets ya agotó sus reintentos: el lote no se vuelve a encolar
+        with self._cond:
+            self.estadisticas["errores"] += 1
+            for escritura in lote:
+                estado = self._estados.get(escritura.ticket)
+                if estado is not None:
+                    estado["intentos"] += 1
+                    estado["estado"] = ESTADO_ERROR
+                    estado["mensaje"] = str(error)
+            self._cond.notify_all()
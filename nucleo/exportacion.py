@@ -0,0 +1,148 @@
+"""Exportación de tablas a CSV, Parquet y XLSX bajo demanda.
+
+Los archivos no se generan en cada rerun: la página le pasa a
+`st.download_button` una función que los construye solo cuando el usuario hace
+clic, y el resultado se guarda por clave (que incluye la versión de datos) para
+que otro clic, de cualquier sesión, no lo vuelva a generar. Las tablas se
+escriben por bloques de filas, así que nunca se convierte a texto la tabla
+completa de una sola vez.
+"""
+import collections
+import importlib.util
+import io
+import threading
+
+from nucleo.tabla import FORMATO_FECHA_EXPORTACION
+
+FORMATOS = {
+    "csv": {"etiqueta": "CSV", "extension": "csv", "mime": "text/csv"},
+    "parquet": {"etiqueta": "Parquet", "extension": "parquet", "mime": "application/vnd.apache.parquet"},
+    "xlsx": {
+        "etiqueta": "Excel (XLSX)", "extension": "xlsx",
+        "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    },
+}
+
+FORMATO_FECHA_EXCEL = "dd/mm/yyyy"
+
+# Filas que se convierten en cada paso
+TAM_BLOQUE = 10000
+
+
+def formatos_disponibles(varias_hojas=False):
+    """Formatos que se pueden generar: CSV y Parquet guardan una sola tabla y XLSX requiere XlsxWriter"""
+    formatos = [] if varias_hojas else ["csv", "parquet"]
+    if importlib.util.find_spec("xlsxwriter") is not None:
+        formatos.append("xlsx")
+    return formatos
+
+
+def _bloques(tabla, tam_bloque):
+    for inicio in range(0, max(len(tabla), 1), tam_bloque):
+        yield inicio, tabla.iloc[inicio:inicio + tam_bloque]
+
+
+def escribir_csv(tabla, destino, tam_bloque=TAM_BLOQUE):
+    texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+    for inicio, bloque in _bloques(tabla, tam_bloque):
+        bloque.to_csv(texto, header=inicio == 0, index=False, date_format=FORMATO_FECHA_EXPORTACION)
+    texto.flush()
+    texto.detach()
+
+
+def escribir_parquet(tabla, destino, tam_bloque=TAM_BLOQUE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.Schema.from_pandas(tabla, preserve_index=False)
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for _, bloque in _bloques(tabla, tam_bloque):
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+
+
+def _celdas(serie):
+    """Valores de una columna listos para xlsxwriter: None en las celdas vacías"""
+    import numpy as np
+
+    if hasattr(serie, "dt"):
+        valores = np.array(serie.dt.to_pydatetime(), dtype=object)
+    else:
+        valores = serie.to_numpy(dtype=object)
+    valores[serie.isna().to_numpy()] = None
+    return valores
+
+
+def escribir_xlsx(hojas, destino, tam_bloque=TAM_BLOQUE):
+    import pandas as pd
+    import xlsxwriter
+
+    # constant_memory escribe cada fila al archivo en cuanto se completa en
+    # lugar de guardar todas las celdas en memoria; exige escribir en orden de fila
+    libro = xlsxwriter.Workbook(destino, {"constant_memory": True})
+    negrita = libro.add_format({"bold": True})
+    formato_fecha = libro.add_format({"num_format": FORMATO_FECHA_EXCEL})
+    for nombre, tabla in hojas.items():
+        hoja = libro.add_worksheet(nombre[:31])
+        hoja.write_row(0, 0, list(tabla.columns), negrita)
+        escritores = []
+        for columna in tabla.columns:
+            if pd.api.types.is_datetime64_any_dtype(tabla[columna]):
+                escritores.append(lambda i, j, v: hoja.write_datetime(i, j, v, formato_fecha))
+            elif (pd.api.types.is_numeric_dtype(tabla[columna])
+                  and not pd.api.types.is_bool_dtype(tabla[columna])):
+                # Enteros y decimales como número, no como texto con forma de número
+                escritores.append(hoja.write_number)
+            else:
+                # write_string: un texto que empiece con "=" no debe volverse fórmula
+                escritores.append(lambda i, j, v: hoja.write_string(i, j, str(v)))
+        for inicio, bloque in _bloques(tabla, tam_bloque):
+            columnas = [_celdas(bloque[columna]) for columna in bloque.columns]
+            for i, fila in enumerate(zip(*columnas), start=inicio + 1):
+                for j, valor in enumerate(fila):
+                    if valor is not None:
+                        escritores[j](i, j, valor)
+    libro.close()
+
+
+def exportar(hojas, formato, tam_bloque=TAM_BLOQUE):
+    """Genera el archivo y devuelve sus bytes; `hojas` es un diccionario nombre -> DataFrame"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportación desconocido: '{formato}'")
+    if formato != "xlsx" and len(hojas) != 1:
+        raise ValueError(f"El formato {FORMATOS[formato]['etiqueta']} solo admite una tabla")
+    destino = io.BytesIO()
+    if formato == "csv":
+        escribir_csv(next(iter(hojas.values())), destino, tam_bloque)
+    elif formato == "parquet":
+        escribir_parquet(next(iter(hojas.values())), destino, tam_bloque)
+    else:
+        escribir_xlsx(hojas, destino, tam_bloque)
+    return destino.getvalue()
+
+
+class CacheExportaciones:
+    """Archivos ya generados por clave, descartando los menos usados (LRU)"""
+
+    def __init__(self, max_entradas=8):
+        self.max_entradas = max_entradas
+        self.estadisticas = {"generados": 0, "reutilizados": 0}
+        self._archivos = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, generar):
+        """Devuelve el archivo de `clave` o lo genera con `generar()`; sin clave no se guarda"""
+        if clave is not None:
+            with self._lock:
+                if clave in self._archivos:
+                    self._archivos.move_to_end(clave)
+                    self.estadisticas["reutilizados"] += 1
+                    return self._archivos[clave]
+        # Se genera fuera del candado para no frenar otras descargas
+        datos = generar()
+        with self._lock:
+            self.estadisticas["generados"] += 1
+            if clave is not None:
+                self._archivos[clave] = datos
+                while len(self._archivos) > self.max_entradas:
+                    self._archivos.popitem(last=False)
+        return datos
@@ -0,0 +1,191 @@
+"""Conversión vectorizada de las columnas de fecha de la hoja.
+
+La hoja mezcla varios formatos de fecha. En vez de probar `datetime.strptime`
+fila por fila, cada formato se aplica de una vez con pandas solo sobre las
+celdas que todavía no se pudieron interpretar.
+"""
+import numpy as np
+import pandas as pd
+
+# Orden en que se prueban los formatos (el mismo que usaba la app fila por fila)
+FORMATOS_FECHA = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y"]
+
+COLUMNAS_FECHA = [
+    "FIN DE VIGENCIA", "INICIO DE VIGENCIA",
+    "FECHA DE NAC CONTRATANTE", "FECHA DE NAC ASEGURADO"
+]
+
+
+def parsear_fechas(valores, formatos=FORMATOS_FECHA):
+    """Convierte textos con formatos mixtos a datetime64; NaT si ningún formato aplica"""
+    serie = pd.Series(valores, dtype=object)
+    es_texto = serie.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    textos = serie.where(es_texto, "").astype(str).str.strip()
+    resultado = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    pendientes = es_texto & (textos != "").to_numpy()
+    for formato in formatos:
+        if not pendientes.any():
+            break
+        convertidas = pd.to_datetime(textos[pendientes], format=formato, errors="coerce")
+        resultado[pendientes] = convertidas
+        pendientes &= resultado.isna().to_numpy()
+    return resultado
+
+
+def construir_columnas_fecha(registros, columnas=COLUMNAS_FECHA):
+    """DataFrame con una columna datetime64 por cada columna de fecha, alineado con `registros`"""
+    return pd.DataFrame(
+        {columna: parsear_fechas([r.get(columna, "") for r in registros]) for columna in columnas},
+        index=pd.RangeIndex(len(registros))
+    )
+
+
+def filas_en_rango(fechas, desde, hasta):
+    """Posiciones cuyas fechas caen en [desde, hasta]"""
+    mascara = (fechas >= pd.Timestamp(desde)) & (fechas <= pd.Timestamp(hasta))
+    return np.flatnonzero(mascara.to_numpy())
+
+
+class IndiceVencimientos:
+    """Fechas de FIN DE VIGENCIA ordenadas para responder cualquier ventana con búsqueda binaria.
+
+    Además guarda, para cada póliza, la mayor fecha de fin de su grupo
+    (No. Cliente + PRODUCTO): una póliza vencida cuyo grupo ya tiene otra
+    vigencia posterior a hoy se considera renovada.
+    """
+
+    def __init__(self, registros, fin_vigencia):
+        fin = pd.Series(fin_vigencia).reset_index(drop=True)
+        validas = np.flatnonzero(fin.notna().to_numpy())
+        dias = fin.iloc[validas].to_numpy(dtype="datetime64[D]").astype(np.int64)
+        orden = np.argsort(dias, kind="stable")
+        self.dias = dias[orden]
+        self.posiciones = validas[orden]
+
+        grupos = pd.Series([
+            (str(registros[i].get("No. Cliente", "")).strip(),
+             str(registros[i].get("PRODUCTO", "")).strip().upper())
+            for i in self.posiciones
+        ], dtype=object)
+        self.fin_grupo = pd.Series(self.dias).groupby(grupos.to_numpy()).transform("max").to_numpy(dtype=np.int64)
+
+    @staticmethod
+    def _dia(fecha):
+        return np.datetime64(pd.Timestamp(fecha).date(), "D").astype(np.int64)
+
+    def en_rango(self, desde, hasta):
+        """Posiciones con FIN DE VIGENCIA en [desde, hasta], ordenadas por fecha"""
+        inicio = np.searchsorted(self.dias, self._dia(desde), side="left")
+        fin = np.searchsorted(self.dias, self._dia(hasta), side="right")
+        return self.posiciones[inicio:fin]
+
+    def proximas(self, hoy, dias):
+        """Posiciones que vencen entre hoy y hoy + `dias`"""
+        return self.en_rango(hoy, pd.Timestamp(hoy) + pd.Timedelta(days=dias))
+
+    def vencidas_sin_renovar(self, hoy, dias_atras=None):
+        """Posiciones ya vencidas cuyo grupo no tiene ninguna vigencia desde hoy en adelante"""
+        dia_hoy = self._dia(hoy)
+        fin = np.searchsorted(self.dias, dia_hoy, side="left")
+        inicio = 0 if dias_atras is None else np.searchsorted(self.dias, dia_hoy - dias_atras, side="left")
+        sin_renovar = self.fin_grupo[inicio:fin] < dia_hoy
+        return self.posiciones[inicio:fin][sin_renovar]
+
+
+def _clave_dia(mes, dia):
+    """Día del año (0-365) en un calendario bisiesto, para que el 29 de febrero tenga su lugar"""
+    return (pd.Timestamp(2000, mes, dia) - pd.Timestamp(2000, 1, 1)).days
+
+
+def _es_bisiesto(anio):
+    return anio % 4 == 0 and (anio % 100 != 0 or anio % 400 == 0)
+
+
+class IndiceCumpleaños:
+    """Índice (mes, día) sobre las fechas de nacimiento de contratantes y asegurados.
+
+    Cada persona (nombre + fecha) aparece una sola vez aunque tenga varias
+    pólizas o sea contratante y asegurado a la vez. Las consultas son búsquedas
+    binarias sobre el día del año, así que cuestan lo mismo con 100 o con
+    100 000 pólizas. En años no bisiestos el 29 de febrero se celebra el 28.
+    """
+
+    COLUMNAS = (
+        ("CONTRATANTE", "FECHA DE NAC CONTRATANTE", "Contratante"),
+        ("ASEGURADO", "FECHA DE NAC ASEGURADO", "Asegurado"),
+    )
+
+    def __init__(self, registros, fechas):
+        personas = {}
+        for columna_nombre, columna_fecha, tipo in self.COLUMNAS:
+            nacimientos = fechas[columna_fecha]
+            for i in np.flatnonzero(nacimientos.notna().to_numpy()):
+                nombre = str(registros[i].get(columna_nombre, "")).strip()
+                if not nombre:
+                    continue
+                fecha = nacimientos.iat[i]
+                clave = (nombre.lower(), fecha)
+                if clave not in personas:
+                    personas[clave] = {"nombre": nombre, "fecha": fecha, "tipos": []}
+                if tipo not in personas[clave]["tipos"]:
+                    personas[clave]["tipos"].append(tipo)
+
+        self.personas = sorted(personas.values(), key=lambda p: _clave_dia(p["fecha"].month, p["fecha"].day))
+        self.claves = np.array(
+            [_clave_dia(p["fecha"].month, p["fecha"].day) for p in self.personas], dtype=np.int64
+        )
+
+    def _tramo(self, clave_inicio, clave_fin):
+        inicio = np.searchsorted(self.claves, clave_inicio, side="left")
+        fin = np.searchsorted(self.claves, clave_fin, side="right")
+        return range(inicio, fin)
+
+    def _entrada(self, persona, anio, hoy=None):
+        nacimiento = persona["fecha"]
+        if nacimiento.month == 2 and nacimiento.day == 29 and not _es_bisiesto(anio):
+            proximo = pd.Timestamp(anio, 2, 28)
+        else:
+            proximo = pd.Timestamp(anio, nacimiento.month, nacimiento.day)
+        entrada = {
+            "NOMBRE": persona["nombre"],
+            "TIPO": " / ".join(persona["tipos"]),
+            "FECHA DE NACIMIENTO": nacimiento.strftime('%d/%m/%Y'),
+            "DÍA": proximo.day,
+            "CUMPLEAÑOS": proximo.strftime('%d/%m/%Y'),
+            "EDAD": anio - nacimiento.year,
+        }
+        if hoy is not None:
+            entrada["DÍAS RESTANTES"] = (proximo - pd.Timestamp(hoy)).days
+        return entrada
+
+    def del_mes(self, anio, mes):
+        """Cumpleaños de un mes calendario, ordenados por día"""
+        ultimo = 29 if mes == 2 else pd.Timestamp(2000, mes, 1).days_in_month
+        return [
+            self._entrada(self.personas[i], anio)
+            for i in self._tramo(_clave_dia(mes, 1), _clave_dia(mes, ultimo))
+        ]
+
+    def proximos(self, hoy, dias):
+        """Cumpleaños de hoy a hoy + `dias` (máximo un año), cruzando fin de mes y de año"""
+        hoy = pd.Timestamp(hoy).normalize()
+        limite = hoy + pd.Timedelta(days=min(int(dias), 365))
+        resultado = []
+        inicio = hoy
+        while inicio <= limite:
+            fin = min(limite, pd.Timestamp(inicio.year, 12, 31))
+            clave_inicio = _clave_dia(inicio.month, inicio.day)
+            clave_fin = _clave_dia(fin.month, fin.day)
+            if fin.month == 2 and fin.day == 28 and not _es_bisiesto(fin.year):
+                clave_fin = _clave_dia(2, 29)
+            resultado.extend(
+                self._entrada(self.personas[i], inicio.year, hoy)
+                for i in self._tramo(clave_inicio, clave_fin)
+            )
+            inicio = fin + pd.Timedelta(days=1)
+        return resultado
+
+    def contar_mes(self, mes):
+        """Número de cumpleaños del mes sin construir las entradas"""
+        ultimo = 29 if mes == 2 else pd.Timestamp(2000, mes, 1).days_in_month
+        return len(self._tramo(_clave_dia(mes, 1), _clave_dia(mes, ultimo)))
@@ -0,0 +1,197 @@
+"""Importación masiva de pólizas desde CSV o Excel.
+
+El archivo se valida completo de una vez con las reglas de `nucleo.validacion`
+(campos obligatorios, fechas, No. POLIZA repetido en el archivo o ya registrado
+y No. Cliente contra los contratantes existentes) y se arma un reporte por
+fila. Las filas válidas se escriben en bloques de `append_rows` con una pausa
+entre bloques para no agotar la cuota; el avance queda en `ImportacionLote`,
+así que una importación interrumpida se reanuda desde el primer bloque que no
+se llegó a escribir.
+"""
+import datetime
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from nucleo.indices import valor_clave
+from nucleo.validacion import como_texto, errores_fecha, errores_obligatorio, unir_errores
+
+CAMPOS_OBLIGATORIOS = ["CONTRATANTE", "ASEGURADO", "No. POLIZA", "INICIO DE VIGENCIA", "FIN DE VIGENCIA"]
+FECHAS_NACIMIENTO = ["FECHA DE NAC CONTRATANTE", "FECHA DE NAC ASEGURADO"]
+FECHAS_VIGENCIA = ["INICIO DE VIGENCIA", "FIN DE VIGENCIA"]
+
+# No. Cliente de los contratantes nuevos hasta que se les asigna uno al importar
+ID_NUEVO = ""
+
+
+# ============================================================
+# LECTURA DEL ARCHIVO
+# ============================================================
+def _celda_excel_a_texto(valor):
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return valor
+
+
+def leer_archivo(nombre, contenido):
+    """DataFrame de textos desde un CSV (separador detectado) o un Excel (primera hoja)"""
+    if nombre.lower().endswith(".xlsx"):
+        tabla = pd.read_excel(io.BytesIO(contenido), dtype=object)
+        # Excel guarda fechas y números con tipo: se llevan al formato de captura
+        tabla = tabla.map(_celda_excel_a_texto)
+    else:
+        tabla = pd.read_csv(io.BytesIO(contenido), dtype=str, keep_default_na=False,
+                            encoding="utf-8-sig", sep=None, engine="python")
+    return tabla
+
+
+def normalizar_columnas(tabla, campos):
+    """Alinea las columnas del archivo con `campos` sin distinguir mayúsculas ni espacios.
+
+    Devuelve (tabla con exactamente `campos` como texto, obligatorios faltantes,
+    columnas del archivo que se ignoran).
+    """
+    por_nombre = {str(columna).strip().upper(): columna for columna in tabla.columns}
+    conocidas = {campo.upper() for campo in campos}
+    normalizada = pd.DataFrame(
+        {campo: (como_texto(tabla[por_nombre[campo.upper()]]) if campo.upper() in por_nombre else "")
+         for campo in campos},
+        index=pd.RangeIndex(len(tabla))
+    )
+    faltantes = [campo for campo in CAMPOS_OBLIGATORIOS if campo.upper() not in por_nombre]
+    ignoradas = [str(columna) for columna in tabla.columns if str(columna).strip().upper() not in conocidas]
+    return normalizada, faltantes, ignoradas
+
+
+# ============================================================
+# VALIDACIÓN VECTORIZADA
+# ============================================================
+def validar_lote(tabla, indices, anio_actual=None):
+    """Valida todas las filas a la vez contra las reglas del formulario y los datos existentes.
+
+    `indices` es el IndicesPolizas de la versión actual. Devuelve (reporte,
+    tabla) donde el reporte tiene una fila por fila del archivo con sus errores
+    y la tabla trae el No. Cliente resuelto (ID_NUEVO para contratantes nuevos).
+    """
+    errores = [(campo, errores_obligatorio(tabla[campo])) for campo in CAMPOS_OBLIGATORIOS]
+    for campo in FECHAS_NACIMIENTO:
+        errores.append((campo, errores_fecha(tabla[campo], anio_actual=anio_actual)[0]))
+    vigencias = {}
+    for campo in FECHAS_VIGENCIA:
+        mensajes, vigencias[campo] = errores_fecha(tabla[campo], es_vigencia=True)
+        errores.append((campo, mensajes))
+    invertida = (vigencias["FIN DE VIGENCIA"] < vigencias["INICIO DE VIGENCIA"]).to_numpy()
+    errores.append(("FIN DE VIGENCIA", np.where(invertida, "Anterior al inicio de vigencia", "")))
+
+    polizas = tabla["No. POLIZA"]
+    con_poliza = (polizas != "").to_numpy()
+    repetida = polizas.duplicated(keep=False).to_numpy() & con_poliza
+    registrada = polizas.isin(list(indices.por_poliza)).to_numpy() & con_poliza
+    errores.append(("No. POLIZA", np.select(
+        [registrada, repetida], ["Ya existe en Pólizas", "Repetida en el archivo"], default=""
+    )))
+
+    # No. Cliente: el del contratante si ya existe; el del archivo solo si no contradice los datos
+    # Los IDs pueden venir como número desde la hoja; se comparan como texto
+    ids_por_nombre = {nombre: valor_clave(id_cliente) for nombre, id_cliente in indices.id_por_contratante.items()}
+    existentes = tabla["CONTRATANTE"].str.lower().map(ids_por_nombre).astype(object)
+    provistos = tabla["No. Cliente"]
+    con_provisto = (provistos != "").to_numpy()
+    hay_existente = existentes.notna().to_numpy()
+    distinto = con_provisto & hay_existente & (provistos != existentes.fillna("")).to_numpy()
+    ajeno = con_provisto & ~hay_existente & provistos.isin(list(indices.por_cliente)).to_numpy()
+    errores.append(("No. Cliente", np.select(
+        [distinto, ajeno],
+        [np.char.add("No coincide con el del contratante: ", existentes.fillna("").to_numpy(dtype=str)),
+         "Ya pertenece a otro contratante"],
+        default=""
+    )))
+
+    resueltos = np.where(con_provisto, provistos.to_numpy(dtype=str),
+                         existentes.fillna(ID_NUEVO).to_numpy(dtype=str))
+    tabla = tabla.assign(**{"No. Cliente": resueltos})
+
+    mensajes = unir_errores(errores)
+    reporte = pd.DataFrame({
+        "Fila": tabla.index + 2,  # la fila 1 del archivo son los encabezados
+        "No. POLIZA": polizas,
+        "CONTRATANTE": tabla["CONTRATANTE"],
+        "No. Cliente": np.where(resueltos == ID_NUEVO, "(nuevo)", resueltos),
+        "Válida": mensajes == "",
+        "Errores": mensajes,
+    })
+    return reporte, tabla
+
+
+def asignar_ids_nuevos(tabla, nuevo_id):
+    """Asigna un No. Cliente por contratante nuevo (el mismo a todas sus filas) con `nuevo_id()`"""
+    nuevos = (tabla["No. Cliente"] == ID_NUEVO).to_numpy()
+    if not nuevos.any():
+        return tabla
+    nombres = tabla["CONTRATANTE"].str.lower()
+    asignados = {nombre: str(nuevo_id()) for nombre in pd.unique(nombres[nuevos])}
+    return tabla.assign(**{"No. Cliente": np.where(nuevos, nombres.map(asignados), tabla["No. Cliente"])})
+
+
+# ============================================================
+# ESCRITURA POR BLOQUES REANUDABLE
+# ============================================================
+class ImportacionLote:
+    """Filas válidas pendientes de escribir y el avance de la escritura"""
+
+    def __init__(self, filas, tam_bloque=200, pausa=1.0):
+        self.filas = [list(fila) for fila in filas]
+        self.tam_bloque = tam_bloque
+        self.pausa = pausa
+        self.escritas = 0
+        self.bloques = 0
+        self.descartadas = 0
+        self.ultimo_error = None
+
+    @property
+    def total(self):
+        return len(self.filas)
+
+    @property
+    def terminado(self):
+        return self.escritas >= len(self.filas)
+
+    def escribir(self, repositorio, al_escribir_bloque=None, al_avanzar=None):
+        """Escribe los bloques pendientes en orden.
+
+        Los 429 los reintenta el cliente de Sheets; el error que quede se
+        propaga dejando `escritas` en el último bloque confirmado, para reanudar.
+        """
+        while not self.terminado:
+            bloque = self.filas[self.escritas:self.escritas + self.tam_bloque]
+            try:
+                repositorio.agregar(bloque)
+            except Exception as error:
+                self.ultimo_error = str(error)
+                raise
+            self.ultimo_error = None
+            self.escritas += len(bloque)
+            self.bloques += 1
+            if al_escribir_bloque is not None:
+                al_escribir_bloque(bloque)
+            if al_avanzar is not None:
+                al_avanzar(self.escritas, self.total)
+            if not self.terminado:
+                time.sleep(self.pausa)
+
+    def descartar_existentes(self, polizas_existentes, columna_poliza):
+        """Quita de lo pendiente las filas cuyo No. POLIZA ya está en la hoja.
+
+        Se usa antes de reanudar: si un bloque falló después de que la API lo
+        escribió, sus filas no se vuelven a agregar.
+        """
+        pendientes = [
+            fila for fila in self.filas[self.escritas:]
+            if valor_clave(fila[columna_poliza]) not in polizas_existentes
+        ]
+        self.descartadas += len(self.filas) - self.escritas - len(pendientes)
+        self.filas = self.filas[:self.escritas] + pendientes
@@ -0,0 +1,187 @@
+"""Índices en memoria sobre los registros de pólizas."""
+import bisect
+import re
+import threading
+
+from nucleo.almacenamiento import PRIMERA_FILA_DATOS
+
+
+def valor_clave(valor):
+    """Normaliza un valor de celda para usarlo como clave exacta"""
+    return str(valor).strip() if valor is not None else ""
+
+
+# Campos que identifican una sola póliza activa
+CAMPOS_UNICOS = ("No. POLIZA", "No Serie Auto")
+# Separadores que no distinguen un identificador de otro: "abc-123" es "ABC 123"
+SEPARADORES_CLAVE = r"[\s\-./_]+"
+_SEPARADORES = re.compile(SEPARADORES_CLAVE)
+
+
+def clave_unica(valor):
+    """Clave de comparación de identificadores: sin separadores y en mayúsculas"""
+    return _SEPARADORES.sub("", valor_clave(valor)).upper()
+
+
+def normalizar_contratante(nombre):
+    """Clave de comparación de nombres: sin espacios en los extremos y en minúsculas"""
+    return valor_clave(nombre).lower()
+
+
+# ============================================================
+# ÍNDICES SECUNDARIOS POR VERSIÓN DE DATOS
+# ============================================================
+class IndicesPolizas:
+    """Mapas hash sobre los registros de una versión de datos.
+
+    Se construyen en una sola pasada y no se modifican después; cuando los
+    datos cambian se construye un objeto nuevo para la nueva versión.
+    """
+
+    def __init__(self, registros, version=None):
+        self.version = version
+        self.por_contratante = {}
+        self.por_contratante_exacto = {}
+        self.por_cliente = {}
+        self.por_poliza = {}
+        self.por_serie = {}
+        self.id_por_contratante = {}
+        self.por_clave_unica = {campo: {} for campo in CAMPOS_UNICOS}
+        self.ultimo_id_cliente = 0
+
+        for registro in registros:
+            contratante = registro.get("CONTRATANTE", "")
+            id_cliente = registro.get("No. Cliente", "")
+            if contratante != "":
+                normalizado = normalizar_contratante(contratante)
+                self.por_contratante.setdefault(normalizado, []).append(registro)
+                self.por_contratante_exacto.setdefault(contratante, []).append(registro)
+                # El primer registro del contratante define su No. Cliente
+                self.id_por_contratante.setdefault(normalizado, id_cliente)
+            self._agregar(self.por_cliente, id_cliente, registro)
+            self._agregar(self.por_poliza, registro.get("No. POLIZA", ""), registro)
+            self._agregar(self.por_serie, registro.get("No Serie Auto", ""), registro)
+            for campo, mapa in self.por_clave_unica.items():
+                clave = clave_unica(registro.get(campo, ""))
+                if clave:
+                    mapa.setdefault(clave, []).append(registro)
+            if str(id_cliente).isdigit():
+                self.ultimo_id_cliente = max(self.ultimo_id_cliente, int(id_cliente))
+
+        self.contratantes = sorted(self.por_contratante_exacto, key=str)
+
+    @staticmethod
+    def _agregar(mapa, valor, registro):
+        clave = valor_clave(valor)
+        if clave:
+            mapa.setdefault(clave, []).append(registro)
+
+    def polizas_de_contratante(self, nombre):
+        """Pólizas cuyo CONTRATANTE es exactamente `nombre`"""
+        return self.por_contratante_exacto.get(nombre, [])
+
+    def id_de_contratante(self, nombre):
+        """No. Cliente ya asignado al contratante (sin distinguir mayúsculas), o None"""
+        return self.id_por_contratante.get(normalizar_contratante(nombre))
+
+    def polizas_de_cliente(self, id_cliente):
+        return self.por_cliente.get(valor_clave(id_cliente), [])
+
+    def polizas_por_numero(self, no_poliza):
+        return self.por_poliza.get(valor_clave(no_poliza), [])
+
+    def polizas_por_serie(self, no_serie):
+        return self.por_serie.get(valor_clave(no_serie), [])
+
+    def polizas_con_clave(self, campo, valor):
+        """Pólizas cuyo `campo` (de CAMPOS_UNICOS) es el mismo identificador que `valor`"""
+        return self.por_clave_unica[campo].get(clave_unica(valor), [])
+
+
+# ============================================================
+# ÍNDICE DE FILAS FÍSICAS
+# ============================================================
+class IndiceFilas:
+    """Índice (No. POLIZA, No. Cliente) -> fila física de la hoja.
+
+    Las bajas no renumeran el índice: se guardan en una lista ordenada de filas
+    eliminadas y la fila actual se calcula restando cuántas se borraron antes.
+    Con d bajas desde la última reconstrucción, una alta cuesta O(1), una
+    búsqueda O(log d) y una baja O(d) por la inserción en la lista ordenada
+    (un desplazamiento de memoria, sin renumerar nada). Si una verificación
+    encuentra otra cosa en la fila calculada, el índice se reconstruye.
+    """
+
+    def __init__(self, campos=("No. POLIZA", "No. Cliente")):
+        self.campos = tuple(campos)
+        self.lock = threading.RLock()
+        self.construido = False
+        self.reconstrucciones = 0
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._filas_por_clave = {}
+        self._clave_por_fila = {}
+        self._eliminadas = []
+        self._siguiente = PRIMERA_FILA_DATOS
+
+    def clave(self, registro):
+        """Clave del índice para un registro (diccionario)"""
+        return tuple(valor_clave(registro.get(campo, "")) for campo in self.campos)
+
+    def reconstruir(self, registros):
+        """Reconstruye el índice desde los registros en orden de hoja"""
+        with self.lock:
+            self._reiniciar()
+            self.registrar_altas(registros)
+            self.construido = True
+            self.reconstrucciones += 1
+
+    def reconstruir_desde_columnas(self, columnas):
+        """Reconstruye el índice desde las columnas clave leídas de la hoja"""
+        self.reconstruir([dict(zip(self.campos, valores)) for valores in zip(*columnas)])
+
+    def registrar_altas(self, registros):
+        """Registra filas agregadas al final de la hoja"""
+        with self.lock:
+            for registro in registros:
+                clave = self.clave(registro)
+                fila = self._siguiente
+                self._siguiente += 1
+                self._filas_por_clave.setdefault(clave, []).append(fila)
+                self._clave_por_fila[fila] = clave
+
+    def _fila_actual(self, original):
+        return original - bisect.bisect_left(self._eliminadas, original)
+
+    def _fila_original(self, actual):
+        original = actual
+        while True:
+            siguiente = actual + bisect.bisect_right(self._eliminadas, original)
+            if siguiente == original:
+                return original
+            original = siguiente
+
+    def buscar(self, registro):
+        """Filas actuales candidatas para el registro, en orden de hoja"""
+        with self.lock:
+            originales = self._filas_por_clave.get(self.clave(registro), [])
+            return [self._fila_actual(o) for o in originales]
+
+    def registrar_baja(self, fila):
+        """Registra que la fila actual `fila` se eliminó de la hoja"""
+        with self.lock:
+            original = self._fila_original(fila)
+            clave = self._clave_por_fila.pop(original, None)
+            if clave is None:
+                return
+            filas = self._filas_por_clave.get(clave, [])
+            if original in filas:
+                filas.remove(original)
+            if not filas:
+                self._filas_por_clave.pop(clave, None)
+            bisect.insort(self._eliminadas, original)
+
+    @property
+    def total_filas(self):
+        return len(self._clave_por_fila)
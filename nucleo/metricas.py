@@ -0,0 +1,325 @@
+"""Métricas de uso de la API y de los cargadores cacheados.
+
+Un `RegistroMetricas` por proceso acumula contadores e histogramas con
+etiquetas. Cada ejecución del script marca su hilo con la página (`menu`) y
+todo lo que se mide en ese hilo hereda esa etiqueta; lo que corre en hilos
+propios (sincronización de fondo, cola de escritura) queda como
+`pagina="fondo"`. No se etiqueta por sesión: cada sesión nueva agregaría series
+que nunca se liberan.
+
+Las métricas se pueden leer como texto de Prometheus (por ejemplo, para el
+textfile collector de node_exporter) o como JSON.
+"""
+import bisect
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# Límites (segundos) de los histogramas de latencia
+LIMITES_LATENCIA = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+# Límites del histograma de llamadas a la API por render
+LIMITES_LLAMADAS = [0, 1, 2, 5, 10, 20, 50]
+
+PAGINA_FONDO = "fondo"
+
+AYUDA = {
+    "sheets_llamadas_total": "Llamadas a la API de Google Sheets",
+    "sheets_latencia_segundos": "Duración de cada llamada a la API, incluidos los reintentos",
+    "sheets_espera_cuota_segundos": "Tiempo esperando un token de cuota",
+    "sheets_limites_cuota_total": "Respuestas 429 recibidas",
+    "sheets_errores_total": "Llamadas que fallaron después de los reintentos",
+    "sheets_bytes_enviados_total": "Bytes enviados a la API",
+    "sheets_bytes_recibidos_total": "Bytes recibidos de la API",
+    "cache_consultas_total": "Consultas a cargadores cacheados por resultado (acierto/fallo)",
+    "cargador_latencia_segundos": "Duración de los cargadores cacheados",
+    "render_segundos": "Duración de cada ejecución del script",
+    "render_llamadas_api": "Llamadas a la API hechas durante un render",
+}
+
+_contexto = threading.local()
+
+
+def etiquetas_actuales():
+    """Página del hilo actual"""
+    return {"pagina": getattr(_contexto, "pagina", PAGINA_FONDO)}
+
+
+def _clave(etiquetas):
+    return tuple(sorted(etiquetas.items()))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formato_etiquetas(etiquetas, extra=None):
+    pares = list(etiquetas) + list((extra or {}).items())
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + "}"
+
+
+class _Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        self.cubetas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cantidad += 1
+
+    def percentil(self, fraccion):
+        """Límite superior de la cubeta donde cae el percentil (aproximado)"""
+        objetivo = fraccion * self.cantidad
+        acumulado = 0
+        for limite, cubeta in zip(self.limites + [float("inf")], self.cubetas):
+            acumulado += cubeta
+            if acumulado >= objetivo:
+                return limite
+        return float("inf")
+
+
+class RegistroMetricas:
+    """Contadores e histogramas con etiquetas, seguros entre hilos"""
+
+    def __init__(self):
+        self.inicio = time.time()
+        self._contadores = {}
+        self._histogramas = {}
+        self._lock = threading.Lock()
+        self._ultima_exportacion = 0.0
+
+    # ------------------------------------------------------------
+    # Contexto de la ejecución
+    # ------------------------------------------------------------
+    def etiquetar(self, **etiquetas):
+        """Fija las etiquetas (por ejemplo, la página) de lo que se mida en este hilo"""
+        for nombre, valor in etiquetas.items():
+            setattr(_contexto, nombre, valor)
+
+    def iniciar_render(self):
+        """Marca el comienzo de una ejecución del script"""
+        self.etiquetar(pagina="inicio")
+        _contexto.render_inicio = time.perf_counter()
+        _contexto.render_llamadas = 0
+
+    def terminar_render(self):
+        inicio = getattr(_contexto, "render_inicio", None)
+        if inicio is None:
+            return
+        self.observar("render_segundos", time.perf_counter() - inicio)
+        self.observar("render_llamadas_api", _contexto.render_llamadas, limites=LIMITES_LLAMADAS)
+        _contexto.render_inicio = None
+
+    # ------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, _clave({**etiquetas_actuales(), **etiquetas}))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, limites=LIMITES_LATENCIA, **etiquetas):
+        clave = (nombre, _clave({**etiquetas_actuales(), **etiquetas}))
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = _Histograma(limites)
+            histograma.observar(valor)
+
+    def llamada_api(self, operacion, tipo, segundos, espera_cuota, error=None, limites_cuota=0):
+        """Registra una llamada del cliente de Sheets (con todos sus reintentos)"""
+        self.incrementar("sheets_llamadas_total", operacion=operacion, tipo=tipo)
+        self.observar("sheets_latencia_segundos", segundos, operacion=operacion)
+        self.observar("sheets_espera_cuota_segundos", espera_cuota, tipo=tipo)
+        if limites_cuota:
+            self.incrementar("sheets_limites_cuota_total", limites_cuota, operacion=operacion)
+        if error is not None:
+            self.incrementar("sheets_errores_total", operacion=operacion)
+        if hasattr(_contexto, "render_llamadas"):
+            _contexto.render_llamadas += 1
+
+    def respuesta_http(self, respuesta, *args, **kwargs):
+        """Hook de `requests`: suma los bytes enviados y recibidos de cada respuesta"""
+        cuerpo = getattr(respuesta.request, "body", None) or b""
+        self.incrementar("sheets_bytes_enviados_total", len(cuerpo))
+        self.incrementar("sheets_bytes_recibidos_total", len(respuesta.content or b""))
+        return respuesta
+
+    @contextlib.contextmanager
+    def cargando(self, cargador):
+        """Mide un cargador; quien llama pone medicion["resultado"] = "fallo" si tuvo que calcular"""
+        medicion = {"resultado": "acierto"}
+        inicio = time.perf_counter()
+        try:
+            yield medicion
+        finally:
+            self.incrementar("cache_consultas_total", cargador=cargador, resultado=medicion["resultado"])
+            self.observar("cargador_latencia_segundos", time.perf_counter() - inicio,
+                          cargador=cargador, resultado=medicion["resultado"])
+
+    def cargador(self, nombre, cache):
+        """Decorador: aplica `cache` (p. ej. st.cache_resource(...)) y mide aciertos, fallos y latencia.
+
+        El cuerpo de la función solo corre cuando el caché falla, así que eso
+        es lo que marca el fallo. Los cargadores anidados tienen su propia medición.
+        """
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def calcular(*args, **kwargs):
+                _contexto.mediciones[-1]["resultado"] = "fallo"
+                return funcion(*args, **kwargs)
+
+            cacheada = cache(calcular)
+
+            @functools.wraps(funcion)
+            def medida(*args, **kwargs):
+                if not hasattr(_contexto, "mediciones"):
+                    _contexto.mediciones = []
+                with self.cargando(nombre) as medicion:
+                    _contexto.mediciones.append(medicion)
+                    try:
+                        return cacheada(*args, **kwargs)
+                    finally:
+                        _contexto.mediciones.pop()
+
+            medida.clear = getattr(cacheada, "clear", None)
+            return medida
+        return decorador
+
+    # ------------------------------------------------------------
+    # Lectura y exportación
+    # ------------------------------------------------------------
+    def contadores(self):
+        """Lista de (nombre, etiquetas, valor)"""
+        with self._lock:
+            return [(nombre, dict(etiquetas), valor) for (nombre, etiquetas), valor in self._contadores.items()]
+
+    def histogramas(self):
+        """Lista de (nombre, etiquetas, histograma) con copias de los histogramas"""
+        with self._lock:
+            resultado = []
+            for (nombre, etiquetas), histograma in self._histogramas.items():
+                copia = _Histograma(histograma.limites)
+                copia.cubetas = list(histograma.cubetas)
+                copia.suma, copia.cantidad = histograma.suma, histograma.cantidad
+                resultado.append((nombre, dict(etiquetas), copia))
+            return resultado
+
+    def total(self, nombre, **filtro):
+        """Suma de un contador sobre todas las etiquetas que coinciden con `filtro`"""
+        return sum(
+            valor for contador, etiquetas, valor in self.contadores()
+            if contador == nombre and all(etiquetas.get(k) == v for k, v in filtro.items())
+        )
+
+    def agrupar_histogramas(self, nombre, por):
+        """Histogramas de `nombre` fusionados por el valor de la etiqueta `por`"""
+        grupos = {}
+        for histograma_nombre, etiquetas, histograma in self.histogramas():
+            if histograma_nombre != nombre:
+                continue
+            grupo = grupos.setdefault(etiquetas.get(por, ""), _Histograma(histograma.limites))
+            grupo.cubetas = [a + b for a, b in zip(grupo.cubetas, histograma.cubetas)]
+            grupo.suma += histograma.suma
+            grupo.cantidad += histograma.cantidad
+        return grupos
+
+    def resumen_api(self):
+        """Por operación: llamadas, latencia media y p95 aproximado (todas las páginas)"""
+        return [
+            {"Operación": operacion, "Llamadas": h.cantidad,
+             "Media (s)": round(h.suma / h.cantidad, 3), "p95 (s)": h.percentil(0.95)}
+            for operacion, h in sorted(self.agrupar_histogramas("sheets_latencia_segundos", "operacion").items(),
+                                       key=lambda item: -item[1].suma)
+        ]
+
+    def resumen_paginas(self):
+        """Por página: llamadas a la API, 429 y duración media del render"""
+        renders = self.agrupar_histogramas("render_segundos", "pagina")
+        paginas = sorted(set(renders) | {e["pagina"] for n, e, _ in self.contadores() if n == "sheets_llamadas_total"})
+        return [
+            {"Página": pagina,
+             "Llamadas API": self.total("sheets_llamadas_total", pagina=pagina),
+             "429": self.total("sheets_limites_cuota_total", pagina=pagina),
+             "Renders": renders[pagina].cantidad if pagina in renders else 0,
+             "Render medio (s)": round(renders[pagina].suma / renders[pagina].cantidad, 3) if pagina in renders else None}
+            for pagina in paginas
+        ]
+
+    def resumen_cargadores(self):
+        """Por cargador: aciertos, fallos y tiempo total invertido"""
+        fallos = self.agrupar_histogramas("cargador_latencia_segundos", "cargador")
+        cargadores = sorted({e["cargador"] for n, e, _ in self.contadores() if n == "cache_consultas_total"})
+        resumen = []
+        for cargador in cargadores:
+            aciertos = self.total("cache_consultas_total", cargador=cargador, resultado="acierto")
+            fallidos = self.total("cache_consultas_total", cargador=cargador, resultado="fallo")
+            duracion = fallos.get(cargador)
+            resumen.append({
+                "Cargador": cargador, "Aciertos": aciertos, "Fallos": fallidos,
+                "% acierto": round(100 * aciertos / max(aciertos + fallidos, 1), 1),
+                "Tiempo total (s)": round(duracion.suma, 3) if duracion else 0.0,
+            })
+        return resumen
+
+    def a_prometheus(self, prefijo="polizas_"):
+        """Texto en el formato de exposición de Prometheus"""
+        lineas = []
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted(self._histogramas.items(), key=lambda item: item[0])
+            anterior = None
+            for (nombre, etiquetas), valor in contadores:
+                if nombre != anterior:
+                    lineas += [f"# HELP {prefijo}{nombre} {AYUDA.get(nombre, nombre)}", f"# TYPE {prefijo}{nombre} counter"]
+                    anterior = nombre
+                lineas.append(f"{prefijo}{nombre}{_formato_etiquetas(etiquetas)} {valor}")
+            for (nombre, etiquetas), histograma in histogramas:
+                if nombre != anterior:
+                    lineas += [f"# HELP {prefijo}{nombre} {AYUDA.get(nombre, nombre)}", f"# TYPE {prefijo}{nombre} histogram"]
+                    anterior = nombre
+                acumulado = 0
+                for limite, cubeta in zip(histograma.limites + ["+Inf"], histograma.cubetas):
+                    acumulado += cubeta
+                    lineas.append(f"{prefijo}{nombre}_bucket{_formato_etiquetas(etiquetas, {'le': limite})} {acumulado}")
+                lineas.append(f"{prefijo}{nombre}_sum{_formato_etiquetas(etiquetas)} {histograma.suma}")
+                lineas.append(f"{prefijo}{nombre}_count{_formato_etiquetas(etiquetas)} {histograma.cantidad}")
+        lineas.append(f"{prefijo}inicio_proceso_segundos {self.inicio}")
+        return "\n".join(lineas) + "\n"
+
+    def a_json(self):
+        """Diccionario serializable con todos los contadores e histogramas"""
+        return {
+            "inicio": self.inicio,
+            "generado": time.time(),
+            "contadores": [
+                {"nombre": nombre, "etiquetas": etiquetas, "valor": valor}
+                for nombre, etiquetas, valor in self.contadores()
+            ],
+            "histogramas": [
+                {"nombre": nombre, "etiquetas": etiquetas, "limites": histograma.limites,
+                 "cubetas": histograma.cubetas, "suma": histograma.suma, "cantidad": histograma.cantidad}
+                for nombre, etiquetas, histograma in self.histogramas()
+            ],
+        }
+
+    def exportar(self, ruta, intervalo=0.0):
+        """Escribe las métricas en `ruta` (.json o texto de Prometheus) si pasó `intervalo` desde la última vez"""
+        ahora = time.time()
+        if ahora - self._ultima_exportacion < intervalo:
+            return False
+        self._ultima_exportacion = ahora
+        contenido = json.dumps(self.a_json(), ensure_ascii=False) if ruta.endswith(".json") else self.a_prometheus()
+        # Se escribe aparte y se reemplaza para que el lector nunca vea un archivo a medias
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+        return True
@@ -0,0 +1,45 @@
+"""Registro de las páginas del menú y de los datos que cada una necesita.
+
+Cada página es una función que se registra con su título, las hojas que lee
+(`datos`) y una línea de ayuda para la barra lateral. Solo se ejecuta la
+función de la página elegida, y las hojas se cargan recién cuando esa función
+las pide: el resto de la app consulta `datos` para saber qué mostrar sin
+provocar descargas (por ejemplo, la frescura de las copias en la barra lateral).
+"""
+
+
+class Pagina:
+    """Página del menú: su función de dibujo y las hojas que lee"""
+
+    def __init__(self, titulo, mostrar, datos=(), ayuda=""):
+        self.titulo = titulo
+        self.mostrar = mostrar
+        self.datos = tuple(datos)
+        self.ayuda = ayuda
+
+
+class RegistroPaginas:
+    """Páginas en el orden del menú"""
+
+    def __init__(self):
+        self._paginas = {}
+
+    def registrar(self, titulo, datos=(), ayuda=""):
+        """Decorador que agrega la función como página del menú"""
+        if titulo in self._paginas:
+            raise ValueError(f"Página registrada dos veces: '{titulo}'")
+
+        def decorador(funcion):
+            self._paginas[titulo] = Pagina(titulo, funcion, datos, ayuda)
+            return funcion
+        return decorador
+
+    @property
+    def titulos(self):
+        return list(self._paginas)
+
+    def __getitem__(self, titulo):
+        return self._paginas[titulo]
+
+    def __iter__(self):
+        return iter(self._paginas.values())
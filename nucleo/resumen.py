@@ -0,0 +1,26 @@
+"""Resumen de la cartera para el panel lateral."""
+
+
+class ResumenCartera:
+    """Estadísticas del panel lateral calculadas sobre la tabla tipada de pólizas.
+
+    Los conteos de vencimientos y cumpleaños salen de sus índices (búsquedas
+    binarias), así que el objeto completo se calcula una vez por versión de
+    datos y fecha, y los reruns solo lo leen.
+    """
+
+    def __init__(self, tabla, cancelaciones, indice_vencimientos, indice_cumpleaños,
+                 hoy, dias_vencimiento=30):
+        ids = tabla["No. Cliente"]
+        numericos = ids[ids.str.isdigit()]
+
+        self.fecha = hoy
+        self.polizas_activas = len(tabla)
+        self.clientes_unicos = int(ids.nunique())
+        # PRIMA ANUAL ya es float64; las celdas no numéricas son NaN y no suman
+        self.prima_total = float(tabla["PRIMA ANUAL"].sum())
+        self.ultimo_id_cliente = int(numericos.astype("int64").max()) if len(numericos) else 0
+        self.dias_vencimiento = dias_vencimiento
+        self.proximas_a_vencer = len(indice_vencimientos.proximas(hoy, dias_vencimiento))
+        self.cumpleaños_mes = indice_cumpleaños.contar_mes(hoy.month)
+        self.cancelaciones = len(cancelaciones)
@@ -0,0 +1,153 @@
+"""Secuencias de identificadores con reserva por bloques.
+
+Cada proceso reserva de forma atómica un bloque de IDs consecutivos en el
+almacenamiento compartido y luego los entrega desde memoria, así que asignar un
+ID cuesta O(1) y solo se habla con el almacenamiento una vez por bloque. Dos
+sesiones (o dos procesos) nunca reciben el mismo bloque. Los IDs de un bloque
+que no se llegan a usar se pierden al reiniciar el proceso: la secuencia puede
+tener huecos, pero no duplicados.
+"""
+import re
+import sqlite3
+import threading
+import uuid
+
+
+# ============================================================
+# ALMACENAMIENTO SQLITE LOCAL
+# ============================================================
+class SecuenciaSQLite:
+    """Secuencia guardada en la tabla `_secuencias` de la base SQLite local"""
+
+    def __init__(self, ruta, nombre):
+        self.nombre = nombre
+        # Modo autocommit para controlar la transacción con BEGIN IMMEDIATE
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS _secuencias (nombre TEXT PRIMARY KEY, siguiente INTEGER NOT NULL)"
+        )
+
+    def reservar(self, cantidad, minimo=1):
+        """Reserva `cantidad` IDs consecutivos, ninguno menor que `minimo`; devuelve el primero"""
+        with self._lock:
+            # BEGIN IMMEDIATE toma el bloqueo de escritura: lectura y actualización son atómicas
+            # también frente a otros procesos que usen la misma base
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conexion.execute(
+                    "SELECT siguiente FROM _secuencias WHERE nombre = ?", (self.nombre,)
+                ).fetchone()
+                inicio = max(fila[0] if fila else 1, minimo)
+                self._conexion.execute(
+                    "INSERT INTO _secuencias (nombre, siguiente) VALUES (?, ?) "
+                    "ON CONFLICT(nombre) DO UPDATE SET siguiente = excluded.siguiente",
+                    (self.nombre, inicio + cantidad)
+                )
+                self._conexion.execute("COMMIT")
+            except Exception:
+                self._conexion.execute("ROLLBACK")
+                raise
+        return inicio
+
+
+# ============================================================
+# ALMACENAMIENTO EN HOJA DE METADATOS
+# ============================================================
+ENCABEZADOS_METADATOS = ["SECUENCIA", "MINIMO", "BLOQUE", "RESERVA"]
+
+
+def _entero(valor, defecto):
+    try:
+        return int(str(valor).replace(",", ""))
+    except ValueError:
+        return defecto
+
+
+class SecuenciaGoogleSheets:
+    """Secuencia guardada en una hoja de metadatos.
+
+    Google Sheets no ofrece lectura-y-escritura atómica, pero sí agrega cada
+    `append_rows` en una fila distinta y en orden. Cada reserva agrega una fila
+    con el mínimo pedido y el tamaño de bloque; el bloque de una fila se calcula
+    recorriendo las filas anteriores de la secuencia como lo hace SecuenciaSQLite
+    (empieza en el mayor entre el fin del bloque anterior y su mínimo). Las filas
+    anteriores ya no cambian cuando la API agrega la propia, así que todos los
+    procesos calculan los mismos bloques y nunca se repite uno. El tamaño de
+    bloque lo fija la primera fila de la secuencia.
+    """
+
+    PRIMERA_FILA_RESERVAS = 2
+
+    def __init__(self, worksheet, nombre):
+        self.worksheet = worksheet
+        self.nombre = nombre
+        self._tam_bloque = None
+        # Última fila ya recorrida y el primer ID libre después de ella
+        self._ultima_fila = self.PRIMERA_FILA_RESERVAS - 1
+        self._siguiente = 1
+        self._lock = threading.Lock()
+
+    def _recorrer(self, hasta_fila):
+        """Avanza por las reservas hasta `hasta_fila` y devuelve el inicio del bloque de esa fila"""
+        desde_fila = self._ultima_fila + 1
+        filas = self.worksheet.get(f"A{desde_fila}:C{hasta_fila}")
+        inicio = None
+        for fila in filas:
+            if not fila or fila[0] != self.nombre:
+                continue
+            if self._tam_bloque is None:
+                self._tam_bloque = _entero(fila[2] if len(fila) > 2 else "", 1)
+            inicio = max(self._siguiente, _entero(fila[1] if len(fila) > 1 else "", 1))
+            self._siguiente = inicio + self._tam_bloque
+        self._ultima_fila = hasta_fila
+        return inicio
+
+    def reservar(self, cantidad, minimo=1):
+        """Reserva un bloque que empieza en `minimo` o después; devuelve su primer ID.
+
+        El tamaño de bloque lo fija la primera reserva, así que `cantidad` solo
+        se usa al crear la secuencia.
+        """
+        with self._lock:
+            respuesta = self.worksheet.append_rows(
+                [[self.nombre, str(minimo), str(cantidad), uuid.uuid4().hex]], value_input_option="RAW"
+            )
+            rango = respuesta["updates"]["updatedRange"]
+            fila = int(re.search(r"\d+", rango.rsplit("!", 1)[-1]).group())
+            return self._recorrer(fila)
+
+    @property
+    def tam_bloque(self):
+        return self._tam_bloque
+
+
+# ============================================================
+# ASIGNADOR EN MEMORIA
+# ============================================================
+class AsignadorIds:
+    """Entrega IDs de la secuencia desde un bloque reservado en memoria"""
+
+    def __init__(self, almacen, tam_bloque=20):
+        self.almacen = almacen
+        self.tam_bloque = tam_bloque
+        self.estadisticas = {"reservas": 0, "asignados": 0}
+        self._siguiente = 0
+        self._fin = 0
+        self._lock = threading.Lock()
+
+    def siguiente(self, minimo=1):
+        """Devuelve un ID nuevo, nunca menor que `minimo` (por ejemplo, el último ID en uso + 1)"""
+        with self._lock:
+            self._siguiente = max(self._siguiente, minimo)
+            if self._siguiente >= self._fin:
+                # El almacén ya empieza el bloque en `minimo`: basta una reserva
+                inicio = self.almacen.reservar(self.tam_bloque, minimo)
+                tam_bloque = getattr(self.almacen, "tam_bloque", None) or self.tam_bloque
+                self.estadisticas["reservas"] += 1
+                self._siguiente = max(inicio, minimo)
+                self._fin = inicio + tam_bloque
+            id_nuevo = self._siguiente
+            self._siguiente += 1
+            self.estadisticas["asignados"] += 1
+            return id_nuevo
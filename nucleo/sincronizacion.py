@@ -0,0 +1,317 @@
+"""Sincronización incremental (delta) de una hoja con su copia en memoria.
+
+En lugar de descargar todas las columnas de todas las filas en cada recarga, el
+sincronizador conserva la última copia conocida junto con:
+
+- la columna clave de cada fila (por ejemplo "No. POLIZA"), que se vuelve a
+  leer en cada sincronización porque es una sola columna y permite detectar
+  filas agregadas, eliminadas o insertadas;
+- un hash de contenido por bloque de filas, que permite detectar ediciones
+  hechas directamente en la hoja.
+
+Google Sheets no informa qué rangos cambiaron, así que las ediciones en sitio se
+detectan verificando unos pocos bloques por sincronización en forma rotativa;
+las altas y bajas se detectan siempre en la primera sincronización.
+
+Cuando la copia vence, los lectores la siguen recibiendo de inmediato mientras
+un hilo de fondo la sincroniza (stale-while-revalidate). Si la sincronización
+falla, por ejemplo por un 429, se conserva la última copia buena y se reintenta
+con espera creciente.
+
+Las escrituras hechas por la propia app se aplican en sitio sobre la copia
+(`aplicar_altas`, `aplicar_baja`) y solo suben la versión de esta hoja, así que
+los datos derivados de otras hojas no se invalidan.
+"""
+import collections
+import hashlib
+import threading
+import time
+
+from nucleo.almacenamiento import PRIMERA_FILA_DATOS
+from nucleo.cuota import prioridad_de_fondo
+
+
+def hash_bloque(registros):
+    """Hash estable del contenido de un bloque de registros"""
+    h = hashlib.blake2b(digest_size=16)
+    for registro in registros:
+        h.update(repr(tuple(registro.values())).encode("utf-8"))
+    return h.hexdigest()
+
+
+class SincronizadorDelta:
+    """Copia local de una hoja que se actualiza leyendo solo los rangos que cambiaron.
+
+    Es un objeto de proceso compartido por todas las sesiones. Las lecturas de
+    red se hacen sin tomar el candado de la copia: los lectores siempre obtienen
+    la última copia buena al instante y el estado nuevo se publica de una vez
+    (registros, claves, hashes y versión juntos) al final de la sincronización.
+    """
+
+    def __init__(self, repositorio, campo_clave, tam_bloque=500, bloques_por_verificacion=1,
+                 espera_maxima=60.0):
+        self.repositorio = repositorio
+        self.campo_clave = campo_clave
+        self.tam_bloque = tam_bloque
+        self.bloques_por_verificacion = bloques_por_verificacion
+        self.espera_maxima = espera_maxima
+        self.registros = []
+        self.claves = []
+        self.hashes = []
+        self.version = 0
+        self.ultima_sincronizacion = None
+        self.pendiente = True
+        self.ultimo_error = None
+        self.errores_consecutivos = 0
+        self.estadisticas = {"cargas_completas": 0, "sincronizaciones": 0, "filas_leidas": 0, "errores": 0}
+        # Historial acotado de cambios por versión, para quien quiera ponerse al día
+        # de forma incremental en lugar de reconstruir: (version, tipo, posicion, registros)
+        self.cambios = collections.deque(maxlen=256)
+        self._recarga_completa = True
+        self._no_antes_de = 0.0
+        self._cursor_verificacion = 0
+        self._hilo = None
+        # `_lock` protege la copia y se toma solo para leerla o publicarla;
+        # `_lock_sincronizacion` evita dos sincronizaciones a la vez
+        self._lock = threading.RLock()
+        self._lock_sincronizacion = threading.RLock()
+
+    @property
+    def total_filas(self):
+        return len(self.registros)
+
+    def _clave(self, registro):
+        return str(registro.get(self.campo_clave, ""))
+
+    def _hashes_desde(self, registros, hashes, desde_fila=0):
+        """Recalcula los hashes de los bloques a partir del que contiene `desde_fila`"""
+        primer_bloque = desde_fila // self.tam_bloque
+        nuevos = [
+            hash_bloque(registros[inicio:inicio + self.tam_bloque])
+            for inicio in range(primer_bloque * self.tam_bloque, len(registros), self.tam_bloque)
+        ]
+        return hashes[:primer_bloque] + nuevos
+
+    def _fusionar_claves(self, registros, claves, hashes, claves_nuevas):
+        """Aplica altas, bajas e inserciones detectadas comparando la columna clave"""
+        limite = min(len(claves), len(claves_nuevas))
+
+        prefijo = 0
+        while prefijo < limite and claves[prefijo] == claves_nuevas[prefijo]:
+            prefijo += 1
+
+        sufijo = 0
+        while (sufijo < limite - prefijo
+               and claves[len(claves) - 1 - sufijo] == claves_nuevas[len(claves_nuevas) - 1 - sufijo]):
+            sufijo += 1
+
+        fin_viejo = len(claves) - sufijo
+        fin_nuevo = len(claves_nuevas) - sufijo
+        if prefijo == fin_viejo and prefijo == fin_nuevo:
+            return None
+
+        # Solo se descargan las filas nuevas o desplazadas del tramo intermedio;
+        # una baja deja el tramo nuevo vacío y no requiere ninguna lectura.
+        nuevos = []
+        if fin_nuevo > prefijo:
+            nuevos = self.repositorio.leer_rango(
+                prefijo + PRIMERA_FILA_DATOS, fin_nuevo + PRIMERA_FILA_DATOS - 1
+            )
+            self.estadisticas["filas_leidas"] += len(nuevos)
+
+        # Se construyen listas nuevas para no modificar la que otros lectores recorren
+        registros = registros[:prefijo] + nuevos + registros[fin_viejo:]
+        claves = claves[:prefijo] + [self._clave(r) for r in nuevos] + claves[fin_viejo:]
+        return registros, claves, self._hashes_desde(registros, hashes, prefijo)
+
+    def _verificar_bloques(self, registros, claves, hashes):
+        """Compara el hash de algunos bloques con la hoja para detectar ediciones en sitio"""
+        cambio = False
+        for _ in range(min(self.bloques_por_verificacion, len(hashes))):
+            bloque = self._cursor_verificacion % len(hashes)
+            self._cursor_verificacion = bloque + 1
+            inicio = bloque * self.tam_bloque
+            fin = min(inicio + self.tam_bloque, len(registros))
+            remotos = self.repositorio.leer_rango(
+                inicio + PRIMERA_FILA_DATOS, fin + PRIMERA_FILA_DATOS - 1
+            )
+            self.estadisticas["filas_leidas"] += len(remotos)
+            if hash_bloque(remotos) != hashes[bloque]:
+                registros = registros[:inicio] + remotos + registros[fin:]
+                claves = claves[:inicio] + [self._clave(r) for r in remotos] + claves[fin:]
+                hashes = hashes[:bloque] + [hash_bloque(remotos)] + hashes[bloque + 1:]
+                cambio = True
+        return (registros, claves, hashes) if cambio else None
+
+    def _sincronizar(self):
+        with self._lock:
+            version = self.version
+            completo = self._recarga_completa
+            estado = (self.registros, self.claves, self.hashes)
+
+        if completo:
+            registros = self.repositorio.listar()
+            nuevo = (registros, [self._clave(r) for r in registros], self._hashes_desde(registros, []))
+            self.estadisticas["cargas_completas"] += 1
+            self.estadisticas["filas_leidas"] += len(registros)
+        else:
+            claves_nuevas = [str(v) for v in self.repositorio.leer_columna(self.campo_clave)]
+            nuevo = self._fusionar_claves(*estado, claves_nuevas)
+            nuevo = self._verificar_bloques(*(nuevo or estado)) or nuevo
+            self.estadisticas["sincronizaciones"] += 1
+
+        with self._lock:
+            # Si la app aplicó una escritura mientras se leía la hoja, la lectura
+            # puede no incluirla: se publica igual y se deja otra sincronización pendiente
+            parcheado = self.version != version
+            if nuevo is not None:
+                self.registros, self.claves, self.hashes = nuevo
+                self._registrar_cambio("recarga")
+            self._recarga_completa = False
+            self.ultima_sincronizacion = time.time()
+            self.pendiente = parcheado and nuevo is not None
+
+    def sincronizar(self):
+        """Trae de la hoja solo las filas agregadas, eliminadas o modificadas"""
+        with self._lock_sincronizacion:
+            try:
+                self._sincronizar()
+            except Exception as error:
+                self._registrar_error(error)
+                raise
+            self.ultimo_error = None
+            self.errores_consecutivos = 0
+            self._no_antes_de = 0.0
+
+    def cargar_completo(self):
+        """Descarga la hoja completa y reinicia claves y hashes"""
+        with self._lock_sincronizacion:
+            self._recarga_completa = True
+            self.sincronizar()
+
+    def _registrar_error(self, error):
+        """Guarda el error y espera cada vez más antes de volver a intentar"""
+        self.ultimo_error = str(error)
+        self.errores_consecutivos += 1
+        self.estadisticas["errores"] += 1
+        espera = min(self.espera_maxima, 2 ** self.errores_consecutivos)
+        self._no_antes_de = time.time() + espera
+
+    @property
+    def cargado(self):
+        """Hay una copia local (aunque esté vencida) que se puede leer sin esperar a la red"""
+        return self.ultima_sincronizacion is not None
+
+    def desactualizado(self, ttl):
+        return (self.pendiente or self._recarga_completa or self.ultima_sincronizacion is None
+                or time.time() - self.ultima_sincronizacion >= ttl)
+
+    def obtener(self, ttl):
+        """Devuelve la última copia buena y, si venció, la refresca en segundo plano.
+
+        Solo se espera a la red cuando no hay ninguna copia o se pidió una
+        recarga completa con `reiniciar`. Si esa recarga falla y ya había una
+        copia, se sigue sirviendo la anterior; sin copia, el error se propaga.
+        """
+        if self._recarga_completa and (self.version == 0 or time.time() >= self._no_antes_de):
+            with self._lock_sincronizacion:
+                if self._recarga_completa:
+                    try:
+                        self.sincronizar()
+                    except Exception:
+                        if self.version == 0:
+                            raise
+        elif self.desactualizado(ttl):
+            self.refrescar_en_segundo_plano()
+        return self.registros
+
+    def refrescar_en_segundo_plano(self):
+        """Lanza una sincronización en un hilo si no hay otra en curso ni una espera por errores"""
+        with self._lock:
+            if time.time() < self._no_antes_de:
+                return False
+            if self._hilo is not None and self._hilo.is_alive():
+                return False
+            self._hilo = threading.Thread(
+                target=self._refrescar, name=f"sincronizacion-{self.repositorio.nombre}", daemon=True
+            )
+            self._hilo.start()
+            return True
+
+    def _refrescar(self):
+        try:
+            # Con cuota limitada, las llamadas del usuario van antes que este refresco
+            with prioridad_de_fondo():
+                self.sincronizar()
+        except Exception:
+            # El error queda en `ultimo_error`; los lectores siguen con la copia anterior
+            pass
+
+    def _registrar_cambio(self, tipo, posicion=None, registros=()):
+        self.version += 1
+        self.cambios.append((self.version, tipo, posicion, tuple(registros)))
+
+    def cambios_desde(self, version):
+        """Cambios posteriores a `version`, o None si el historial ya no los cubre o hubo una recarga"""
+        with self._lock:
+            if version == self.version:
+                return []
+            posteriores = [c for c in self.cambios if c[0] > version]
+            if not posteriores or posteriores[0][0] != version + 1:
+                return None
+            if any(tipo == "recarga" for _, tipo, _, _ in posteriores):
+                return None
+            return posteriores
+
+    def aplicar_altas(self, registros):
+        """Agrega a la copia local filas que la app acaba de escribir al final de la hoja"""
+        registros = list(registros)
+        with self._lock:
+            if self._recarga_completa or not registros:
+                return
+            inicio = len(self.registros) - len(registros)
+            if inicio >= 0 and self.registros[inicio:] == registros:
+                # Una sincronización ya las trajo (o son filas repetidas): que la próxima decida
+                self.pendiente = True
+                return
+            inicio = len(self.registros)
+            self.registros = self.registros + registros
+            self.claves = self.claves + [self._clave(r) for r in registros]
+            self.hashes = self._hashes_desde(self.registros, self.hashes, inicio)
+            self._registrar_cambio("alta", inicio, registros)
+
+    def aplicar_baja(self, fila, esperado=None):
+        """Quita de la copia local la fila que la app acaba de eliminar de la hoja.
+
+        Si la copia no tiene en esa fila el registro `esperado` (la hoja cambió
+        por fuera), se deja pendiente una sincronización delta en su lugar.
+        """
+        posicion = fila - PRIMERA_FILA_DATOS
+        with self._lock:
+            if self._recarga_completa:
+                return
+            if not 0 <= posicion < len(self.registros) or (
+                    esperado is not None and self.registros[posicion] != esperado):
+                self.pendiente = True
+                return
+            eliminado = self.registros[posicion]
+            self.registros = self.registros[:posicion] + self.registros[posicion + 1:]
+            self.claves = self.claves[:posicion] + self.claves[posicion + 1:]
+            self.hashes = self._hashes_desde(self.registros, self.hashes, posicion)
+            self._registrar_cambio("baja", posicion, [eliminado])
+
+    def instantanea(self):
+        """Devuelve (version, registros) de forma consistente entre sí"""
+        with self._lock:
+            return self.version, self.registros
+
+    def marcar_pendiente(self):
+        """Fuerza una sincronización delta en la próxima lectura"""
+        self.pendiente = True
+
+    def reiniciar(self):
+        """Pide una recarga completa; la próxima lectura la espera en lugar de servir la copia"""
+        with self._lock:
+            self._recarga_completa = True
+            self.pendiente = True
+            self._no_antes_de = 0.0
@@ -0,0 +1,108 @@
+"""Tabla tipada (DataFrame) de una versión de datos.
+
+Se construye una sola vez por versión y las páginas trabajan sobre cortes de
+ella en lugar de volver a armar un DataFrame desde la lista de diccionarios en
+cada rerun. Con copy-on-write de pandas los cortes no copian columnas hasta que
+alguien los modifica, así que la tabla canónica nunca cambia.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.fechas import construir_columnas_fecha
+
+# Columnas con pocos valores distintos: como categóricas ocupan un código por
+# fila y los filtros comparan enteros en lugar de textos
+COLUMNAS_CATEGORICAS = ["ASEGURADORA", "PRODUCTO", "ESTADO CIVIL", "FORMA DE PAGO", "FRECUENCIA DE PAGO"]
+COLUMNAS_NUMERICAS = ["PRIMA ANUAL"]
+
+# Formato con el que se escriben las fechas al exportar (el mismo que se captura)
+FORMATO_FECHA_EXPORTACION = "%d/%m/%Y"
+
+
+def construir_tabla(registros, encabezados, fechas=None):
+    """DataFrame tipado alineado con `registros`: la fila i es el registro i.
+
+    `fechas` son las columnas datetime64 ya convertidas para esta versión; si
+    no se pasan se convierten aquí.
+    """
+    if fechas is None:
+        fechas = construir_columnas_fecha(registros)
+    columnas = {}
+    for campo in encabezados:
+        if campo in fechas.columns:
+            columnas[campo] = fechas[campo].to_numpy()
+            continue
+        valores = [registro.get(campo, "") for registro in registros]
+        if campo in COLUMNAS_NUMERICAS:
+            columnas[campo] = pd.to_numeric(pd.Series(valores, dtype=object), errors="coerce").astype("float64").to_numpy()
+        elif campo in COLUMNAS_CATEGORICAS:
+            # Las celdas vacías quedan como faltantes, no como una categoría más
+            columnas[campo] = pd.Categorical([str(v).strip() or None if v is not None else None for v in valores])
+        else:
+            columnas[campo] = pd.array(["" if v is None else str(v) for v in valores], dtype="str")
+    return pd.DataFrame(columnas, index=pd.RangeIndex(len(registros)))
+
+
+# ============================================================
+# CONSULTAS: FILTRO, ORDEN Y PÁGINA
+# ============================================================
+class BusquedaTexto:
+    """Filtro de texto libre, sin distinguir mayúsculas, sobre todas las columnas de una tabla.
+
+    Cada columna se factoriza una vez por versión: la búsqueda recorre solo sus
+    valores distintos y después marca las filas por código. Con columnas
+    repetitivas (productos, aseguradoras, fechas) esto cuesta una fracción de
+    buscar fila por fila, y nunca coincide a caballo entre dos columnas.
+    """
+
+    def __init__(self, tabla):
+        self.filas = len(tabla)
+        self.columnas = []
+        for columna in tabla.columns:
+            codigos, unicos = pd.factorize(tabla[columna], use_na_sentinel=True)
+            if pd.api.types.is_datetime64_any_dtype(unicos):
+                unicos = unicos.strftime(FORMATO_FECHA_EXPORTACION)
+            textos = pd.Series(np.asarray(unicos, dtype=object).astype(str), dtype="str").str.lower()
+            self.columnas.append((codigos, textos))
+
+    def coincidencias(self, texto):
+        """Máscara booleana de las filas que contienen `texto` en alguna columna"""
+        texto = texto.strip().lower()
+        mascara = np.zeros(self.filas, dtype=bool)
+        for codigos, textos in self.columnas:
+            coincide = textos.str.contains(texto, regex=False).to_numpy(dtype=bool)
+            if coincide.any():
+                # El código -1 (celda vacía) cae en el último elemento, que nunca coincide
+                mascara |= np.append(coincide, False)[codigos]
+        return mascara
+
+
+def ordenar_posiciones(tabla, columna=None, descendente=False):
+    """Posiciones de la tabla ordenadas por `columna` (vacíos al final); sin columna, orden de hoja"""
+    if not columna:
+        posiciones = np.arange(len(tabla))
+        return posiciones[::-1] if descendente else posiciones
+    ordenada = tabla[columna].sort_values(ascending=not descendente, na_position="last", kind="stable")
+    return ordenada.index.to_numpy()
+
+
+def filtrar_posiciones(tabla, orden, igualdades=None, texto="", busqueda=None):
+    """Filtra las posiciones de `orden` conservando su orden.
+
+    `igualdades` es un diccionario columna -> valor exacto; `texto` se busca en
+    cualquier columna con `busqueda` (un BusquedaTexto de la misma tabla).
+    """
+    mascara = np.ones(len(tabla), dtype=bool)
+    for columna, valor in (igualdades or {}).items():
+        if valor:
+            mascara &= (tabla[columna] == valor).fillna(False).to_numpy(dtype=bool)
+    if texto.strip():
+        mascara &= (busqueda or BusquedaTexto(tabla)).coincidencias(texto)
+    return orden[mascara[orden]]
+
+
+def pagina_de_tabla(tabla, posiciones, pagina, tam_pagina, columnas=None):
+    """Corte de una página (numerada desde 1) con solo las columnas pedidas"""
+    inicio = (pagina - 1) * tam_pagina
+    corte = tabla.take(posiciones[inicio:inicio + tam_pagina])
+    return corte[list(columnas)] if columnas else corte
@@ -0,0 +1,316 @@
+"""Búsqueda de texto completo en las columnas libres de una hoja.
+
+Las columnas de texto libre (notas, dirección, descripción y serie del auto)
+se dividen en palabras normalizadas (sin acentos ni mayúsculas) y se guardan en
+un índice invertido: (columna, palabra) -> {documento: frecuencia}. Una
+consulta solo toca las listas de sus palabras, en lugar de recorrer la hoja.
+
+Cada palabra de la consulta coincide con palabras iguales, que empiezan con
+ella o, desde tres caracteres, que la contienen (fragmentos de un VIN o de una
+placa). Todas las palabras deben coincidir en alguna columna y los resultados
+se ordenan con BM25: pesan más las palabras raras y las coincidencias exactas.
+`serie:3VW` o `notas:siniestro` limitan una palabra a una columna.
+
+El índice es un objeto de proceso que se pone al día con el historial de
+cambios del sincronizador: las altas y bajas de la app se aplican en sitio y
+solo una recarga de la hoja obliga a reconstruirlo.
+"""
+import bisect
+import collections
+import math
+import threading
+
+from nucleo.almacenamiento import PRIMERA_FILA_DATOS
+from nucleo.busqueda import normalizar_texto
+
+COLUMNAS_TEXTO_COMPLETO = ("NOTAS", "DIRECCIÓN", "DESCRIPCION AUTO", "No Serie Auto")
+
+# Prefijos para limitar una palabra de la consulta a una columna
+ALIAS_COLUMNAS = {
+    "notas": "NOTAS",
+    "nota": "NOTAS",
+    "direccion": "DIRECCIÓN",
+    "calle": "DIRECCIÓN",
+    "auto": "DESCRIPCION AUTO",
+    "descripcion": "DESCRIPCION AUTO",
+    "serie": "No Serie Auto",
+    "vin": "No Serie Auto",
+}
+
+# Peso de cada tipo de coincidencia de una palabra
+PESO_EXACTA = 1.0
+PESO_PREFIJO = 0.75
+PESO_FRAGMENTO = 0.5
+# Largo mínimo de una palabra para buscarla dentro de otras
+LARGO_MINIMO_FRAGMENTO = 3
+# Palabras del vocabulario que puede expandir cada palabra de la consulta
+MAXIMO_EXPANSIONES = 500
+# Palabras nuevas que se revisan una por una antes de reordenar el vocabulario
+MAXIMO_PENDIENTES = 1000
+# Parámetro de saturación de la frecuencia en BM25
+K1 = 1.2
+
+
+def tokenizar(valor):
+    """Palabras normalizadas de una celda"""
+    return normalizar_texto(valor).split()
+
+
+def analizar_consulta(consulta, columnas):
+    """Lista de (palabra, columnas donde buscarla) a partir del texto de la consulta"""
+    terminos = []
+    for parte in str(consulta).split():
+        alias, separador, resto = parte.partition(":")
+        columna = ALIAS_COLUMNAS.get(normalizar_texto(alias)) if separador else None
+        if columna is not None:
+            # Un alcance fuera de las columnas elegidas no puede coincidir
+            alcance = (columna,) if columna in columnas else ()
+            terminos.extend((palabra, alcance) for palabra in tokenizar(resto))
+        else:
+            terminos.extend((palabra, tuple(columnas)) for palabra in tokenizar(parte))
+    return terminos
+
+
+class ResultadoTexto:
+    """Un registro encontrado: su fila en la hoja, puntaje y columnas donde coincidió"""
+
+    def __init__(self, registro, fila, puntaje, columnas):
+        self.registro = registro
+        self.fila = fila
+        self.puntaje = puntaje
+        self.columnas = columnas
+
+    def __repr__(self):
+        return f"ResultadoTexto(fila={self.fila}, puntaje={self.puntaje:.2f}, columnas={self.columnas!r})"
+
+
+class _Vocabulario:
+    """Palabras de una columna, ordenadas para buscar por prefijo y unidas para buscar fragmentos"""
+
+    def __init__(self):
+        self._ordenadas = []
+        self._unidas = ""
+        self._inicios = []
+        self._pendientes = set()
+
+    def agregar(self, palabra):
+        self._pendientes.add(palabra)
+
+    def ordenar(self, forzar=False):
+        """Incorpora las palabras pendientes al orden cuando ya son muchas (o siempre, con `forzar`)"""
+        if not forzar and len(self._pendientes) <= MAXIMO_PENDIENTES:
+            return
+        self._ordenadas = sorted(set(self._ordenadas) | self._pendientes)
+        self._pendientes = set()
+        self._unidas = "\n".join(self._ordenadas)
+        self._inicios = []
+        inicio = 0
+        for palabra in self._ordenadas:
+            self._inicios.append(inicio)
+            inicio += len(palabra) + 1
+
+    def con_prefijo(self, prefijo):
+        inicio = bisect.bisect_left(self._ordenadas, prefijo)
+        fin = bisect.bisect_left(self._ordenadas, prefijo + "~", inicio)
+        encontradas = self._ordenadas[inicio:min(fin, inicio + MAXIMO_EXPANSIONES)]
+        return encontradas + [p for p in self._pendientes if p.startswith(prefijo)]
+
+    def con_fragmento(self, fragmento):
+        """Palabras que contienen `fragmento`, con una búsqueda sobre el texto unido"""
+        encontradas = []
+        posicion = self._unidas.find(fragmento)
+        while posicion >= 0 and len(encontradas) < MAXIMO_EXPANSIONES:
+            indice = bisect.bisect_right(self._inicios, posicion) - 1
+            encontradas.append(self._ordenadas[indice])
+            # Se sigue desde la palabra siguiente: cada una cuenta una vez
+            posicion = self._unidas.find(fragmento, self._inicios[indice] + len(self._ordenadas[indice]) + 1)
+        return encontradas + [p for p in self._pendientes if fragmento in p]
+
+
+class IndiceTextoCompleto:
+    """Índice invertido de las columnas de texto libre de una hoja, al día con su copia local"""
+
+    def __init__(self, nombre, columnas=COLUMNAS_TEXTO_COMPLETO):
+        self.nombre = nombre
+        self.columnas = tuple(columnas)
+        self.version = None
+        self.lock = threading.RLock()
+        self.estadisticas = {"reconstrucciones": 0, "altas": 0, "bajas": 0}
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # Los documentos se numeran en orden de hoja y las altas van al final,
+        # así que la lista queda ordenada y la fila sale de una búsqueda binaria
+        self._documentos = []
+        self._registros = {}
+        self._claves_documento = {}
+        self._listas = {}
+        self._vocabularios = {columna: _Vocabulario() for columna in self.columnas}
+        self._siguiente = 0
+
+    @property
+    def total_documentos(self):
+        return len(self._documentos)
+
+    # ------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------
+    def _indexar(self, registro):
+        documento = self._siguiente
+        self._siguiente += 1
+        claves = []
+        for columna in self.columnas:
+            for palabra, frecuencia in collections.Counter(tokenizar(registro.get(columna, ""))).items():
+                clave = (columna, palabra)
+                if clave not in self._listas:
+                    self._listas[clave] = {}
+                    self._vocabularios[columna].agregar(palabra)
+                self._listas[clave][documento] = frecuencia
+                claves.append(clave)
+        self._registros[documento] = registro
+        self._claves_documento[documento] = claves
+        return documento
+
+    def _desindexar(self, documento):
+        for clave in self._claves_documento.pop(documento, []):
+            lista = self._listas.get(clave)
+            if lista is not None:
+                lista.pop(documento, None)
+                # La palabra queda en el vocabulario; sin lista no coincide con nada
+                if not lista:
+                    del self._listas[clave]
+        self._registros.pop(documento, None)
+
+    def reconstruir(self, registros, version=None):
+        """Indexa desde cero los registros en orden de hoja"""
+        with self.lock:
+            self._reiniciar()
+            self._documentos = [self._indexar(registro) for registro in registros]
+            for vocabulario in self._vocabularios.values():
+                vocabulario.ordenar(forzar=True)
+            self.version = version
+            self.estadisticas["reconstrucciones"] += 1
+
+    def registrar_altas(self, posicion, registros):
+        """Indexa filas agregadas a partir de `posicion` (al final de la hoja)"""
+        with self.lock:
+            self._documentos[posicion:posicion] = [self._indexar(registro) for registro in registros]
+            for vocabulario in self._vocabularios.values():
+                vocabulario.ordenar()
+            self.estadisticas["altas"] += len(registros)
+
+    def registrar_baja(self, posicion):
+        """Quita del índice la fila que ocupaba `posicion`"""
+        with self.lock:
+            self._desindexar(self._documentos.pop(posicion))
+            self.estadisticas["bajas"] += 1
+
+    def actualizar(self, sincronizador):
+        """Se pone al día con la copia del sincronizador; devuelve False si tuvo que reconstruir"""
+        with self.lock:
+            version, registros = sincronizador.instantanea()
+            if self.version == version:
+                return True
+            cambios = sincronizador.cambios_desde(self.version) if self.version is not None else None
+            if cambios is None:
+                self.reconstruir(registros, version)
+                return False
+            for version_cambio, tipo, posicion, filas in cambios:
+                if tipo == "alta":
+                    self.registrar_altas(posicion, filas)
+                elif tipo == "baja":
+                    self.registrar_baja(posicion)
+                self.version = version_cambio
+            return True
+
+    # ------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------
+    def _expandir(self, palabra, columna):
+        """(palabra del índice, peso) con que coincide una palabra de la consulta en una columna"""
+        vocabulario = self._vocabularios[columna]
+        pesos = {}
+        if len(palabra) >= LARGO_MINIMO_FRAGMENTO:
+            for encontrada in vocabulario.con_fragmento(palabra):
+                pesos[encontrada] = PESO_FRAGMENTO
+        for encontrada in vocabulario.con_prefijo(palabra):
+            pesos[encontrada] = PESO_PREFIJO
+        if (columna, palabra) in self._listas:
+            pesos[palabra] = PESO_EXACTA
+        return pesos.items()
+
+    def _listas_termino(self, palabra, columnas):
+        """(columna, peso BM25, lista) de cada palabra del índice con que coincide una palabra de la consulta"""
+        total = len(self._documentos)
+        listas = []
+        for columna in columnas:
+            for encontrada, peso in self._expandir(palabra, columna):
+                lista = self._listas.get((columna, encontrada))
+                if lista:
+                    idf = math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5))
+                    listas.append((columna, peso * idf, lista))
+        return listas
+
+    @staticmethod
+    def _puntajes_termino(listas, candidatos=None):
+        """{documento: (puntaje, columnas)} de una palabra, con BM25 sin normalizar por largo.
+
+        Con `candidatos` (los documentos que ya cumplen las palabras anteriores)
+        se consulta cada lista por documento en lugar de recorrerla completa.
+        """
+        puntajes = {}
+
+        def sumar(documento, columna, peso, frecuencia):
+            puntaje = peso * frecuencia * (K1 + 1) / (frecuencia + K1)
+            anterior, columnas_documento = puntajes.get(documento, (0.0, ()))
+            if columna not in columnas_documento:
+                columnas_documento = columnas_documento + (columna,)
+            # Cada palabra cuenta una vez por documento: vale su mejor coincidencia
+            puntajes[documento] = (max(anterior, puntaje), columnas_documento)
+
+        if candidatos is not None and len(candidatos) * len(listas) < sum(len(lista) for _, _, lista in listas):
+            for columna, peso, lista in listas:
+                for documento in candidatos:
+                    frecuencia = lista.get(documento)
+                    if frecuencia:
+                        sumar(documento, columna, peso, frecuencia)
+        else:
+            for columna, peso, lista in listas:
+                for documento, frecuencia in lista.items():
+                    if candidatos is None or documento in candidatos:
+                        sumar(documento, columna, peso, frecuencia)
+        return puntajes
+
+    def buscar(self, consulta, columnas=None, limite=200):
+        """Hasta `limite` registros con todas las palabras de la consulta, del más relevante al menos"""
+        columnas = [c for c in (columnas or self.columnas) if c in self.columnas]
+        terminos = analizar_consulta(consulta, columnas)
+        if not terminos:
+            return []
+        with self.lock:
+            # Las palabras con menos coincidencias van primero: las demás solo se
+            # evalúan sobre los documentos que quedan
+            por_termino = sorted((self._listas_termino(p, alcance) for p, alcance in terminos),
+                                 key=lambda listas: sum(len(lista) for _, _, lista in listas))
+            acumulado = None
+            for listas in por_termino:
+                puntajes = self._puntajes_termino(listas, acumulado)
+                if acumulado is not None:
+                    puntajes = {
+                        documento: (puntaje + acumulado[documento][0],
+                                    acumulado[documento][1] + tuple(c for c in columnas_doc if c not in acumulado[documento][1]))
+                        for documento, (puntaje, columnas_doc) in puntajes.items()
+                    }
+                acumulado = puntajes
+                if not acumulado:
+                    return []
+            mejores = sorted(acumulado.items(), key=lambda par: (-par[1][0], par[0]))[:limite]
+            return [
+                ResultadoTexto(
+                    self._registros[documento],
+                    bisect.bisect_left(self._documentos, documento) + PRIMERA_FILA_DATOS,
+                    puntaje,
+                    columnas_documento,
+                )
+                for documento, (puntaje, columnas_documento) in mejores
+            ]
@@ -0,0 +1,100 @@
+"""Reglas de validación de campos aplicadas a columnas completas.
+
+Son las mismas reglas que `validar_fecha` aplica campo por campo en el
+formulario, pero sobre una Serie de pandas: cada regla devuelve una Serie de
+mensajes alineada con la entrada, con "" en las filas válidas.
+"""
+import numpy as np
+import pandas as pd
+
+PATRON_FECHA = r"\d{1,2}/\d{1,2}/\d{4}"
+PATRON_EMAIL = r"[^@\s]+@[^@\s]+\.[A-Za-z]{2,}"
+# Teléfono sin separadores: 10 dígitos, con clave de país opcional (+52, 521, ...)
+PATRON_TELEFONO = r"\+?\d{10,13}"
+SEPARADORES_TELEFONO = r"[\s\-().]"
+AÑO_MINIMO_NACIMIENTO = 1900
+
+MENSAJE_FORMATO_FECHA = "Formato incorrecto. Use dd/mm/yyyy (ejemplo: 15/03/1990)"
+MENSAJE_FECHA_INVALIDA = "La fecha no es válida (ejemplo: 15/03/1990)"
+
+
+def como_texto(serie):
+    """Serie de textos sin espacios en los extremos; los faltantes quedan como ''"""
+    serie = pd.Series(serie)
+    return serie.astype(object).where(serie.notna(), "").astype(str).str.strip()
+
+
+def errores_obligatorio(serie):
+    """Mensaje para las celdas vacías de un campo obligatorio"""
+    vacia = (como_texto(serie) == "").to_numpy()
+    return pd.Series(np.where(vacia, "Campo obligatorio vacío", ""), index=serie.index)
+
+
+def errores_fecha(serie, es_vigencia=False, anio_actual=None):
+    """Mensajes de `validar_fecha` para una columna; las celdas vacías son válidas.
+
+    Devuelve (mensajes, fechas) con las fechas válidas ya convertidas a datetime64.
+    """
+    texto = como_texto(serie)
+    vacia = (texto == "").to_numpy()
+    con_formato = texto.str.fullmatch(PATRON_FECHA).to_numpy(dtype=bool)
+    fechas = pd.to_datetime(texto.where(con_formato, ""), format="%d/%m/%Y", errors="coerce")
+    real = fechas.notna().to_numpy()
+
+    condiciones = [vacia, ~con_formato, ~real]
+    mensajes = ["", MENSAJE_FORMATO_FECHA, MENSAJE_FECHA_INVALIDA]
+    if not es_vigencia:
+        anio_actual = anio_actual or pd.Timestamp.now().year
+        anios = fechas.dt.year.to_numpy(dtype=float)
+        fuera = (anios < AÑO_MINIMO_NACIMIENTO) | (anios > anio_actual)
+        condiciones.append(fuera)
+        mensajes.append(np.char.add(
+            np.char.add("Año ", np.nan_to_num(anios).astype(int).astype(str)),
+            f" fuera de rango válido ({AÑO_MINIMO_NACIMIENTO}-{anio_actual})"
+        ))
+    resultado = np.select(condiciones, mensajes, default="")
+    fechas = fechas.where(resultado == "")
+    return pd.Series(resultado, index=texto.index), fechas
+
+
+def errores_email(serie):
+    """Mensaje para los correos que no tienen la forma usuario@dominio.ext; vacío es válido"""
+    texto = como_texto(serie)
+    invalido = ((texto != "") & ~texto.str.fullmatch(PATRON_EMAIL)).to_numpy(dtype=bool)
+    return pd.Series(np.where(invalido, "Correo electrónico inválido", ""), index=texto.index)
+
+
+def errores_telefono(serie):
+    """Mensaje para los teléfonos sin 10 a 13 dígitos (se ignoran espacios, guiones y paréntesis)"""
+    texto = como_texto(serie)
+    digitos = texto.str.replace(SEPARADORES_TELEFONO, "", regex=True)
+    invalido = ((texto != "") & ~digitos.str.fullmatch(PATRON_TELEFONO)).to_numpy(dtype=bool)
+    return pd.Series(np.where(invalido, "Teléfono inválido: se esperan de 10 a 13 dígitos", ""), index=texto.index)
+
+
+def errores_importe(serie):
+    """Mensajes para importes no numéricos (que `pd.to_numeric` volvería faltantes) o negativos"""
+    texto = como_texto(serie)
+    importes = pd.to_numeric(texto.where(texto != "", None), errors="coerce").to_numpy(dtype=float)
+    no_numerico = ((texto != "").to_numpy() & np.isnan(importes))
+    resultado = np.select(
+        [no_numerico, importes < 0],
+        ["No es numérico: no se suma en los totales", "Importe negativo"],
+        default=""
+    )
+    return pd.Series(resultado, index=texto.index)
+
+
+def unir_errores(mensajes_por_campo, separador="; "):
+    """Une pares (campo, Serie de mensajes) en un texto por fila: 'CAMPO: mensaje; ...'"""
+    resultado = None
+    for campo, mensajes in mensajes_por_campo:
+        mensajes = np.asarray(mensajes, dtype=object).astype(str)
+        con_campo = np.where(mensajes != "", np.char.add(f"{campo}: ", mensajes), "")
+        if resultado is None:
+            resultado = con_campo
+            continue
+        ambos = (resultado != "") & (con_campo != "")
+        resultado = np.where(ambos, np.char.add(np.char.add(resultado, separador), con_campo),
+                             np.where(resultado != "", resultado, con_campo))
+    return resultado if resultado is not None else np.array([], dtype=str)